@@ -1,10 +1,27 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import json
+
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 
+from app.config import settings
 from app.services.llm_client import GeminiClient
 from app.services.idea_generator import IdeaGenerator
 from app.services.scraper import Scraper
+from app.services.pipeline import (
+    MAX_EXPANDED,
+    NO_ARTICLES,
+    idea_articles,
+    iter_saved,
+    run_ideas,
+    scrape_and_save,
+    scrape_keywords,
+)
+from app.services.ingest_store import get_ingest_store
+from app.services.quota import upstream_priority
+from app.services.scheduler import ingest_scheduler
 
 router = APIRouter(prefix="/api/v1")
 
@@ -25,16 +42,68 @@ class ArticleOut(BaseModel):
     snippet: Optional[str]
 
 
+class BatchIdeasRequest(BaseModel):
+    keywords: List[str]
+
+
+class TopicIdeas(BaseModel):
+    keyword: str
+    status: str                     # ok | no_articles | missing | error
+    ideas: List[str]
+    articles: int                   # articles packed into the topic context
+    context_tokens: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class BatchIdeasResponse(BaseModel):
+    results: List[TopicIdeas]
+    calls: int                      # Gemini calls made
+    failed: List[str]               # keywords without ideas because of an error
+
+
+class WatchlistRequest(BaseModel):
+    keywords: List[str]
+    name: Optional[str] = None
+    interval_seconds: Optional[float] = None   # default: WATCHLIST_DEFAULT_INTERVAL
+    enabled: bool = True
+
+
 class CombinedResponse(BaseModel):
     seed_keywords: List[str]
     expanded_keywords: List[str]
     ideas: List[str]
+    context_tokens: Optional[int] = None   # prompt tokens spent on article context
+
+
+# ---------------- Helpers ----------------
+async def _precomputed(keywords: List[str], response: Response, kind: str = "pipeline"):
+    """Fresh background result of `kind` for this keyword set, if any."""
+    try:
+        result = await asyncio.to_thread(
+            get_ingest_store().get_result, keywords, settings.precomputed_max_age, kind
+        )
+    except Exception as e:
+        print("Precomputed read error:", type(e), str(e))
+        return None
+    if result is not None:
+        response.headers["X-Precomputed-Age"] = str(int(result["age_seconds"]))
+    return result
+
 
+def _context_headers(response: Response, stats: Optional[dict]):
+    if stats:
+        response.headers["X-Context-Tokens"] = str(stats["tokens"])
+        response.headers["X-Context-Articles"] = str(stats["articles"])
 
-# ---------------- Helpers / Defaults ----------------
-# Global caps to avoid DB bloat and API overuse
-MAX_SAVE_PER_RUN = 10   # total articles to save per pipeline run (change to 5 if you prefer)
-FULL_FETCH_TOP = 3      # number of top articles to fetch full HTML for richer summary
+
+def _article_out(art: dict) -> dict:
+    # Prefer snippet from SerpAPI (if using SerpAPI). Accept fallback text.
+    return {
+        "url": art.get("url"),
+        "title": art.get("title") or "Untitled",
+        "summary": art.get("summary") or art.get("snippet") or "Short summary not available.",
+        "snippet": art.get("snippet") or "",
+    }
 
 
 # ---------------- 1. Expand keywords ----------------
@@ -59,26 +128,11 @@ async def scrape_data(payload: ScrapeRequest):
         raise HTTPException(400, "Keywords cannot be empty")
 
     scraper = Scraper()
-    all_articles = []
-
-    for kw in payload.keywords:
-        scraped = await scraper.search_and_scrape(kw)
 
-        # Prefer snippet from SerpAPI (if using SerpAPI). Accept fallback text.
-        cleaned = [
-            {
-                "url": art.get("url"),
-                "title": art.get("title") or "Untitled",
-                "summary": art.get("summary") or art.get("snippet") or "Short summary not available.",
-                "snippet": art.get("snippet") or "",
-            }
-            for art in scraped if art.get("url")
-        ]
+    # Keywords are searched concurrently; results merged in keyword order
+    scraped = await scrape_keywords(scraper, payload.keywords, per_keyword=5)
 
-        # keep a few per keyword for preview
-        all_articles.extend(cleaned[:5])
-
-    return all_articles
+    return [_article_out(art) for art in scraped]
 
 
 # ---------------- 3. Get stored articles ----------------
@@ -94,81 +148,222 @@ async def get_articles(limit: int = 10):
 
 # ---------------- 4. Generate ideas ----------------
 @router.get("/ideas", response_model=List[str])
-async def generate_ideas(keyword: str = None):
+async def generate_ideas(response: Response, keyword: str = None, fresh: bool = False):
+    """
+    Ideas for `keyword` from the stored articles most relevant to it, or
+    without a keyword from the hottest topics (else the latest articles).
+    If a watchlist for exactly this keyword has precomputed them recently,
+    that result is served instead, unless `fresh=true`.
+    """
+    if keyword and not fresh:
+        # Not the watchlist's scrape-and-generate ideas: those come from
+        # freshly scraped articles, not from ranking the stored ones
+        result = await _precomputed([keyword], response, kind="keyword_ideas")
+        if result is not None:
+            if result.get("context_tokens") is not None:
+                _context_headers(response, {
+                    "tokens": result["context_tokens"], "articles": result.get("context_articles") or 0,
+                })
+            return result["ideas"]
+
     idea = IdeaGenerator()
     if keyword:
-        return await idea.generate_ideas_by_keyword(keyword)
-    return await idea.generate_ideas()
+        ideas = await idea.generate_ideas_by_keyword(keyword)
+    else:
+        ideas = await idea.generate_ideas()
+
+    # Token budget actually used by the prompt context
+    _context_headers(response, idea.context_stats)
+    if idea.trending:
+        response.headers["X-Trending-Topics"] = ",".join(str(t["topic"]) for t in idea.trending)
+    return ideas
+
+
+@router.get("/topics")
+async def trending_topics(limit: int = 10):
+    """Hottest topics (recent articles, decayed by age) with their newest headlines."""
+    if not settings.topics_enabled:
+        raise HTTPException(404, "Topic clustering is disabled")
+    idea = IdeaGenerator()
+    return await idea.get_trending_topics(max(1, min(limit, 100)))
+
+
+# ---------------- 4b. Generate ideas for many keywords ----------------
+@router.post("/ideas/batch", response_model=BatchIdeasResponse)
+async def generate_ideas_batch(payload: BatchIdeasRequest):
+    """
+    Ideas for many keywords at once: articles are ranked for all keywords
+    in one pass and topics share structured Gemini calls. A failed call
+    only fails its own keywords (status "error"); the rest are returned.
+    """
+    if not payload.keywords:
+        raise HTTPException(400, "Keywords cannot be empty")
+    if len(payload.keywords) > settings.batch_max_keywords:
+        raise HTTPException(400, f"At most {settings.batch_max_keywords} keywords per request")
+
+    idea = IdeaGenerator()
+    # Queued behind interactive calls on the rate-limited upstreams
+    with upstream_priority("batch"):
+        return await idea.generate_ideas_batch(payload.keywords)
 
 
 # ---------------- 5. Scrape & Generate pipeline ----------------
 @router.post("/scrape-and-generate", response_model=CombinedResponse)
-async def scrape_and_generate(payload: ScrapeRequest):
+async def scrape_and_generate(payload: ScrapeRequest, response: Response, fresh: bool = False):
 
     if not payload.keywords:
         raise HTTPException(400, "Keywords cannot be empty")
 
+    # A watchlist already refreshed these keywords recently
+    if not fresh:
+        result = await _precomputed(payload.keywords, response)
+        if result is not None:
+            return CombinedResponse(**result)
+
     gemini = GeminiClient()
     scraper = Scraper()
     idea = IdeaGenerator()
 
-    expanded = await gemini.expand_keywords(payload.keywords)
-    expanded = expanded[:10]
+    expanded, scraped, statuses = await scrape_and_save(gemini, scraper, idea, payload.keywords)
+
+    # Same ideas as a watchlist refresh of these keywords would store
+    ideas = await run_ideas(idea, payload.keywords, scraped, statuses)
 
-    seed = payload.keywords[0]
+    return CombinedResponse(
+        seed_keywords=payload.keywords,
+        expanded_keywords=expanded,
+        ideas=ideas,
+        context_tokens=idea.context_stats["tokens"] if idea.context_stats else None,
+    )
 
-    saved_urls = set()
-    saved_articles_list = []   # used only for idea generation
 
-    # SIMPLE FIX: scrape + save max 10
-    for kw in expanded:
+# ---------------- 6. Scrape & Generate (streaming) ----------------
+@router.post("/scrape-and-generate/stream")
+async def scrape_and_generate_stream(payload: ScrapeRequest, format: str = "ndjson"):
+    """
+    Same pipeline as /scrape-and-generate, but emits stage events as they
+    complete instead of one final JSON body:
+
+        keywords    → {"seed_keywords", "expanded_keywords"}
+        article     → {"article"}            (each unique scraped article)
+        saved       → {"url", "status"}      (inserted | duplicate | near_duplicate | error)
+        idea_token  → {"text"}               (Gemini output as it streams)
+        done        → CombinedResponse fields
+        error       → {"detail"}
+
+    `format=ndjson` (default) writes one JSON object per line;
+    `format=sse` writes Server-Sent Events.
+    """
+    if not payload.keywords:
+        raise HTTPException(400, "Keywords cannot be empty")
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(400, "format must be 'ndjson' or 'sse'")
+
+    async def events():
+        gemini = GeminiClient()
+        scraper = Scraper()
+        idea = IdeaGenerator()
+
+        expanded = await gemini.expand_keywords(payload.keywords)
+        expanded = expanded[:MAX_EXPANDED]
+        yield {"event": "keywords", "seed_keywords": payload.keywords, "expanded_keywords": expanded}
+
+        # Saved in chunks until MAX_SAVE_PER_RUN rows are new
+        scraped, saved = [], []
+        async for articles, statuses, dropped in iter_saved(idea, scraper, expanded):
+            for art in articles:
+                yield {"event": "article", "article": _article_out(art)}
+            for st in dropped:
+                yield {"event": "saved", **st}
+            for st in statuses:
+                yield {"event": "saved", "url": st["url"], "status": st["status"]}
+            scraped += articles
+            saved += statuses
+
+        # The articles run_ideas() uses, streamed
+        saved_articles_list = idea_articles(scraped, saved)
+        if not saved_articles_list:
+            ideas = [NO_ARTICLES]
+        else:
+            chunks = []
+            async for chunk in idea.stream_ideas_from_list(saved_articles_list, query=payload.keywords[0]):
+                chunks.append(chunk)
+                yield {"event": "idea_token", "text": chunk}
+            ideas = idea.parse_ideas("".join(chunks))
+
+        done = CombinedResponse(
+            seed_keywords=payload.keywords,
+            expanded_keywords=expanded,
+            ideas=ideas,
+            context_tokens=idea.context_stats["tokens"] if idea.context_stats else None,
+        )
+        yield {"event": "done", **done.model_dump()}
 
-        if len(saved_urls) >= MAX_SAVE_PER_RUN:
-            break
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        _encode_events(events(), format),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-        scraped = await scraper.search_and_scrape(kw)
 
-        for art in scraped:
+# ---------------- 7. Watchlists (background ingestion) ----------------
+@router.get("/watchlists")
+async def list_watchlists():
+    return await asyncio.to_thread(get_ingest_store().list_watchlists)
 
-            if len(saved_urls) >= 10:
-                break
 
-            url = art.get("url")
-            if not url or url in saved_urls:
-                continue
+@router.post("/watchlists")
+async def upsert_watchlist(payload: WatchlistRequest):
+    """Create a watchlist (refreshed right away, then every interval) or update the one with the same keywords."""
+    if not payload.keywords:
+        raise HTTPException(400, "Keywords cannot be empty")
+    watchlist = await asyncio.to_thread(
+        get_ingest_store().upsert_watchlist,
+        payload.keywords,
+        payload.name,
+        payload.interval_seconds,
+        payload.enabled,
+    )
+    return watchlist
 
-            # insert directly (no summary checks, no semantic checks)
-            inserted = await idea.save_article(art)
 
-            
-            # print("DEBUG INSERT RESPONSE:", inserted, "TYPE:", type(inserted))
+@router.delete("/watchlists/{watchlist_id}")
+async def delete_watchlist(watchlist_id: int):
+    if not await asyncio.to_thread(get_ingest_store().delete_watchlist, watchlist_id):
+        raise HTTPException(404, "Watchlist not found")
+    return {"deleted": True}
 
-            # If duplicate (409 case) → skip
-            if isinstance(inserted, dict) and inserted.get("status") == "duplicate":
-                continue
 
-            # If inserted new row → list
-            if isinstance(inserted, list):
-                saved_urls.add(url)
-                saved_articles_list.append(art)
+@router.post("/watchlists/{watchlist_id}/refresh")
+async def refresh_watchlist(watchlist_id: int):
+    """Queue a refresh now instead of waiting for the interval."""
+    try:
+        job_id = await asyncio.to_thread(get_ingest_store().enqueue_now, watchlist_id)
+    except KeyError:
+        raise HTTPException(404, "Watchlist not found")
+    ingest_scheduler.wake()
+    return {"queued": job_id is not None, "job_id": job_id}
 
-                # print("SAVED COUNT:", len(saved_urls))
 
+# ---------------- 8. Worker status ----------------
+@router.get("/worker/status")
+async def worker_status():
+    """Scheduler/worker state in this process plus queue depth and lag."""
+    queue = await asyncio.to_thread(get_ingest_store().stats)
+    return {"enabled": settings.scheduler_enabled, **ingest_scheduler.status(), **queue}
 
 
-    # No articles scraped
-    if not saved_articles_list:
-        return CombinedResponse(
-            seed_keywords=payload.keywords,
-            expanded_keywords=expanded,
-            ideas=["No articles scraped. Try different keywords."]
-        )
+async def _encode_events(events, format: str):
+    try:
+        async for event in events:
+            yield _encode_event(event, format)
+    except Exception as e:
+        print("Stream error:", type(e), str(e))
+        yield _encode_event({"event": "error", "detail": str(e) or type(e).__name__}, format)
 
-    # Generate ideas
-    ideas = await idea.generate_ideas_from_list(saved_articles_list)
 
-    return CombinedResponse(
-        seed_keywords=payload.keywords,
-        expanded_keywords=expanded,
-        ideas=ideas
-    )
+def _encode_event(event: dict, format: str) -> str:
+    if format == "sse":
+        return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+    return json.dumps(event) + "\n"
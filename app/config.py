@@ -20,20 +20,188 @@ class Settings(BaseSettings):
     # -----------------------------
     gemini_api_key: str
     gemini_api_url: str
+    gemini_cache_ttl: float = 86400.0      # seconds a generated response is reused
+    gemini_cache_max_entries: int = 500
+    gemini_cache_path: Optional[str] = ".cache/gemini.sqlite3"   # None = memory only
 
     # -----------------------------
     # Supabase (optional)
     # -----------------------------
     supabase_url: Optional[str] = None
     supabase_key: Optional[str] = None
+    supabase_insert_chunk_size: int = 500   # rows per bulk insert POST
+    supabase_insert_retries: int = 2
+    supabase_page_size: int = 500           # rows per keyset page
+
+    # -----------------------------
+    # Storage backend
+    # -----------------------------
+    storage_backend: str = "postgrest"      # "postgrest" (Supabase REST) | "asyncpg" (direct)
+    database_url: Optional[str] = None      # postgresql://... (asyncpg backend only)
+    db_pool_min_size: int = 1
+    db_pool_max_size: int = 10
+    db_statement_cache_size: int = 100      # prepared statements kept per connection
 
     # -----------------------------
     # SerpAPI  (NEW)
     # -----------------------------
     serpapi_key: str                 # must exist in .env
+    serpapi_base_url: str = "https://serpapi.com/search.json"   # override for local stand-ins
     serpapi_engine: str = "google_news"
     serpapi_region: str = "IN"
     serpapi_language: str = "en"
+    scrape_concurrency: int = 5            # parallel keyword searches per request
+    serpapi_cache_ttl: float = 900.0       # seconds a search result stays fresh
+    serpapi_cache_max_entries: int = 1000
+    serpapi_cache_path: Optional[str] = None   # e.g. ".cache/serpapi.sqlite3" to persist
+
+    # -----------------------------
+    # Outbound HTTP (pooled clients)
+    # -----------------------------
+    http2_enabled: bool = False            # needs the optional 'h2' package
+    http_max_keepalive: int = 10
+    http_keepalive_expiry: float = 30.0
+    http_default_timeout: float = 20.0
+    http_default_max_connections: int = 20
+    gemini_timeout: float = 20.0
+    gemini_max_connections: int = 10
+    serpapi_timeout: float = 20.0
+    serpapi_max_connections: int = 10
+    supabase_timeout: float = 30.0
+    supabase_max_connections: int = 20
+
+    # -----------------------------
+    # Upstream call policy (Gemini, SerpApi, Supabase)
+    # -----------------------------
+    upstream_adaptive_timeouts: bool = True   # per-call timeout from recent latencies
+    upstream_latency_window: int = 200     # recent latencies kept per operation
+    upstream_min_samples: int = 20         # before this, the configured timeout applies
+    upstream_timeout_percentile: float = 0.99
+    upstream_timeout_multiplier: float = 2.0   # timeout = p99 × this, capped by *_TIMEOUT
+    upstream_min_timeout: float = 2.0
+    upstream_hedge_upstreams: str = "serpapi,supabase"   # comma-separated; Gemini is billed per call
+    upstream_hedge_percentile: float = 0.95   # send a duplicate after this latency
+    upstream_hedge_budget: float = 0.1     # hedges earned per call (~10% extra load at most)
+    upstream_hedge_burst: float = 5.0
+    upstream_max_retries: int = 2
+    upstream_retry_budget: float = 0.2     # retries earned per call
+    upstream_retry_burst: float = 10.0
+    upstream_retry_base_delay: float = 0.2   # seconds; full jitter, doubles per attempt
+    breaker_window: int = 20               # recent attempts judged by the circuit breaker
+    breaker_min_calls: int = 10
+    breaker_failure_ratio: float = 0.5     # open the circuit at this share of failures
+    breaker_cooldown: float = 30.0         # seconds open before a probe is let through
+
+    # -----------------------------
+    # Upstream rate limits (token bucket + priority queues)
+    # -----------------------------
+    gemini_rate_limit: float = 10.0        # calls/s across the process (0 = unlimited)
+    gemini_rate_burst: float = 20.0
+    serpapi_rate_limit: float = 5.0
+    serpapi_rate_burst: float = 10.0
+    quota_max_queue: int = 100             # waiting calls per priority class before shedding
+    quota_max_wait_interactive: float = 5.0   # seconds; shed rather than queue longer
+    quota_max_wait_batch: float = 30.0
+    quota_max_wait_background: float = 300.0
+
+    # -----------------------------
+    # Full-article fetch
+    # -----------------------------
+    article_fetch_timeout: float = 10.0
+    article_fetch_max_connections: int = 20
+    article_per_host_limit: int = 2        # concurrent requests per site
+    article_politeness_delay: float = 0.5  # seconds between requests to one site
+    article_max_bytes: int = 1_000_000     # cap on bytes read per page
+    article_extract_workers: int = 2       # processes for HTML → text
+    article_cache_ttl: float = 86400.0     # keep ETag / Last-Modified this long
+    article_cache_max_entries: int = 2000
+    article_cache_path: Optional[str] = None
+
+    # -----------------------------
+    # Near-duplicate stories (MinHash)
+    # -----------------------------
+    near_dup_enabled: bool = True
+    near_dup_threshold: float = 0.5        # min estimated Jaccard (word bigrams) for "same story"
+    near_dup_window_days: int = 7          # recent rows loaded into the index
+    near_dup_store_fingerprints: bool = True    # write fingerprint/canonical_url, so startup seeds the index without re-hashing (needs the schema columns)
+
+    # -----------------------------
+    # Prompt context packing
+    # -----------------------------
+    context_token_budget: int = 1500       # max tokens of article context per prompt
+    context_article_max_tokens: int = 250  # cap per article (summary is trimmed)
+    context_min_article_tokens: int = 40   # don't add an article trimmed below this
+    context_mmr_lambda: float = 0.7        # 1.0 = pure relevance, 0.0 = pure diversity
+    context_candidates: int = 24           # articles ranked before packing
+    context_token_cache_max_entries: int = 5000
+
+    # -----------------------------
+    # Batch ideas (/ideas/batch)
+    # -----------------------------
+    batch_max_keywords: int = 50           # keywords accepted per request
+    batch_topic_token_budget: int = 600    # context tokens per keyword
+    batch_max_topics_per_call: int = 5     # keywords packed into one Gemini call
+    batch_max_prompt_tokens: int = 4000    # context tokens per Gemini call
+    batch_max_concurrent_calls: int = 3
+
+    # -----------------------------
+    # Background ingestion (watchlists)
+    # -----------------------------
+    scheduler_enabled: bool = False        # run scheduler + workers in this process
+    ingest_db_path: str = ".cache/ingest.sqlite3"   # watchlists, job queue, results
+    scheduler_tick_seconds: float = 5.0    # how often due watchlists are queued
+    watchlist_default_interval: float = 1800.0  # seconds between refreshes
+    watchlist_jitter: float = 0.1          # ± fraction of the interval
+    ingest_workers: int = 2                # refresh jobs running at once
+    ingest_max_attempts: int = 3
+    ingest_retry_backoff: float = 60.0     # seconds; doubles per failed attempt
+    precomputed_max_age: float = 3600.0    # serve precomputed results younger than this
+
+    # -----------------------------
+    # Observability
+    # -----------------------------
+    metrics_enabled: bool = True           # expose GET /metrics (Prometheus text format)
+    server_timing_enabled: bool = False    # Server-Timing on every response, not just on `X-Server-Timing: 1`
+
+    # -----------------------------
+    # Serving (python -m app.serve)
+    # -----------------------------
+    serve_workers: int = 0                 # worker processes forked from the master (0 = one per CPU)
+    serve_torch_threads: int = 0           # torch intra-op threads per worker (0 = CPUs / workers)
+
+    # -----------------------------
+    # Embeddings
+    # -----------------------------
+    embedding_model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
+    embedding_backend: str = "torch"       # "torch" (fp32) | "onnx" | "onnx-int8" (dynamic quantization)
+    embedding_onnx_file: Optional[str] = None   # ONNX file in the model repo, e.g. "onnx/model_qint8_avx512.onnx"
+    embedding_onnx_cache_dir: str = ".cache/onnx"   # int8 models quantized locally when the repo has none
+    preload_embedding_model: bool = True   # load + warm up in the FastAPI lifespan
+    embedding_store_dir: str = ".embedding_store"   # memory-mapped article vectors
+    embedding_max_batch_size: int = 64     # texts per micro-batch
+    embedding_max_wait_ms: float = 5.0     # how long a batch waits to fill up
+    embedding_workers: int = 1             # encode threads
+    ranking_window_days: Optional[int] = None   # only rank articles newer than this
+    use_pgvector: bool = False             # write embeddings on save + top-k in Postgres
+    ann_enabled: bool = True               # keyword top-k from the local store instead of scanning the table
+    ann_min_vectors: int = 20000           # below this, exact search; from here on, an IVF index
+    ann_nlist: int = 0                     # IVF lists (0 = ~4·√n)
+    ann_nprobe: int = 32                   # lists scanned per query: higher = better recall, slower
+    ann_vector_dtype: str = "float16"      # compressed codes: float32 | float16 | int8
+    ann_rerank_factor: int = 4             # k × this candidates re-scored with exact vectors
+
+    # -----------------------------
+    # Trending topics (keyword-less /ideas)
+    # -----------------------------
+    topics_enabled: bool = True            # cluster articles on ingest; /ideas uses the hottest topics
+    topic_similarity_threshold: float = 0.5   # min cosine to a topic centroid to join it
+    topic_max_topics: int = 500            # beyond this the coldest topic is recycled
+    topic_half_life_hours: float = 12.0    # an article's weight in topic heat halves this often
+    topic_window_hours: float = 72.0       # articles clustered when starting from scratch
+    topic_sync_overlap_seconds: float = 300.0   # re-read before the watermark for late-committed rows
+    topic_sync_seconds: float = 60.0       # how often the scheduler clusters newly saved rows
+    topic_representatives: int = 5        # newest articles kept per topic for prompts
+    trending_topics: int = 3               # topics /ideas draws its context from
 
     class Config:
         env_file = ".env"
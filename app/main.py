@@ -1,20 +1,155 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.api.v1.endpoints import router
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.config import settings
+from app.services import article_fetcher
+from app.services.context_packer import token_cache
+from app.services.http_clients import http_clients
+from app.services.llm_client import response_cache
+from app.services.metrics import Counter, Gauge, metrics
+from app.services.model_registry import model_registry
+from app.services.scheduler import ingest_scheduler
+from app.services.scraper import search_cache
+from app.services.semantic_engine import peek_semantic_engine
+from app.services.storage_backend import get_storage_backend
+from app.services.tracing import RequestMetricsMiddleware
+from app.services.quota import QuotaExceeded
+from app.services.upstream_policy import UpstreamUnavailable, upstream_policies
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pooled keep-alive clients for Gemini / SerpApi / Supabase
+    http_clients.start()
+    # Opens the asyncpg pool when STORAGE_BACKEND=asyncpg (no-op for PostgREST)
+    await get_storage_backend().start()
 
+    # Load + warm the embedding model once per process, off the event loop
+    if settings.preload_embedding_model:
+        await asyncio.to_thread(model_registry.warmup)
+    # Background watchlist refresh (or run `python -m app.services.scheduler`)
+    if settings.scheduler_enabled:
+        await ingest_scheduler.start()
+    yield
 
-app = FastAPI(title="AI News Research and Idea Generator")
+    await ingest_scheduler.stop()
+    engine = peek_semantic_engine()
+    if engine is not None:
+        await engine.executor.close()
+    article_fetcher.shutdown_pool()
+    await get_storage_backend().close()
+    await http_clients.aclose()
+
+
+app = FastAPI(title="AI News Research and Idea Generator", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Context-Tokens", "X-Context-Articles", "X-Precomputed-Age", "X-Trending-Topics"],
 )
+# Outermost, so the timing includes CORS and every other middleware
+app.add_middleware(RequestMetricsMiddleware)
 
 app.include_router(router)
 
 
+@app.exception_handler(UpstreamUnavailable)
+@app.exception_handler(QuotaExceeded)
+async def upstream_unavailable(request, exc):
+    """An open circuit or a booked-up rate limit answers 503 at once instead of queueing."""
+    return JSONResponse(
+        {"detail": str(exc), "upstream": exc.upstream},
+        status_code=503,
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
+
+
 @app.get("/")
 def home():
     return {"message": "Backend running successfully!"}
+
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: 503 until the preloaded embedding model is ready."""
+    # pid tells the workers of a multi-process server apart
+    status = {**model_registry.status(), "pid": os.getpid()}
+    is_ready = status["loaded"] or not settings.preload_embedding_model
+    return JSONResponse(status, status_code=200 if is_ready else 503)
+
+
+@app.get("/stats")
+def stats():
+    """Runtime counters for the embedding executor and upstream caches."""
+    engine = peek_semantic_engine()
+    store = engine.peek_store() if engine else None
+    topics = engine.peek_topics() if engine else None
+    return {
+        # Per process: under app.serve, the worker that took the request
+        "process": {"pid": os.getpid(), **metrics.const_labels},
+        "embedding_executor": engine.executor.stats() if engine else None,
+        "ann_index": store.index.stats() if store is not None and store.index else None,
+        "topics": topics.stats() if topics is not None else None,
+        "serpapi_cache": search_cache.stats(),
+        "gemini_cache": response_cache.stats(),
+        "context_token_cache": token_cache.stats(),
+        "upstreams": {name: policy.stats() for name, policy in upstream_policies().items()},
+    }
+
+
+# Values that already live on the caches / executor, copied in at scrape time
+_cache_hits = Counter("cache_hits_total", "Lookups answered from cache (incl. coalesced).", ["cache"])
+_cache_misses = Counter("cache_misses_total", "Lookups that went upstream.", ["cache"])
+_cache_ratio = Gauge("cache_hit_ratio", "Share of lookups answered without an upstream call.", ["cache"])
+_cache_entries = Gauge("cache_entries", "In-memory entries.", ["cache"])
+_model_loaded = Gauge("embedding_model_loaded", "1 once the embedding model is loaded.")
+_upstream_timeouts = Gauge(
+    "upstream_timeout_seconds", "Current adaptive timeout per upstream operation.", ["upstream", "op"]
+)
+_embedding_queue = Gauge("embedding_queue_depth", "Encode requests waiting for a batch.")
+_embedding_batches = Counter("embedding_batches_total", "Micro-batches encoded.")
+_embedding_texts = Counter("embedding_texts_total", "Texts encoded.")
+
+
+def _runtime_metrics():
+    for cache in (search_cache, response_cache, token_cache, article_fetcher.validator_cache):
+        s = cache.stats()
+        _cache_hits.set(s["hits"] + s["coalesced"], cache=cache.name)
+        _cache_misses.set(s["misses"], cache=cache.name)
+        _cache_ratio.set(s["hit_ratio"], cache=cache.name)
+        _cache_entries.set(s["entries"], cache=cache.name)
+
+    _model_loaded.set(1 if model_registry.is_loaded else 0)
+
+    for name, policy in upstream_policies().items():
+        for op, s in policy.stats()["ops"].items():
+            _upstream_timeouts.set(s["timeout"], upstream=name, op=op)
+    collected = [_cache_hits, _cache_misses, _cache_ratio, _cache_entries, _model_loaded, _upstream_timeouts]
+
+    engine = peek_semantic_engine()
+    if engine is not None:
+        s = engine.executor.stats()
+        _embedding_queue.set(s["queue_depth"])
+        _embedding_batches.set(s["batches"])
+        _embedding_texts.set(s["texts_encoded"])
+        collected += [_embedding_queue, _embedding_batches, _embedding_texts]
+    return collected
+
+
+metrics.add_collector(_runtime_metrics)
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus scrape endpoint (request, stage, upstream and cache metrics)."""
+    if not settings.metrics_enabled:
+        return JSONResponse({"detail": "Not Found"}, status_code=404)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
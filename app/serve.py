@@ -0,0 +1,188 @@
+# app/serve.py
+
+"""
+Prefork server
+--------------
+Runs the API in several worker processes that share one copy of the
+embedding model:
+
+    python -m app.serve --workers 4 --port 8000
+
+`uvicorn --workers N` spawns N fresh interpreters, so each worker imports
+torch and loads its own copy of the model. Here the master loads the
+model (plus the embedding store and its ANN index, and the topic state)
+once, binds the socket, then fork()s the workers. Their pages are shared
+copy-on-write, and since inference never writes to the weights they stay
+shared for the life of the worker.
+
+- gc.freeze() right before forking keeps the workers' collector from
+  touching (and so copying) the objects loaded by the master.
+- No encode runs in the master: the warm-up (PRELOAD_EMBEDDING_MODEL) runs
+  in each worker, whose thread pools are created after the fork. Each
+  worker gets SERVE_TORCH_THREADS intra-op threads (default: CPUs /
+  workers), so N workers don't oversubscribe the cores.
+- ONNX Runtime sessions own threads and don't survive a fork, so with the
+  onnx backends each worker loads its own (smaller) model.
+- The app itself (HTTP clients, caches with SQLite tiers) is imported in
+  the workers. The embedding store and the topic state stay on disk in
+  one directory: workers write to it under a file lock, reloading what
+  the others wrote first, and see each other's rows on their next read
+  (see EmbeddingStore / TopicClusters).
+- Only worker 0 runs the watchlist scheduler (SCHEDULER_ENABLED).
+- Rate limits are enforced per process, so each worker gets 1/N of
+  *_RATE_LIMIT and *_RATE_BURST (at least one token of burst). Circuit
+  breakers, retry budgets and adaptive timeouts are per worker too.
+  /stats and /metrics describe the worker that answered; metrics carry a
+  `worker` label so a scraper can tell them apart and sum them.
+- A worker that exits is forked again from the master, model included;
+  SIGTERM / SIGINT shut all workers down gracefully.
+
+Compare with one model per worker: `python -m benchmarks.bench_workers`.
+"""
+
+import argparse
+import gc
+import os
+import signal
+import sys
+import time
+import traceback
+
+import uvicorn
+
+from app.config import settings
+from app.services.embedding_store import get_embedding_store
+from app.services.metrics import metrics
+from app.services.model_registry import model_registry
+from app.services.topic_clusters import get_topic_clusters
+
+APP = "app.main:app"
+MIN_UPTIME = 5.0   # a worker that dies sooner is re-forked after a pause
+
+
+def preload():
+    """Load what the workers share (blocking; runs in the master)."""
+    if settings.preload_embedding_model:
+        if model_registry.backend == "torch":
+            try:
+                model_registry.load()
+                print(f"Loaded {model_registry.model_name} in {model_registry.load_seconds:.1f}s (shared)")
+            except Exception as e:
+                # Workers try again on their own and report it in /ready
+                print("Model preload error:", type(e), str(e))
+        else:
+            print(f"The {model_registry.backend} backend isn't fork-safe; each worker loads its own model")
+
+    # The store and topics are tagged with the backend that actually loaded,
+    # so without a model in the master the workers open them themselves
+    if not model_registry.is_loaded:
+        return
+    store = get_embedding_store()
+    if settings.ann_enabled and len(store) >= settings.ann_min_vectors:
+        store.build_index(
+            nlist=settings.ann_nlist,
+            nprobe=settings.ann_nprobe,
+            dtype=settings.ann_vector_dtype,
+            rerank_factor=settings.ann_rerank_factor,
+        )
+    if settings.topics_enabled:
+        get_topic_clusters()
+
+
+def _run_worker(index: int, workers: int, sock, args):
+    """Body of a forked worker; never returns."""
+    code = 0
+    try:
+        # The master's handlers (and its list of workers) don't apply here
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        gc.enable()
+
+        torch = sys.modules.get("torch")
+        if torch is not None:
+            torch.set_num_threads(settings.serve_torch_threads or max(1, (os.cpu_count() or 1) // workers))
+        if index > 0:
+            settings.scheduler_enabled = False
+
+        # The upstreams' limits are shared by all workers
+        settings.gemini_rate_limit /= workers
+        settings.gemini_rate_burst /= workers
+        settings.serpapi_rate_limit /= workers
+        settings.serpapi_rate_burst /= workers
+        metrics.set_const_labels(worker=index)
+
+        config = uvicorn.Config(APP, host=args.host, port=args.port, log_level=args.log_level)
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def serve(args):
+    workers = args.workers or os.cpu_count() or 1
+
+    # No collections while loading: fewer freed holes in pages the workers share
+    gc.disable()
+    started = time.perf_counter()
+    preload()
+    sock = uvicorn.Config(APP, host=args.host, port=args.port).bind_socket()
+    gc.collect()
+    gc.freeze()
+    print(f"Master {os.getpid()} ready in {time.perf_counter() - started:.1f}s, forking {workers} workers")
+
+    children: dict[int, tuple[int, float]] = {}   # pid -> (worker index, started)
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(index, workers, sock, args)
+        children[pid] = (index, time.monotonic())
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        # SIGTERM: a graceful shutdown in uvicorn (a second SIGINT would force it)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for index in range(workers):
+        spawn(index)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index, since = children.pop(pid, (None, 0.0))
+        if stopping or index is None:
+            continue
+        print(f"Worker {index} (pid {pid}) exited with status {status}, restarting")
+        if time.monotonic() - since < MIN_UPTIME:
+            time.sleep(MIN_UPTIME)
+        if not stopping:
+            spawn(index)
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API from workers forked after loading the model.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.serve_workers, help="0 = one per CPU")
+    parser.add_argument("--log-level", default="info")
+    serve(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
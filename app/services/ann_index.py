@@ -0,0 +1,226 @@
+# app/services/ann_index.py
+
+"""
+IVFIndex
+--------
+In-process approximate nearest-neighbour index for L2-normalised
+vectors (inverted file, as in FAISS IndexIVF):
+
+- train() clusters a sample into `nlist` centroids (spherical k-means);
+  every vector lives in the list of its nearest centroid.
+- search() scores only the `nprobe` closest lists using compressed
+  codes (float16, or int8 with a per-vector scale), keeps the best
+  k * rerank_factor candidates with argpartition, and re-scores those
+  exactly against the full-precision vectors. nprobe is the
+  recall/latency knob: nprobe == nlist is an exhaustive scan.
+- add() / remove() are incremental; an id that is added again is moved.
+
+Ids are caller-defined ints (EmbeddingStore uses its row numbers), and
+`exact(ids)` must return their float32 vectors for the re-rank.
+"""
+
+import threading
+from typing import Callable, Optional
+
+import numpy as np
+
+CODE_DTYPES = ("float32", "float16", "int8")
+
+
+def auto_nlist(n: int) -> int:
+    """~4·√n lists, the usual IVF rule of thumb."""
+    return int(min(4096, max(16, 4 * np.sqrt(max(n, 1)))))
+
+
+class _List:
+    """Growable (ids, codes, scales) arrays of one inverted list."""
+
+    def __init__(self, dim: int, dtype):
+        self.size = 0
+        self.ids = np.empty(16, dtype=np.int64)
+        self.codes = np.empty((16, dim), dtype=dtype)
+        self.scales = np.empty(16, dtype=np.float32)
+
+    def append(self, ids: np.ndarray, codes: np.ndarray, scales: np.ndarray):
+        end = self.size + len(ids)
+        if end > len(self.ids):
+            capacity = max(end, len(self.ids) * 2)
+            self.ids = np.resize(self.ids, capacity)
+            self.scales = np.resize(self.scales, capacity)
+            grown = np.empty((capacity, self.codes.shape[1]), dtype=self.codes.dtype)
+            grown[:self.size] = self.codes[:self.size]
+            self.codes = grown
+        self.ids[self.size:end] = ids
+        self.codes[self.size:end] = codes
+        self.scales[self.size:end] = scales
+        self.size = end
+
+    def pop(self, slot: int) -> Optional[int]:
+        """Swap-remove `slot`; returns the id that moved into it (if any)."""
+        last = self.size - 1
+        moved = None
+        if slot != last:
+            self.ids[slot] = self.ids[last]
+            self.codes[slot] = self.codes[last]
+            self.scales[slot] = self.scales[last]
+            moved = int(self.ids[slot])
+        self.size = last
+        return moved
+
+
+class IVFIndex:
+    def __init__(
+        self,
+        dim: int,
+        exact: Callable[[np.ndarray], np.ndarray],
+        nlist: int = 0,
+        nprobe: int = 16,
+        dtype: str = "float16",
+        rerank_factor: int = 4,
+        seed: int = 0,
+    ):
+        if dtype not in CODE_DTYPES:
+            raise ValueError(f"Unknown code dtype {dtype!r} (expected one of {', '.join(CODE_DTYPES)})")
+        self.dim = dim
+        self.exact = exact
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.dtype = dtype
+        self.rerank_factor = rerank_factor
+        self.seed = seed
+
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        self._lists: list[_List] = []
+        self._where: dict[int, tuple[int, int]] = {}   # id -> (list, slot)
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, id_) -> bool:
+        return int(id_) in self._where
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    # ------------------------------------------------------------
+    # Training
+    # ------------------------------------------------------------
+    def train(self, vectors: np.ndarray, iterations: int = 10, sample: int = 50_000):
+        """Spherical k-means on (a sample of) `vectors`; drops current contents."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > sample:
+            vectors = vectors[rng.choice(len(vectors), sample, replace=False)]
+
+        nlist = min(self.nlist or auto_nlist(len(vectors)), len(vectors))
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assign = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, vectors)
+            counts = np.bincount(assign, minlength=nlist)
+            # Empty clusters keep their old centroid
+            filled = counts > 0
+            centroids[filled] = sums[filled]
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        with self._lock:
+            self.centroids = centroids
+            self.trained_size = len(vectors)
+            self._lists = [_List(self.dim, np.dtype(self.dtype)) for _ in range(nlist)]
+            self._where = {}
+
+    # ------------------------------------------------------------
+    # Incremental updates
+    # ------------------------------------------------------------
+    def _encode(self, vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if self.dtype == "int8":
+            scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+            codes = np.round(vectors / scales[:, None]).astype(np.int8)
+            return codes, scales.astype(np.float32)
+        return vectors.astype(self.dtype), np.ones(len(vectors), dtype=np.float32)
+
+    def add(self, ids, vectors: np.ndarray):
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(ids):
+            return
+        with self._lock:
+            if not self.is_trained:
+                raise RuntimeError("IVFIndex.add() before train()")
+            moved = [id_ for id_ in ids.tolist() if id_ in self._where]
+            if moved:
+                self.remove(moved)
+            assign = np.argmax(vectors @ self.centroids.T, axis=1)
+            codes, scales = self._encode(vectors)
+            for lst in np.unique(assign):
+                mask = assign == lst
+                target = self._lists[lst]
+                start = target.size
+                target.append(ids[mask], codes[mask], scales[mask])
+                for offset, id_ in enumerate(ids[mask]):
+                    self._where[int(id_)] = (int(lst), start + offset)
+
+    def remove(self, ids):
+        with self._lock:
+            for id_ in np.asarray(ids, dtype=np.int64).ravel():
+                loc = self._where.pop(int(id_), None)
+                if loc is None:
+                    continue
+                lst, slot = loc
+                moved = self._lists[lst].pop(slot)
+                if moved is not None:
+                    self._where[moved] = (lst, slot)
+
+    # ------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------
+    def search(self, query: np.ndarray, k: int, nprobe: Optional[int] = None) -> tuple[np.ndarray, np.ndarray]:
+        """(ids, scores) of the approximate top-k by cosine, best first."""
+        query = np.asarray(query, dtype=np.float32).ravel()
+        with self._lock:
+            if not self.is_trained or not self._where or k <= 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+            nprobe = min(nprobe or self.nprobe, len(self._lists))
+            coarse = self.centroids @ query
+            probe = np.argpartition(-coarse, nprobe - 1)[:nprobe]
+            lists = [self._lists[i] for i in probe if self._lists[i].size]
+            if not lists:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+            ids = np.concatenate([l.ids[:l.size] for l in lists])
+            codes = np.concatenate([l.codes[:l.size] for l in lists])
+            scales = np.concatenate([l.scales[:l.size] for l in lists])
+
+        approx = (codes.astype(np.float32) @ query) * scales
+        n_cand = min(len(ids), max(k, k * self.rerank_factor))
+        cand = np.argpartition(-approx, n_cand - 1)[:n_cand]
+
+        if self.dtype == "float32" or self.rerank_factor <= 1:
+            scores = approx[cand]
+        else:
+            scores = self.exact(ids[cand]) @ query
+        cand_ids = ids[cand]
+
+        k = min(k, len(cand))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return cand_ids[top], scores[top]
+
+    def stats(self) -> dict:
+        sizes = [l.size for l in self._lists]
+        return {
+            "vectors": len(self),
+            "nlist": len(self._lists),
+            "nprobe": self.nprobe,
+            "dtype": self.dtype,
+            "rerank_factor": self.rerank_factor,
+            "trained_size": self.trained_size,
+            "largest_list": max(sizes) if sizes else 0,
+            "code_bytes": sum(l.size * l.codes.itemsize * self.dim for l in self._lists),
+        }
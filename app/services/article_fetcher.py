@@ -0,0 +1,201 @@
+# app/services/article_fetcher.py
+
+"""
+ArticleFetcher
+--------------
+Downloads full article pages for the top search results and replaces
+the 1-2 line SerpApi snippet with the readable article text.
+
+- Pages are fetched concurrently, with at most ARTICLE_PER_HOST_LIMIT
+  requests per host and ARTICLE_POLITENESS_DELAY seconds between
+  requests to the same host.
+- At most ARTICLE_MAX_BYTES are read per page.
+- ETag / Last-Modified are remembered, so a re-fetch sends
+  If-None-Match / If-Modified-Since and reuses the cached text on 304.
+- readability + BeautifulSoup extraction runs in a process pool, so
+  lxml parsing never blocks the event loop.
+"""
+
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from urllib.parse import urlsplit
+
+from app.config import settings
+from app.services.cache import TTLCache
+from app.services.http_clients import http_clients
+from app.services.tracing import traced
+
+USER_AGENT = "Mozilla/5.0 (compatible; ai-news-generator/1.0)"
+
+# url -> {"etag", "last_modified", "title", "text"}
+validator_cache = TTLCache(
+    "articles",
+    ttl=settings.article_cache_ttl,
+    max_entries=settings.article_cache_max_entries,
+    disk_path=settings.article_cache_path,
+)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def extract_text(html: str) -> dict:
+    """HTML → {"title", "text"} (runs in a worker process)."""
+    from bs4 import BeautifulSoup
+    from readability import Document
+
+    try:
+        doc = Document(html)
+        title = doc.short_title() or ""
+        main_html = doc.summary(html_partial=True)
+    except Exception:
+        title, main_html = "", html
+
+    text = BeautifulSoup(main_html, "lxml").get_text(" ", strip=True)
+    return {"title": title, "text": text}
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Not fork: by now the parent has torch and thread pools loaded,
+        # and forking a multi-threaded process can deadlock the child.
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        _pool = ProcessPoolExecutor(max_workers=settings.article_extract_workers, mp_context=context)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+class ArticleFetcher:
+    def __init__(
+        self,
+        max_bytes: int = None,
+        per_host_limit: int = None,
+        politeness_delay: float = None,
+    ):
+        self.max_bytes = max_bytes or settings.article_max_bytes
+        self.per_host_limit = per_host_limit or settings.article_per_host_limit
+        self.politeness_delay = (
+            settings.article_politeness_delay if politeness_delay is None else politeness_delay
+        )
+        self._host_slots: dict[str, asyncio.Semaphore] = {}
+        self._host_locks: dict[str, asyncio.Lock] = {}
+        self._host_last: dict[str, float] = {}
+
+    # ------------------------------------------------------------
+    # Per-host politeness
+    # ------------------------------------------------------------
+    async def _wait_turn(self, host: str):
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            wait = self._host_last.get(host, 0) + self.politeness_delay - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._host_last[host] = time.monotonic()
+
+    # ------------------------------------------------------------
+    # Single page
+    # ------------------------------------------------------------
+    async def fetch(self, url: str) -> Optional[dict]:
+        """Return {"title", "text"} for `url`, or None if it couldn't be read."""
+        host = urlsplit(url).netloc.lower()
+        slots = self._host_slots.setdefault(host, asyncio.Semaphore(self.per_host_limit))
+        cached = await validator_cache.aget(url)
+
+        headers = {"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml"}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        async with slots:
+            await self._wait_turn(host)
+            try:
+                html, response = await self._read_capped(url, headers)
+            except Exception as e:
+                print("Article fetch error:", url, type(e), str(e))
+                return None
+
+        if response.status_code == 304 and cached:
+            return {"title": cached.get("title", ""), "text": cached.get("text", "")}
+        if response.status_code >= 400 or not html:
+            return None
+
+        loop = asyncio.get_running_loop()
+        try:
+            extracted = await loop.run_in_executor(_get_pool(), extract_text, html)
+        except Exception as e:
+            print("Article extract error:", url, type(e), str(e))
+            return None
+
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        if etag or last_modified:
+            await validator_cache.aset(url, {"etag": etag, "last_modified": last_modified, **extracted})
+
+        return extracted
+
+    @traced("articles.fetch")
+    async def _read_capped(self, url: str, headers: dict):
+        client = http_clients.get("articles")
+        async with client.stream("GET", url, headers=headers) as response:
+            if response.status_code != 200:
+                return "", response
+
+            content_type = response.headers.get("content-type", "")
+            if content_type and "html" not in content_type:
+                return "", response
+
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+                if len(body) >= self.max_bytes:
+                    break
+
+            encoding = response.encoding or "utf-8"
+            return bytes(body[:self.max_bytes]).decode(encoding, errors="replace"), response
+
+    # ------------------------------------------------------------
+    # Pipeline stage
+    # ------------------------------------------------------------
+    @traced("articles.enrich")
+    async def enrich(self, articles: list[dict], top_n: int) -> list[dict]:
+        """
+        Fetch the first `top_n` articles concurrently and, where the page
+        yields more text than the snippet, use it as the summary.
+        Articles are updated in place and also returned.
+        """
+        targets = [a for a in articles[:top_n] if a.get("url")]
+        results = await asyncio.gather(*(self.fetch(a["url"]) for a in targets))
+
+        for art, page in zip(targets, results):
+            if not page:
+                continue
+            text = page.get("text") or ""
+            if len(text) > len(art.get("summary") or ""):
+                art["summary"] = text
+            if not art.get("title") and page.get("title"):
+                art["title"] = page["title"]
+
+        return articles
+
+
+_fetcher: Optional[ArticleFetcher] = None
+
+
+def get_article_fetcher() -> ArticleFetcher:
+    """Process-wide fetcher, so per-host limits hold across requests."""
+    global _fetcher
+    if _fetcher is None:
+        _fetcher = ArticleFetcher()
+    return _fetcher
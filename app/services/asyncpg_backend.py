@@ -0,0 +1,487 @@
+# app/services/asyncpg_backend.py
+
+"""
+AsyncpgBackend
+--------------
+StorageBackend that connects straight to Postgres (STORAGE_BACKEND=asyncpg,
+DATABASE_URL=postgresql://...), skipping the PostgREST HTTP/JSON hop.
+
+- One asyncpg connection pool per process, opened in the FastAPI lifespan.
+- Statements are prepared once per connection and reused from asyncpg's
+  statement cache (DB_STATEMENT_CACHE_SIZE). Point DATABASE_URL at the
+  direct / session-mode port: transaction-mode poolers (pgbouncer) can't
+  keep prepared statements.
+- insert_many() streams rows with COPY into a temp table, then
+  INSERT ... SELECT ... ON CONFLICT (url) DO NOTHING RETURNING *.
+
+Values are sent as text and cast to the column's declared type, so the
+PostgREST-style string filters ("created_at=gte.2025-01-01") behave the
+same as on the HTTP backend. Rows come back JSON-friendly (timestamps as
+ISO strings), matching what PostgREST returns.
+"""
+
+import asyncio
+import json
+import re
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import AsyncIterator, Optional
+from urllib.parse import unquote
+from uuid import UUID, uuid4
+
+import asyncpg
+
+from app.config import settings
+from app.services.storage_backend import StorageBackend
+
+_IDENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+_OPS = {
+    "eq": "=",
+    "neq": "<>",
+    "lt": "<",
+    "lte": "<=",
+    "gt": ">",
+    "gte": ">=",
+    "like": "LIKE",
+    "ilike": "ILIKE",
+}
+
+# in.(a,"b,c",d): bare items, or double-quoted with \-escapes
+_IN_ITEM = re.compile(r'\s*(?:"((?:[^"\\]|\\.)*)"|([^,]*))\s*(?:,|$)')
+
+_RETRYABLE = (OSError, asyncio.TimeoutError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError)
+
+
+def _ident(name: str) -> str:
+    if not _IDENT.match(name):
+        raise ValueError(f"Invalid identifier: {name!r}")
+    return f'"{name}"'
+
+
+def _in_items(operand: str) -> list[str]:
+    body = operand.strip()
+    if body.startswith("(") and body.endswith(")"):
+        body = body[1:-1]
+    items = []
+    for quoted, bare in _IN_ITEM.findall(body):
+        if quoted:
+            items.append(re.sub(r"\\(.)", r"\1", quoted))
+        elif bare.strip():
+            items.append(bare.strip())
+    return items
+
+
+def _input_params(names, modes, types) -> dict[str, str]:
+    """
+    Named input parameters of a pg_proc row → {name: type}. `names` and
+    `modes` cover every argument (OUT and TABLE columns too) or are NULL;
+    unnamed arguments can't be passed by name, so they're left out.
+    Parameters with a DEFAULT are included; callers may omit them.
+    """
+    names = names or [""] * len(types)
+    modes = modes or ["i"] * len(types)
+    return {
+        name: arg_type
+        for name, mode, arg_type in zip(names, modes, types)
+        if name and mode in ("i", "b", "v")   # IN, INOUT, VARIADIC
+    }
+
+
+def _to_text(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return str(value)
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def _row(record) -> dict:
+    return {k: _jsonable(v) for k, v in record.items()}
+
+
+def _vector_in(text: str) -> list[float]:
+    return [float(x) for x in text.strip("[]").split(",") if x]
+
+
+def _vector_out(value) -> str:
+    return value if isinstance(value, str) else json.dumps([float(x) for x in value])
+
+
+class AsyncpgBackend(StorageBackend):
+    name = "asyncpg"
+    retryable_errors = _RETRYABLE
+
+    def __init__(self, dsn: Optional[str] = None):
+        self.dsn = dsn or settings.database_url
+        if not self.dsn:
+            raise RuntimeError("DATABASE_URL is required when STORAGE_BACKEND=asyncpg")
+
+        self._pool: Optional[asyncpg.Pool] = None
+        self._start_lock = asyncio.Lock()
+        self._column_types: dict[str, dict[str, str]] = {}
+        self._function_args: dict[str, dict[str, str]] = {}
+
+    # ------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------
+    async def start(self):
+        async with self._start_lock:
+            if self._pool is None:
+                self._pool = await asyncpg.create_pool(
+                    self.dsn,
+                    min_size=settings.db_pool_min_size,
+                    max_size=settings.db_pool_max_size,
+                    statement_cache_size=settings.db_statement_cache_size,
+                    init=self._init_connection,
+                )
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    @staticmethod
+    async def _init_connection(conn):
+        # pgvector columns come back as lists of floats (if the extension exists)
+        try:
+            await conn.set_type_codec(
+                "vector", schema="public", format="text",
+                encoder=_vector_out, decoder=_vector_in,
+            )
+        except (ValueError, asyncpg.PostgresError):
+            pass
+
+    async def _get_pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            await self.start()
+        return self._pool
+
+    # ------------------------------------------------------------
+    # Catalog lookups (cached)
+    # ------------------------------------------------------------
+    async def _columns(self, conn, table: str) -> dict[str, str]:
+        types = self._column_types.get(table)
+        if types is None:
+            rows = await conn.fetch(
+                "SELECT a.attname, format_type(a.atttypid, a.atttypmod) AS type"
+                " FROM pg_attribute a"
+                " WHERE a.attrelid = $1::text::regclass AND a.attnum > 0 AND NOT a.attisdropped"
+                " ORDER BY a.attnum",
+                table,
+            )
+            types = {r["attname"]: r["type"] for r in rows}
+            self._column_types[table] = types
+        return types
+
+    async def _function_params(self, conn, function: str) -> dict[str, str]:
+        params = self._function_args.get(function)
+        if params is None:
+            proc = await conn.fetchrow(
+                "SELECT p.proargnames AS names, p.proargmodes::text[] AS modes,"
+                " ARRAY(SELECT format_type(a.t, NULL)"
+                "       FROM unnest(COALESCE(p.proallargtypes, p.proargtypes::oid[])) WITH ORDINALITY a(t, n)"
+                "       ORDER BY a.n) AS types"
+                " FROM pg_proc p"
+                " WHERE p.proname = $1 AND p.pronamespace = 'public'::regnamespace"
+                " ORDER BY p.oid LIMIT 1",
+                function,
+            )
+            if proc is None:
+                raise ValueError(f"Unknown function: {function}")
+            params = _input_params(proc["names"], proc["modes"], proc["types"])
+            self._function_args[function] = params
+        return params
+
+    # ------------------------------------------------------------
+    # PostgREST-style query → SQL
+    # ------------------------------------------------------------
+    def _parse_query(self, query: str) -> list[tuple[str, str]]:
+        pairs = []
+        for part in filter(None, query.split("&")):
+            key, _, value = part.partition("=")
+            pairs.append((unquote(key), unquote(value)))
+        return pairs
+
+    def _build(self, params: list[tuple[str, str]], types: dict[str, str]):
+        """Returns (select_sql, where_sql, order_sql, limit_sql, args)."""
+        select_sql, order_sql, limit_sql = "*", "", ""
+        where, args = [], []
+
+        for key, value in params:
+            if key == "select":
+                if value != "*":
+                    select_sql = ", ".join(_ident(c.strip()) for c in value.split(",") if c.strip())
+                continue
+            if key == "order":
+                terms = []
+                for term in value.split(","):
+                    col, _, direction = term.strip().partition(".")
+                    direction = direction.split(".")[0].upper() or "ASC"
+                    if direction not in ("ASC", "DESC"):
+                        raise ValueError(f"Unsupported order: {term}")
+                    terms.append(f"{_ident(col)} {direction}")
+                order_sql = " ORDER BY " + ", ".join(terms)
+                continue
+            if key == "limit":
+                limit_sql = f" LIMIT {int(value)}"
+                continue
+            if key == "offset":
+                limit_sql += f" OFFSET {int(value)}"
+                continue
+
+            col = _ident(key)
+            col_type = types.get(key, "text")
+            op, _, operand = value.partition(".")
+
+            if op == "is":
+                literal = {"null": "NULL", "true": "TRUE", "false": "FALSE"}.get(operand.lower())
+                if literal is None:
+                    raise ValueError(f"Unsupported is-filter: {value}")
+                where.append(f"{col} IS {literal}")
+            elif op == "in":
+                items = _in_items(operand)
+                args.append(items)
+                where.append(f"{col} = ANY(${len(args)}::text[]::{col_type}[])")
+            elif op in _OPS:
+                if op in ("like", "ilike"):
+                    operand = operand.replace("*", "%")
+                args.append(operand)
+                where.append(f"{col} {_OPS[op]} ${len(args)}::text::{col_type}")
+            else:
+                raise ValueError(f"Unsupported filter for asyncpg backend: {key}={value}")
+
+        where_sql = (" WHERE " + " AND ".join(where)) if where else ""
+        return select_sql, where_sql, order_sql, limit_sql, args
+
+    async def _select(self, table: str, params: list[tuple[str, str]]) -> list[dict]:
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            types = await self._columns(conn, table)
+            select_sql, where_sql, order_sql, limit_sql, args = self._build(params, types)
+            rows = await conn.fetch(
+                f"SELECT {select_sql} FROM {_ident(table)}{where_sql}{order_sql}{limit_sql}", *args
+            )
+        return [_row(r) for r in rows]
+
+    # ------------------------------------------------------------
+    # INSERT
+    # ------------------------------------------------------------
+    async def insert(self, table: str, data: dict):
+        """Insert one row; returns [row], or [] if it already existed."""
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            types = await self._columns(conn, table)
+            cols = list(data)
+            values = ", ".join(
+                f"${i}::text::{types.get(c, 'text')}" for i, c in enumerate(cols, start=1)
+            )
+            rows = await conn.fetch(
+                f"INSERT INTO {_ident(table)} ({', '.join(_ident(c) for c in cols)})"
+                f" VALUES ({values}) ON CONFLICT DO NOTHING RETURNING *",
+                *[_to_text(data[c]) for c in cols],
+            )
+        return [_row(r) for r in rows]
+
+    async def insert_many(
+        self,
+        table: str,
+        rows: list[dict],
+        on_conflict: str = "url",
+        chunk_size: int = None,
+        retries: int = None,
+    ) -> list[dict]:
+        chunk_size = chunk_size or settings.supabase_insert_chunk_size
+        retries = settings.supabase_insert_retries if retries is None else retries
+
+        results = []
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            inserted = await self._copy_chunk(table, chunk, on_conflict, retries)
+
+            if inserted is None:
+                results.extend(
+                    {"url": r.get(on_conflict), "status": "error", "row": None} for r in chunk
+                )
+                continue
+
+            by_key = {r.get(on_conflict): r for r in inserted}
+            for r in chunk:
+                key = r.get(on_conflict)
+                row = by_key.pop(key, None)
+                results.append({
+                    "url": key,
+                    "status": "inserted" if row is not None else "duplicate",
+                    "row": row,
+                })
+
+        return results
+
+    async def _copy_chunk(self, table: str, chunk: list[dict], on_conflict: str, retries: int):
+        """COPY one chunk into a temp table and upsert it; None after giving up."""
+        cols = list(dict.fromkeys(c for r in chunk for c in r))
+        records = [tuple(_to_text(r.get(c)) for c in cols) for r in chunk]
+        pool = await self._get_pool()
+
+        for attempt in range(retries + 1):
+            # A fresh name per attempt: never collides with a leftover temp
+            # table on a reused connection, whether or not ON COMMIT DROP ran
+            tmp = f"_ingest_{table}_{uuid4().hex[:12]}"
+            try:
+                async with pool.acquire() as conn:
+                    types = await self._columns(conn, table)
+                    col_list = ", ".join(_ident(c) for c in cols)
+                    casts = ", ".join(f"{_ident(c)}::{types.get(c, 'text')}" for c in cols)
+
+                    async with conn.transaction():
+                        await conn.execute(
+                            f"CREATE TEMP TABLE {_ident(tmp)}"
+                            f" ({', '.join(f'{_ident(c)} text' for c in cols)}) ON COMMIT DROP"
+                        )
+                        await conn.copy_records_to_table(tmp, records=records, columns=cols)
+                        inserted = await conn.fetch(
+                            f"INSERT INTO {_ident(table)} ({col_list})"
+                            f" SELECT {casts} FROM {_ident(tmp)}"
+                            f" ON CONFLICT ({_ident(on_conflict)}) DO NOTHING RETURNING *"
+                        )
+                return [_row(r) for r in inserted]
+            except _RETRYABLE as e:
+                print("BULK INSERT ERROR:", type(e), str(e))
+            except asyncpg.PostgresError as e:
+                print("BULK INSERT ERROR:", type(e), str(e))
+                return None
+
+            if attempt < retries:
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+        return None
+
+    # ------------------------------------------------------------
+    # READ
+    # ------------------------------------------------------------
+    async def fetch_all(self, table: str):
+        # Accept the legacy "table?query" form too
+        table, _, query = table.partition("?")
+        return await self._select(table, self._parse_query(query))
+
+    async def fetch_page(
+        self,
+        table: str,
+        columns: str = "*",
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        filters: Optional[dict] = None,
+    ) -> list[dict]:
+        params = [("select", columns)]
+        if order:
+            params.append(("order", order))
+        if limit is not None:
+            params.append(("limit", str(limit)))
+        params.extend((filters or {}).items())
+        return await self._select(table, params)
+
+    async def iter_pages(
+        self,
+        table: str,
+        columns: str = "id,url,title,summary,created_at",
+        page_size: int = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> AsyncIterator[list[dict]]:
+        page_size = page_size or settings.supabase_page_size
+
+        wanted = [c.strip() for c in columns.split(",") if c.strip()]
+        if "*" in wanted:
+            select_sql = "*"
+        else:
+            wanted += [c for c in ("created_at", "id") if c not in wanted]
+            select_sql = ", ".join(_ident(c) for c in wanted)
+
+        sql = (
+            f"SELECT {select_sql} FROM {_ident(table)}"
+            " WHERE ($1::text IS NULL OR created_at >= $1::text::timestamptz)"
+            " AND ($2::text IS NULL OR created_at < $2::text::timestamptz)"
+            " AND ($3::timestamptz IS NULL OR (created_at, id) < ($3::timestamptz, $4::bigint))"
+            " ORDER BY created_at DESC, id DESC LIMIT $5"
+        )
+
+        pool = await self._get_pool()
+        cursor = (None, None)
+        while True:
+            async with pool.acquire() as conn:
+                records = await conn.fetch(sql, since, until, cursor[0], cursor[1], page_size)
+            if not records:
+                return
+
+            yield [_row(r) for r in records]
+
+            if len(records) < page_size:
+                return
+            cursor = (records[-1]["created_at"], records[-1]["id"])
+
+    async def rpc(self, function: str, params: dict):
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            arg_types = await self._function_params(conn, function)
+            names = list(params)
+            call_args = ", ".join(
+                f"{_ident(n)} => ${i}::text::{arg_types.get(n, 'text')}"
+                for i, n in enumerate(names, start=1)
+            )
+            rows = await conn.fetch(
+                f"SELECT * FROM {_ident(function)}({call_args})",
+                *[_to_text(params[n]) for n in names],
+            )
+        return [_row(r) for r in rows]
+
+    async def fetch_by_query(self, table: str, query: str):
+        return await self._select(table, self._parse_query(query))
+
+    async def fetch_one(self, table: str, filters: dict):
+        params = [(col, f"eq.{value}") for col, value in filters.items()]
+        params.append(("limit", "1"))
+        rows = await self._select(table, params)
+        return rows[0] if rows else None
+
+    # ------------------------------------------------------------
+    # UPDATE / DELETE
+    # ------------------------------------------------------------
+    async def update(self, table: str, query: str, data: dict):
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            types = await self._columns(conn, table)
+            _, where_sql, _, _, args = self._build(self._parse_query(query), types)
+            if not where_sql:
+                raise ValueError("update() requires a filter")
+
+            sets = []
+            for col, value in data.items():
+                args.append(_to_text(value))
+                sets.append(f"{_ident(col)} = ${len(args)}::text::{types.get(col, 'text')}")
+
+            rows = await conn.fetch(
+                f"UPDATE {_ident(table)} SET {', '.join(sets)}{where_sql} RETURNING *", *args
+            )
+        return [_row(r) for r in rows]
+
+    async def delete(self, table: str, query: str):
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            types = await self._columns(conn, table)
+            _, where_sql, _, _, args = self._build(self._parse_query(query), types)
+            if not where_sql:
+                raise ValueError("delete() requires a filter")
+            await conn.execute(f"DELETE FROM {_ident(table)}{where_sql}", *args)
+        return {"deleted": True}
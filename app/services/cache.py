@@ -0,0 +1,249 @@
+# app/services/cache.py
+
+"""
+TTLCache
+--------
+Small response cache used in front of paid upstream APIs.
+
+- In-memory LRU tier (bounded by `max_entries`) with per-entry TTL.
+- Optional SQLite tier (`disk_path`) so warm entries survive restarts;
+  expired rows are purged and it is capped at `max_disk_entries`.
+- get_or_compute() adds single-flight: concurrent callers asking for the
+  same key share one upstream call instead of each making their own.
+- hit / miss / coalesced counters for /stats.
+
+Values must be JSON-serialisable when the disk tier is enabled.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+_MISSING = object()
+
+
+class _LeaderCancelled(Exception):
+    """The call that followers were waiting on was cancelled; they retry."""
+
+
+class TTLCache:
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        max_entries: int = 1000,
+        disk_path: Optional[str] = None,
+        max_disk_entries: Optional[int] = None,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries or max_entries * 10
+        self._writes = 0
+        self._memory: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+        # The SQLite tier is opened on first use (see _disk()), not here:
+        # caches are created at import time, possibly in a master that
+        # later forks, and a connection must not be shared across processes.
+        self.disk_path = disk_path or None
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+
+        # counters
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    # ------------------------------------------------------------
+    # Disk tier
+    # ------------------------------------------------------------
+    def _disk(self) -> Optional[sqlite3.Connection]:
+        """The SQLite connection for this process, opened lazily. Call under `_lock`."""
+        if self.disk_path is None:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            # A connection inherited through fork() is abandoned, not closed
+            os.makedirs(os.path.dirname(self.disk_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            self._db_pid = os.getpid()
+        return self._db
+
+    # ------------------------------------------------------------
+    # Sync get / set
+    # ------------------------------------------------------------
+    def get(self, key: str, default=None):
+        value = self._lookup(key)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            self._remember(key, expires_at, value)
+            db = self._disk()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at),
+                )
+                self._writes += 1
+                if self._writes % 100 == 0:
+                    self._purge_disk(db)
+                db.commit()
+
+    def _purge_disk(self, db: sqlite3.Connection):
+        """Drop expired rows, then the soonest-to-expire beyond the disk cap."""
+        db.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        db.execute(
+            "DELETE FROM cache WHERE key IN ("
+            " SELECT key FROM cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            db = self._disk()
+            if db is not None:
+                db.execute("DELETE FROM cache")
+                db.commit()
+
+    def _remember(self, key: str, expires_at: float, value: Any):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, key: str):
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    return entry[1]
+                del self._memory[key]
+
+            db = self._disk()
+            if db is None:
+                return _MISSING
+
+            row = db.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return _MISSING
+            if row[1] <= now:
+                db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                db.commit()
+                return _MISSING
+
+            value = json.loads(row[0])
+            self._remember(key, row[1], value)
+            self.disk_hits += 1
+            return value
+
+    # ------------------------------------------------------------
+    # Async get / set (disk tier off the event loop)
+    # ------------------------------------------------------------
+    async def aget(self, key: str, default=None):
+        if self.disk_path:
+            return await asyncio.to_thread(self.get, key, default)
+        return self.get(key, default)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None):
+        if self.disk_path:
+            await asyncio.to_thread(self.set, key, value, ttl)
+        else:
+            self.set(key, value, ttl)
+
+    # ------------------------------------------------------------
+    # Async get-or-compute with single-flight
+    # ------------------------------------------------------------
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        bypass: bool = False,
+        cacheable: Optional[Callable[[Any], bool]] = None,
+    ):
+        """
+        Return the cached value for `key`, or await `compute()` once and
+        cache its result. Concurrent identical calls share that one await.
+        `bypass=True` skips the cache read (the fresh result is still stored).
+        A result for which `cacheable(value)` is false is returned (also to
+        the coalesced callers) but not stored.
+        """
+        if not bypass:
+            value = await asyncio.to_thread(self._lookup, key) if self.disk_path else self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self.coalesced += 1
+                try:
+                    return await asyncio.shield(inflight)
+                except _LeaderCancelled:
+                    return await self.get_or_compute(key, compute, cacheable=cacheable)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        if not bypass:
+            self._inflight[key] = future
+
+        try:
+            value = await compute()
+        except BaseException as e:
+            if not future.done():
+                if isinstance(e, asyncio.CancelledError):
+                    future.set_exception(_LeaderCancelled())
+                else:
+                    future.set_exception(e)
+                future.exception()  # mark retrieved if nobody was waiting
+            raise
+        else:
+            if cacheable is None or cacheable(value):
+                await self.aset(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    # ------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------
+    def stats(self) -> dict:
+        served = self.hits + self.coalesced   # answered without a new upstream call
+        lookups = served + self.misses
+        return {
+            "entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": (served / lookups) if lookups else 0.0,
+            "persistent": self.disk_path is not None,
+        }
@@ -0,0 +1,204 @@
+# app/services/context_packer.py
+
+"""
+ContextPacker
+-------------
+Fits the article context of an idea prompt into CONTEXT_TOKEN_BUDGET tokens.
+
+- Articles are picked by maximal marginal relevance (MMR) over their
+  embeddings: each step takes the article most relevant to the query
+  and least similar to the ones already picked (CONTEXT_MMR_LAMBDA).
+- Each entry is "Title: ...\\nSummary: ..." with the summary cut to
+  CONTEXT_ARTICLE_MAX_TOKENS. An article that no longer fits whole is
+  trimmed to the remaining budget (if at least CONTEXT_MIN_ARTICLE_TOKENS).
+- Tokens are counted with the embedding model's tokenizer (an estimate
+  of ~4 characters per token until the model is loaded) and cached per
+  article content, so every article is tokenized once. WordPiece splits
+  English news text a little finer than Gemini does, so the budget is a
+  slightly conservative upper bound.
+
+Without embeddings, articles are packed in the order given. Packing is
+blocking tokenizer work: async callers run it in a thread.
+"""
+
+import hashlib
+from typing import Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.cache import TTLCache
+from app.services.model_registry import model_registry
+
+SEPARATOR = "\n\n"
+SEPARATOR_TOKENS = 1
+
+# sha1(counter, cap, title, summary) -> {"text", "tokens"}
+token_cache = TTLCache(
+    "context_tokens",
+    ttl=7 * 86400,
+    max_entries=settings.context_token_cache_max_entries,
+)
+
+
+class ContextPacker:
+    def __init__(
+        self,
+        registry=model_registry,
+        budget: int = None,
+        article_max_tokens: int = None,
+        min_article_tokens: int = None,
+        mmr_lambda: float = None,
+    ):
+        self.registry = registry
+        self.budget = budget or settings.context_token_budget
+        self.article_max_tokens = article_max_tokens or settings.context_article_max_tokens
+        self.min_article_tokens = (
+            settings.context_min_article_tokens if min_article_tokens is None else min_article_tokens
+        )
+        self.mmr_lambda = settings.context_mmr_lambda if mmr_lambda is None else mmr_lambda
+
+    # ------------------------------------------------------------
+    # Token counting
+    # ------------------------------------------------------------
+    def _tokenizer(self):
+        # Never load the model just to count; until it is loaded, estimate
+        if not self.registry.is_loaded:
+            return None
+        return getattr(self.registry.get(), "tokenizer", None)
+
+    def count_tokens(self, text: str) -> int:
+        tokenizer = self._tokenizer()
+        if tokenizer is None:
+            return len(text) // 4 + 1
+        return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def truncate(self, text: str, max_tokens: int) -> tuple[str, int]:
+        """Cut `text` to at most `max_tokens` tokens; returns (text, tokens)."""
+        if max_tokens <= 0 or not text:
+            return "", 0
+
+        # Bound tokenizer work on multi-KB summaries
+        limit = max_tokens * 12
+        cut = len(text) > limit
+        text = text[:limit]
+
+        tokenizer = self._tokenizer()
+        try:
+            offsets = tokenizer(
+                text, add_special_tokens=False, return_offsets_mapping=True
+            )["offset_mapping"]
+        except Exception:
+            # no (fast) tokenizer yet: ~4 characters per token
+            offsets = [(i, min(i + 4, len(text))) for i in range(0, len(text), 4)]
+
+        if len(offsets) > max_tokens:
+            return text[:offsets[max_tokens - 1][1]].rstrip() + "…", max_tokens
+        return (text.rstrip() + "…") if cut else text, len(offsets)
+
+    def entry(self, article: dict, max_tokens: int = None) -> dict:
+        """{"text", "tokens"} for one article (cached per content + cap)."""
+        max_tokens = max_tokens or self.article_max_tokens
+        title = (article.get("title") or "").strip()
+        summary = (article.get("summary") or "").strip()
+
+        counter = "tok" if self._tokenizer() is not None else "est"
+        key = hashlib.sha1(f"{counter}\0{max_tokens}\0{title}\0{summary}".encode("utf-8")).hexdigest()
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        head = f"Title: {title}\nSummary: "
+        head_tokens = self.count_tokens(head)
+        if head_tokens > max_tokens:
+            # A long title alone would overrun the cap: cut it, drop the summary
+            head, head_tokens = self._trimmed_head(title, max_tokens)
+            summary = ""
+        body, body_tokens = self.truncate(summary, max_tokens - head_tokens)
+        value = {"text": head + body, "tokens": head_tokens + body_tokens}
+        token_cache.set(key, value)
+        return value
+
+    def _trimmed_head(self, title: str, max_tokens: int) -> tuple[str, int]:
+        """("Title: …\nSummary: ", tokens) within `max_tokens`, or ("", 0) if even the labels don't fit."""
+        room = max_tokens - self.count_tokens("Title: \nSummary: ")
+        while room > 0:
+            cut, _ = self.truncate(title, room)
+            head = f"Title: {cut}\nSummary: "
+            tokens = self.count_tokens(head)
+            if tokens <= max_tokens:
+                return head, tokens
+            room -= tokens - max_tokens   # tokens merged across the join; shrink and retry
+        return "", 0
+
+    # ------------------------------------------------------------
+    # Packing
+    # ------------------------------------------------------------
+    def pack(
+        self,
+        articles: list[dict],
+        doc_emb: Optional[np.ndarray] = None,
+        query_emb: Optional[np.ndarray] = None,
+    ) -> tuple[str, dict]:
+        """
+        Returns (context, stats) where stats is
+        {"tokens", "budget", "articles", "candidates", "trimmed"}.
+        `doc_emb` rows are L2-normalised article vectors; without
+        `query_emb` the centroid of `doc_emb` is the query.
+        """
+        n = len(articles)
+        use_mmr = doc_emb is not None and n > 0
+        if use_mmr:
+            if query_emb is None:
+                query_emb = doc_emb.mean(axis=0)
+            query_emb = query_emb / (np.linalg.norm(query_emb) or 1.0)
+            relevance = doc_emb @ query_emb
+            pairwise = doc_emb @ doc_emb.T
+            redundancy = np.zeros(n, dtype=np.float32)
+
+        parts, used, trimmed = [], 0, 0
+        remaining = list(range(n))
+
+        while remaining and self.budget - used >= self.min_article_tokens:
+            if use_mmr:
+                cand = np.asarray(remaining)
+                scores = self.mmr_lambda * relevance[cand] - (1 - self.mmr_lambda) * redundancy[cand]
+                i = int(cand[np.argmax(scores)])
+            else:
+                i = remaining[0]
+            remaining.remove(i)
+
+            sep = SEPARATOR_TOKENS if parts else 0
+            room = self.budget - used - sep
+            entry = self.entry(articles[i])
+            if entry["tokens"] > room:
+                if room < self.min_article_tokens:
+                    continue   # a shorter article may still fit
+                entry = self.entry(articles[i], max_tokens=room)
+                trimmed += 1
+            if not entry["text"]:
+                continue
+
+            parts.append(entry["text"])
+            used += entry["tokens"] + sep
+            if use_mmr:
+                redundancy = np.maximum(redundancy, pairwise[i])
+
+        stats = {
+            "tokens": used,
+            "budget": self.budget,
+            "articles": len(parts),
+            "candidates": n,
+            "trimmed": trimmed,
+        }
+        return SEPARATOR.join(parts), stats
+
+
+_packer: Optional[ContextPacker] = None
+
+
+def get_context_packer() -> ContextPacker:
+    global _packer
+    if _packer is None:
+        _packer = ContextPacker()
+    return _packer
@@ -0,0 +1,234 @@
+# app/services/dedup.py
+
+"""
+Near-duplicate story detection (MinHash LSH).
+
+Syndicated wire stories show up under many URLs with almost the same
+title and snippet. Each article gets a 64-value MinHash signature over
+word-bigram shingles of title + snippet (or summary); two articles are
+the same story when their estimated Jaccard similarity is at least
+NEAR_DUP_THRESHOLD.
+
+NearDuplicateIndex buckets signatures by LSH bands (16 bands x 4 rows),
+so a lookup only compares against articles that collide in some band
+instead of the whole table. The first article seen for a story is its
+canonical URL; later copies join that group. The process-wide index only
+holds NEAR_DUP_WINDOW_DAYS of articles: older entries are pruned by age.
+"""
+
+import asyncio
+import hashlib
+import re
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.topic_clusters import parse_time
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Fixed hash family h_i(x) = a_i * x + b_i (mod 2^64), so signatures
+# stay comparable across processes and restarts.
+_rng = np.random.default_rng(0x5EED)
+_A = _rng.integers(1, 2**63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2**63, size=NUM_PERM, dtype=np.uint64)
+
+
+def fingerprint_text(article: dict) -> str:
+    # Snippet first: it is what every copy of a story has before full-text fetch
+    body = article.get("snippet") or article.get("summary") or ""
+    return f"{article.get('title') or ''} {body}".strip()
+
+
+def shingles(text: str, size: int = 2) -> set[str]:
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """(NUM_PERM,) uint32 signature, or None for empty text."""
+    grams = shingles(text)
+    if not grams:
+        return None
+
+    x = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "big") for g in grams),
+        dtype=np.uint64,
+        count=len(grams),
+    )
+    with np.errstate(over="ignore"):
+        hashed = _A[:, None] * x[None, :] + _B[:, None]
+    return (hashed >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def signature_to_hex(sig: np.ndarray) -> str:
+    return sig.astype(">u4").tobytes().hex()
+
+
+def signature_from_hex(value: str) -> np.ndarray:
+    return np.frombuffer(bytes.fromhex(value), dtype=">u4").astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    def __init__(self, threshold: float = 0.5):
+        self.threshold = threshold
+        self._buckets: dict[tuple[int, bytes], list[str]] = {}
+        self._signatures: dict[str, np.ndarray] = {}
+        self._canonical: dict[str, str] = {}
+        self._added_at: dict[str, float] = {}
+        self.group_sizes: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._canonical)
+
+    @staticmethod
+    def _band_keys(sig: np.ndarray):
+        for band in range(BANDS):
+            yield band, sig[band * ROWS:(band + 1) * ROWS].tobytes()
+
+    def find(self, sig: Optional[np.ndarray]) -> Optional[str]:
+        """Canonical URL of a stored near-duplicate, or None."""
+        if sig is None:
+            return None
+
+        seen = set()
+        for band_key in self._band_keys(sig):
+            for key in self._buckets.get(band_key, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                if similarity(sig, self._signatures[key]) >= self.threshold:
+                    return self._canonical[key]
+        return None
+
+    def add(
+        self,
+        key: str,
+        sig: Optional[np.ndarray],
+        canonical: Optional[str] = None,
+        added_at: Optional[float] = None,
+    ) -> str:
+        """Store `key` (as of `added_at`, default now); returns the canonical URL of its story group."""
+        if key in self._canonical:
+            return self._canonical[key]
+
+        canonical = canonical or self.find(sig) or key
+        self._canonical[key] = canonical
+        self._added_at[key] = time.time() if added_at is None else added_at
+        self.group_sizes[canonical] = self.group_sizes.get(canonical, 0) + 1
+
+        if sig is not None:
+            self._signatures[key] = sig
+            for band_key in self._band_keys(sig):
+                self._buckets.setdefault(band_key, []).append(key)
+        return canonical
+
+    def canonical_of(self, key: str) -> Optional[str]:
+        return self._canonical.get(key)
+
+    def prune(self, before: float) -> int:
+        """Forget entries added before `before` (epoch seconds); returns how many."""
+        old = [key for key, ts in self._added_at.items() if ts < before]
+        for key in old:
+            del self._added_at[key]
+            canonical = self._canonical.pop(key)
+            size = self.group_sizes.get(canonical, 0) - 1
+            if size > 0:
+                self.group_sizes[canonical] = size
+            else:
+                self.group_sizes.pop(canonical, None)
+
+            sig = self._signatures.pop(key, None)
+            if sig is None:
+                continue
+            for band_key in self._band_keys(sig):
+                bucket = self._buckets.get(band_key)
+                if bucket is None:
+                    continue
+                try:
+                    bucket.remove(key)
+                except ValueError:
+                    pass
+                if not bucket:
+                    del self._buckets[band_key]
+        return len(old)
+
+
+def collapse_near_duplicates(articles: list[dict], threshold: float = None) -> list[dict]:
+    """Keep the first article of each story (order preserved)."""
+    index = NearDuplicateIndex(settings.near_dup_threshold if threshold is None else threshold)
+    kept = []
+    for i, a in enumerate(articles):
+        sig = minhash(fingerprint_text(a))
+        if index.find(sig) is not None:
+            continue
+        index.add(a.get("url") or f"#{i}", sig)
+        kept.append(a)
+    return kept
+
+
+# ------------------------------------------------------------
+# Process-wide index, seeded from recent rows in `articles`
+# ------------------------------------------------------------
+PRUNE_INTERVAL = 300.0   # seconds between age-based prunes
+
+_index: Optional[NearDuplicateIndex] = None
+_seed_lock: Optional[asyncio.Lock] = None
+_last_prune = 0.0
+
+
+def _window_start() -> float:
+    return time.time() - settings.near_dup_window_days * 86400
+
+
+def _seed_rows(index: NearDuplicateIndex, rows: list[dict]):
+    """MinHash + add one page of stored rows (blocking; run in a thread)."""
+    for row in rows:
+        stored = row.get("fingerprint")
+        sig = signature_from_hex(stored) if stored else minhash(fingerprint_text(row))
+        index.add(
+            row["url"], sig,
+            canonical=row.get("canonical_url"),
+            added_at=parse_time(row.get("created_at")),
+        )
+
+
+async def get_dedup_index(db) -> NearDuplicateIndex:
+    global _index, _seed_lock, _last_prune
+    if _index is not None:
+        if time.monotonic() - _last_prune >= PRUNE_INTERVAL:
+            _last_prune = time.monotonic()
+            _index.prune(_window_start())
+        return _index
+
+    if _seed_lock is None:
+        _seed_lock = asyncio.Lock()
+    async with _seed_lock:
+        if _index is None:
+            index = NearDuplicateIndex(settings.near_dup_threshold)
+            since = datetime.fromtimestamp(_window_start(), timezone.utc).isoformat()
+            columns = "url,title,summary,snippet,created_at"
+            if settings.near_dup_store_fingerprints:
+                columns += ",fingerprint,canonical_url"
+
+            # Pages come newest-first; a stored canonical_url keeps the original grouping.
+            # Hashing a week of rows is CPU work: keep it off the event loop.
+            async for page in db.iter_pages("articles", columns=columns, since=since):
+                await asyncio.to_thread(_seed_rows, index, page)
+            _index = index
+            _last_prune = time.monotonic()
+    return _index
@@ -0,0 +1,143 @@
+# app/services/embedding_executor.py
+
+"""
+EmbeddingExecutor
+-----------------
+Runs SentenceTransformer encodes off the event loop.
+
+Concurrent `await executor.encode(texts)` calls are queued and gathered
+into micro-batches (up to `max_batch_size` texts, waiting at most
+`max_wait_ms` for more work), encoded in one call on a thread pool, and
+the resulting rows are handed back to each caller.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import numpy as np
+
+from app.services.tracing import span
+
+
+class EmbeddingExecutor:
+    def __init__(
+        self,
+        encode: Callable[[list[str]], np.ndarray],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        workers: int = 1,
+    ):
+        self._encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.workers = workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # metrics
+        self.batches = 0
+        self.texts_encoded = 0
+        self.last_batch_size = 0
+        self.max_batch_seen = 0
+
+    # ------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------
+    async def encode(self, texts: list[str]) -> np.ndarray:
+        """Queue `texts` for the next micro-batch and await their vectors."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._queue.put_nowait((texts, future))
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "batches": self.batches,
+            "texts_encoded": self.texts_encoded,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_seen": self.max_batch_seen,
+            "avg_batch_size": (self.texts_encoded / self.batches) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._pool is not None:
+            # Dropped rather than reused: the next encode() (e.g. after a
+            # lifespan restart) starts a fresh pool in _ensure_worker.
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    # ------------------------------------------------------------
+    # Batching loop
+    # ------------------------------------------------------------
+    def _ensure_worker(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="embed")
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def _collect_batch(self) -> list:
+        batch = [await self._queue.get()]
+        size = len(batch[0][0])
+        deadline = self._loop.time() + self.max_wait
+
+        while size < self.max_batch_size:
+            # Drain whatever is already queued without waiting
+            if not self._queue.empty():
+                item = self._queue.get_nowait()
+            else:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            batch.append(item)
+            size += len(item[0])
+
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            texts = [t for item_texts, _ in batch for t in item_texts]
+
+            self.batches += 1
+            self.texts_encoded += len(texts)
+            self.last_batch_size = len(texts)
+            self.max_batch_seen = max(self.max_batch_seen, len(texts))
+
+            try:
+                with span("embedding.batch"):
+                    vectors = await self._loop.run_in_executor(self._pool, self._encode, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            offset = 0
+            for item_texts, future in batch:
+                rows = vectors[offset:offset + len(item_texts)]
+                offset += len(item_texts)
+                if not future.done():
+                    future.set_result(rows)
@@ -0,0 +1,509 @@
+# app/services/embedding_store.py
+
+"""
+EmbeddingStore
+--------------
+Persistent, incremental cache of article embeddings.
+
+- Vectors live in a memory-mapped float32 matrix on local disk
+  (<dir>/vectors.f32), one row per article.
+- A small JSON index (<dir>/index.json) maps article key (URL) →
+  (row, content hash), so only new or edited articles are re-embedded.
+- Vectors are stored L2-normalised, so cosine similarity is a dot product.
+- The index records which model/backend produced the vectors; a store
+  written by a different one is discarded instead of mixing spaces.
+- search() finds the nearest stored articles to a query vector: exact
+  for small stores, through an attached IVFIndex (kept in step with
+  put() / remove()) for large ones.
+- Several processes can share a directory (prefork workers, the
+  standalone scheduler): writers hold <dir>/store.lock and reload the
+  index first, so rows are never handed out twice; readers pick up a
+  newer index.json on their next lookup.
+
+The store survives restarts and can always be rebuilt from the
+`articles` table:  python -m app.services.embedding_store --rebuild
+(--backfill-db fills the pgvector column for rows saved before it existed,
+or embedded by another model/backend.)
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:   # Windows: one process per store directory
+    fcntl = None
+
+import numpy as np
+
+from app.config import settings
+from app.services.ann_index import IVFIndex
+from app.services.model_registry import model_registry
+
+INDEX_FILE = "index.json"
+VECTORS_FILE = "vectors.f32"
+LOCK_FILE = "store.lock"
+MIN_CAPACITY = 1024
+INDEX_CHUNK = 50_000   # vectors copied at a time while building the ANN index
+
+
+def doc_text(article: dict) -> str:
+    """Text that gets embedded for an article (title + summary)."""
+    return f"{article.get('title') or ''} {article.get('summary') or ''}".strip()
+
+
+def content_hash(article: dict) -> str:
+    return hashlib.sha1(doc_text(article).encode("utf-8")).hexdigest()
+
+
+def article_key(article: dict) -> str:
+    return article.get("url") or f"hash:{content_hash(article)}"
+
+
+def _stamp(path: str) -> Optional[tuple]:
+    """Identity of a file replaced with os.replace(), to tell when it changed."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class FileLock:
+    """
+    Exclusive lock on `path` across processes (flock) and threads.
+    Without a path, or without fcntl, only threads are excluded.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fd: Optional[int] = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            if self.path and fcntl is not None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                except BaseException:
+                    os.close(fd)
+                    raise
+                self._fd = fd
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        self._thread_lock.release()
+
+
+class EmbeddingStore:
+    def __init__(self, directory: str, model_tag: Optional[str] = None):
+        self.directory = directory
+        self.model_tag = model_tag
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(os.path.join(directory, LOCK_FILE))
+        self._stamp: Optional[tuple] = None   # of the index.json last read / written
+        self._rows: dict[str, list] = {}   # key -> [row, content_hash]
+        self._keys: list[Optional[str]] = []   # row -> key (None once removed)
+        self._dim: Optional[int] = None
+        self._count = 0
+        self._capacity = 0
+        self._matrix: Optional[np.memmap] = None
+        self.index: Optional[IVFIndex] = None
+        self.indexed_count = 0   # store size when the index was trained
+        with self._file_lock:
+            self._load()
+
+    # ------------------------------------------------------------
+    # Disk layout
+    # ------------------------------------------------------------
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, INDEX_FILE)
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.directory, VECTORS_FILE)
+
+    def _load(self):
+        if not os.path.exists(self._index_path) or not os.path.exists(self._vectors_path):
+            return
+
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            stored_tag = meta.get("model")
+            if self.model_tag and stored_tag and stored_tag != self.model_tag:
+                print(f"Embedding store was built with {stored_tag}, now {self.model_tag}; re-embedding")
+                self._reset()
+                return
+            self._dim = meta["dim"]
+            self._count = meta["count"]
+            self._capacity = meta["capacity"]
+            self._rows = meta["rows"]
+            self._keys = [None] * self._count
+            for key, (row, _) in self._rows.items():
+                self._keys[row] = key
+            self._matrix = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r+",
+                shape=(self._capacity, self._dim),
+            )
+            self._stamp = _stamp(self._index_path)
+        except Exception as e:
+            # Corrupt / partial store → start fresh, it is only a cache
+            print("Embedding store load error:", e)
+            self._reset()
+
+    def _refresh(self):
+        """
+        Pick up rows another process wrote since this one last read or
+        wrote the index (call with _lock held). The vectors file only
+        grows, and a writer flushes its rows before replacing the index.
+        """
+        stamp = _stamp(self._index_path)
+        if stamp is None or stamp == self._stamp:
+            return
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError) as e:
+            print("Embedding store reload error:", e)
+            return
+        if self.model_tag and meta.get("model") not in (None, self.model_tag):
+            return   # another model's store; replaced by this one on the next put()
+
+        old_rows = self._rows
+        self._stamp = stamp
+        self._dim = meta["dim"]
+        self._count = meta["count"]
+        self._rows = meta["rows"]
+        self._keys = [None] * self._count
+        for key, (row, _) in self._rows.items():
+            self._keys[row] = key
+        if self._matrix is None or meta["capacity"] != self._capacity:
+            self._matrix = None
+            self._capacity = meta["capacity"]
+            self._matrix = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r+",
+                shape=(self._capacity, self._dim),
+            )
+
+        if self.index is not None:
+            gone = [row for key, (row, _) in old_rows.items() if key not in self._rows]
+            changed = [row for key, entry in self._rows.items() if old_rows.get(key) != entry]
+            self.index.remove(gone)
+            if changed:
+                self.index.add(changed, np.asarray(self._matrix[changed]))
+
+    def _save_index(self):
+        meta = {
+            "model": self.model_tag,
+            "dim": self._dim,
+            "count": self._count,
+            "capacity": self._capacity,
+            "rows": self._rows,
+        }
+        tmp = self._index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._index_path)
+        self._stamp = _stamp(self._index_path)
+
+    def _reset(self):
+        self._matrix = None
+        self._stamp = None
+        self._rows = {}
+        self._keys = []
+        self.index = None
+        self.indexed_count = 0
+        self._dim = None
+        self._count = 0
+        self._capacity = 0
+        for path in (self._index_path, self._vectors_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _ensure_capacity(self, needed: int, dim: int):
+        if self._dim is None:
+            self._dim = dim
+        elif dim != self._dim:
+            raise ValueError(f"Embedding dim changed ({self._dim} → {dim}); rebuild the store")
+
+        if needed <= self._capacity:
+            return
+
+        new_capacity = max(MIN_CAPACITY, self._capacity * 2, needed)
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Release the old mapping, grow the file in place, then remap
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(new_capacity * self._dim * 4)
+
+        self._capacity = new_capacity
+        self._matrix = np.memmap(
+            self._vectors_path, dtype=np.float32, mode="r+",
+            shape=(self._capacity, self._dim),
+        )
+
+    # ------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def pending(self, articles: list[dict]) -> list[dict]:
+        """Articles that are new or whose content changed since last embedded."""
+        with self._lock:
+            self._refresh()
+            seen = {}
+            for a in articles:
+                key = article_key(a)
+                entry = self._rows.get(key)
+                if entry is None or entry[1] != content_hash(a):
+                    seen[key] = a
+            return list(seen.values())
+
+    def put(self, articles: list[dict], vectors: np.ndarray):
+        """Store one vector per article (rows are overwritten on change)."""
+        if not articles:
+            return
+
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+
+        with self._file_lock, self._lock:
+            # Rows other processes added since our last look aren't free
+            self._refresh()
+            new_keys = {article_key(a) for a in articles} - self._rows.keys()
+            self._ensure_capacity(self._count + len(new_keys), vectors.shape[1])
+
+            rows = []
+            for a, vec in zip(articles, vectors):
+                key = article_key(a)
+                entry = self._rows.get(key)
+                if entry is None:
+                    row = self._count
+                    self._count += 1
+                    self._keys.append(key)
+                else:
+                    row = entry[0]
+                self._matrix[row] = vec
+                self._rows[key] = [row, content_hash(a)]
+                rows.append(row)
+
+            self._matrix.flush()
+            self._save_index()
+            if self.index is not None:
+                self.index.add(rows, vectors)
+
+    def remove(self, keys: list[str]) -> int:
+        """Forget these article keys (their rows are reclaimed on rebuild)."""
+        with self._file_lock, self._lock:
+            self._refresh()
+            rows = []
+            for key in keys:
+                entry = self._rows.pop(key, None)
+                if entry is not None:
+                    self._keys[entry[0]] = None
+                    rows.append(entry[0])
+            if rows:
+                self._save_index()
+                if self.index is not None:
+                    self.index.remove(rows)
+            return len(rows)
+
+    def sync(self, articles: list[dict], encode: Callable[[list[str]], np.ndarray]) -> int:
+        """
+        Embed only the articles that are new or whose content changed.
+        `encode` takes a list of texts and returns an (n, dim) array.
+        Returns the number of articles that were (re-)embedded.
+        """
+        todo = self.pending(articles)
+        if todo:
+            self.put(todo, encode([doc_text(a) for a in todo]))
+        return len(todo)
+
+    def vectors_for(self, articles: list[dict]) -> np.ndarray:
+        """Return the cached (n, dim) matrix for `articles`, in order."""
+        with self._lock:
+            rows = [self._rows[article_key(a)][0] for a in articles]
+            return np.asarray(self._matrix[rows])
+
+    # ------------------------------------------------------------
+    # Nearest-neighbour search
+    # ------------------------------------------------------------
+    def live_rows(self) -> np.ndarray:
+        with self._lock:
+            return np.fromiter((row for row, _ in self._rows.values()), dtype=np.int64, count=len(self._rows))
+
+    def rows_vectors(self, rows) -> np.ndarray:
+        with self._lock:
+            return np.asarray(self._matrix[np.asarray(rows)])
+
+    def build_index(self, nlist: int = 0, nprobe: int = 16, dtype: str = "float16", rerank_factor: int = 4) -> IVFIndex:
+        """Train an IVFIndex on the stored vectors and attach it (blocking)."""
+        rows = self.live_rows()
+        if not len(rows):
+            raise ValueError("Embedding store is empty")
+        index = IVFIndex(
+            self._dim, exact=self.rows_vectors,
+            nlist=nlist, nprobe=nprobe, dtype=dtype, rerank_factor=rerank_factor,
+        )
+        # Train on a sample and fill in chunks, never copying the whole matrix
+        sample = np.random.default_rng(0).choice(rows, min(len(rows), INDEX_CHUNK), replace=False)
+        index.train(self.rows_vectors(np.sort(sample)))
+        for start in range(0, len(rows), INDEX_CHUNK):
+            chunk = rows[start:start + INDEX_CHUNK]
+            index.add(chunk, self.rows_vectors(chunk))
+        with self._lock:
+            # Catch rows written while training
+            missing = [row for row, _ in self._rows.values() if row not in index]
+            if missing:
+                index.add(missing, np.asarray(self._matrix[missing]))
+            self.index = index
+            self.indexed_count = len(self._rows)
+        return index
+
+    def search(self, query: np.ndarray, k: int, nprobe: Optional[int] = None) -> list[tuple[str, float]]:
+        """[(article key, cosine)] of the k stored vectors closest to `query`."""
+        query = np.asarray(query, dtype=np.float32).ravel()
+        with self._lock:
+            self._refresh()
+        if self.index is not None:
+            rows, scores = self.index.search(query, k, nprobe=nprobe)
+        else:
+            live = self.live_rows()
+            if not len(live) or k <= 0:
+                return []
+            all_scores = self.rows_vectors(live) @ query
+            top = top_indices(all_scores, k)
+            rows, scores = live[top], all_scores[top]
+        with self._lock:
+            return [(self._keys[r], float(s)) for r, s in zip(rows.tolist(), scores) if self._keys[r] is not None]
+
+    def clear(self):
+        with self._file_lock, self._lock:
+            self._reset()
+
+    def rebuild(self, articles: list[dict], encode: Callable[[list[str]], np.ndarray]) -> int:
+        """Drop everything and re-embed `articles` from scratch."""
+        self.clear()
+        return self.sync(articles, encode)
+
+
+def top_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first; O(n) + O(k log k)."""
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    part = np.sort(np.argpartition(-scores, k - 1)[:k])   # input order for ties
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+_store = None
+
+
+def get_embedding_store() -> EmbeddingStore:
+    """Process-wide store; opening it loads the model, to tag it with the backend in use."""
+    global _store
+    if _store is None:
+        _store = EmbeddingStore(settings.embedding_store_dir, model_tag=model_registry.tag)
+    return _store
+
+
+# ------------------------------------------------------------
+# CLI: rebuild the store from the `articles` table
+# ------------------------------------------------------------
+async def _rebuild_from_db():
+    from app.services.semantic_engine import get_semantic_engine
+    from app.services.supabase_client import SupabaseClient
+
+    engine = get_semantic_engine()
+    store = get_embedding_store()
+    store.clear()
+
+    count = 0
+    async for page in SupabaseClient().iter_pages("articles", columns="id,url,title,summary"):
+        count += store.sync(page, engine.encode_documents)
+    print(f"Embedded {count} articles into {settings.embedding_store_dir}")
+
+
+async def _backfill_db_embeddings(batch_size: int = 200):
+    """
+    Write pgvector embeddings for rows that have none, or whose
+    `embedding_model` isn't the current model/backend: one
+    set_article_embeddings() call (sql/schema.sql) per page.
+    """
+    from app.services.semantic_engine import get_semantic_engine
+    from app.services.supabase_client import SupabaseClient
+
+    db = SupabaseClient()
+    engine = get_semantic_engine()
+    store = get_embedding_store()
+    tag = store.model_tag
+
+    count = 0
+    # Each pass ends once its filter matches nothing: updated rows drop out of it
+    for filters in ({"embedding_model": "is.null"}, {"embedding_model": f"neq.{tag}"}):
+        while True:
+            page = await db.fetch_page(
+                "articles",
+                columns="id,url,title,summary",
+                order="id.asc",
+                limit=batch_size,
+                filters=filters,
+            )
+            if not page:
+                break
+
+            store.sync(page, engine.encode_documents)
+            items = [
+                {"id": article["id"], "embedding": vec.tolist()}
+                for article, vec in zip(page, store.vectors_for(page))
+            ]
+            await db.rpc("set_article_embeddings", {"items": items, "model_tag": tag})
+            count += len(page)
+
+    print(f"Backfilled {count} article embeddings in the database")
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Manage the local article embedding store")
+    parser.add_argument("--rebuild", action="store_true", help="re-embed every row in `articles`")
+    parser.add_argument(
+        "--backfill-db", action="store_true",
+        help="fill the pgvector `embedding` column where it is NULL or from another model/backend",
+    )
+    args = parser.parse_args()
+
+    if args.rebuild:
+        asyncio.run(_rebuild_from_db())
+    elif args.backfill_db:
+        asyncio.run(_backfill_db_embeddings())
+    else:
+        parser.print_help()
@@ -0,0 +1,96 @@
+# app/services/http_clients.py
+
+"""
+HttpClientManager
+-----------------
+Application-scoped, pooled httpx clients — one per upstream
+(Gemini, SerpApi, Supabase, and article pages).
+
+Each upstream keeps its own keep-alive connection pool, timeout and
+limits, so a pipeline run reuses TCP/TLS connections instead of doing a
+fresh handshake per call. Clients are created in the FastAPI lifespan
+(or lazily on first use) and closed cleanly on shutdown.
+"""
+
+import httpx
+
+from app.config import settings
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (optional dependency: pip install httpx[http2])
+        return True
+    except ImportError:
+        return False
+
+
+class HttpClientManager:
+    def __init__(self):
+        self._clients: dict[str, httpx.AsyncClient] = {}
+
+    # ------------------------------------------------------------
+    # Per-upstream configuration
+    # ------------------------------------------------------------
+    def _config(self, name: str) -> dict:
+        timeouts = {
+            "gemini": settings.gemini_timeout,
+            "serpapi": settings.serpapi_timeout,
+            "supabase": settings.supabase_timeout,
+            "articles": settings.article_fetch_timeout,
+        }
+        max_connections = {
+            "gemini": settings.gemini_max_connections,
+            "serpapi": settings.serpapi_max_connections,
+            "supabase": settings.supabase_max_connections,
+            "articles": settings.article_fetch_max_connections,
+        }
+        return {
+            "timeout": timeouts.get(name, settings.http_default_timeout),
+            "max_connections": max_connections.get(name, settings.http_default_max_connections),
+            # news links are often redirects (AMP, trackers, http → https)
+            "follow_redirects": name == "articles",
+        }
+
+    def _build(self, name: str) -> httpx.AsyncClient:
+        cfg = self._config(name)
+
+        http2 = settings.http2_enabled
+        if http2 and not _http2_available():
+            print("HTTP/2 requested but 'h2' is not installed; falling back to HTTP/1.1")
+            http2 = False
+
+        limits = httpx.Limits(
+            max_connections=cfg["max_connections"],
+            max_keepalive_connections=min(settings.http_max_keepalive, cfg["max_connections"]),
+            keepalive_expiry=settings.http_keepalive_expiry,
+        )
+        return httpx.AsyncClient(
+            timeout=cfg["timeout"],
+            limits=limits,
+            http2=http2,
+            follow_redirects=cfg["follow_redirects"],
+        )
+
+    # ------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Return the pooled client for `name`, creating it on first use."""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._build(name)
+            self._clients[name] = client
+        return client
+
+    def start(self, names=("gemini", "serpapi", "supabase")):
+        for name in names:
+            self.get(name)
+
+    async def aclose(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+http_clients = HttpClientManager()
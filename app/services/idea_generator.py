@@ -1,32 +1,183 @@
 # app/services/idea_generator.py
 
-from app.services.semantic_engine import SemanticEngine
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.config import settings
+from app.services.context_packer import ContextPacker, get_context_packer
+from app.services.dedup import (
+    NearDuplicateIndex,
+    collapse_near_duplicates,
+    fingerprint_text,
+    get_dedup_index,
+    minhash,
+    signature_to_hex,
+)
+from app.services.semantic_engine import get_semantic_engine
+from app.services.topic_clusters import parse_time
 from app.services.supabase_client import SupabaseClient
 from app.services.llm_client import GeminiClient
 
+# Structured output for /ideas/batch: one entry per topic in the call
+def _batch_schema(keywords: list[str]) -> dict:
+    return {
+        "type": "ARRAY",
+        "items": {
+            "type": "OBJECT",
+            "properties": {
+                "keyword": {"type": "STRING", "enum": keywords},
+                "ideas": {"type": "ARRAY", "items": {"type": "STRING"}},
+            },
+            "required": ["keyword", "ideas"],
+        },
+    }
+
+
+# Columns needed by the API / ranking; never pull raw_html over the wire
+ARTICLE_COLUMNS = "id,url,title,summary,snippet,created_at"
+RANKING_COLUMNS = "id,url,title,summary,created_at"
+
+# URLs per `url=in.(...)` request when loading store search hits
+URL_FETCH_CHUNK = 20
+# Store search widens up to top_k × this before falling back to a scan
+STORE_MAX_OVERFETCH = 32
+
+
+def _in_filter(values: list[str]) -> str:
+    quoted = ('"' + v.replace("\\", "\\\\").replace('"', '\\"') + '"' for v in values)
+    return f"in.({','.join(quoted)})"
+
 
 class IdeaGenerator:
     def __init__(self):
         self.db = SupabaseClient()
         self.gemini = GeminiClient()
-        self.semantic = SemanticEngine()
+        # Shared engine; the model is only touched when something embeds
+        self.semantic = get_semantic_engine()
+        self.packer = get_context_packer()
+        # Stats of the last packed context (tokens used etc.), for the response
+        self.context_stats = None
+        # Topics the last keyword-less /ideas drew from
+        self.trending = None
 
     # --------------------------------------------------
     # SAVE ARTICLE
     # --------------------------------------------------
-    async def save_article(self, article: dict):
+    def _article_row(self, article: dict) -> dict:
         title = (article.get("title") or "")[:500]
         summary = (article.get("summary") or "")[:4000]
         snippet = (article.get("snippet") or "")[:300]
 
-        data = {
+        return {
             "url": article.get("url"),
             "title": title,
             "summary": summary,
             "snippet": snippet
         }
 
-        return await self.db.insert("articles", data)
+    async def _with_embeddings(self, rows: list[dict]) -> list[dict]:
+        """Attach pgvector embeddings to rows (rows stay NULL-embedded on failure)."""
+        if not settings.use_pgvector:
+            return rows
+        try:
+            # Embed the stored (trimmed) text so it matches what ranking reads back
+            vectors = await self.semantic.embed_articles(rows)
+        except Exception as e:
+            print("Embedding error:", e)
+            return rows
+        tag = self.semantic.registry.tag
+        return [{**row, "embedding": vec.tolist(), "embedding_model": tag} for row, vec in zip(rows, vectors)]
+
+    async def save_article(self, article: dict):
+        rows = await self._with_embeddings([self._article_row(article)])
+        return await self.db.insert("articles", rows[0])
+
+    async def save_articles(self, articles: list[dict]) -> list[dict]:
+        """
+        Bulk save; one status per article, in order
+        ({"url", "status": inserted|duplicate|error, "row"}).
+        """
+        if not articles:
+            return []
+        rows = [self._article_row(a) for a in articles]
+        rows = await self._with_embeddings(rows)
+        if settings.near_dup_store_fingerprints:
+            rows = await self._with_fingerprints(rows)
+        statuses = await self.db.insert_many("articles", rows, on_conflict="url")
+        if settings.near_dup_enabled:
+            await self._remember_saved(rows, statuses)
+
+        # New rows join their topics right away (keyword-less /ideas)
+        if settings.topics_enabled and any(st["status"] == "inserted" for st in statuses):
+            try:
+                await self.sync_topics()
+            except Exception as e:
+                print("Topic assignment error:", type(e), str(e))
+        return statuses
+
+    # --------------------------------------------------
+    # NEAR-DUPLICATE STORIES
+    # --------------------------------------------------
+    async def filter_near_duplicates(self, articles: list[dict]):
+        """
+        Drop syndicated copies of stories already stored (or earlier in
+        `articles`). Returns (unique_articles, dropped_statuses) where each
+        dropped status is {"url", "status": "near_duplicate", "canonical_url"}.
+        """
+        if not settings.near_dup_enabled:
+            return articles, []
+        try:
+            index = await get_dedup_index(self.db)
+        except Exception as e:
+            print("Dedup index error:", type(e), str(e))
+            return articles, []
+
+        # Only stored stories join the process-wide index (see _remember_saved);
+        # copies within this batch are caught by a batch-local one.
+        batch = NearDuplicateIndex(index.threshold)
+        unique, dropped = [], []
+        for a in articles:
+            url = a.get("url")
+            sig = minhash(fingerprint_text(self._article_row(a)))
+            canonical = index.find(sig) or batch.find(sig)
+            batch.add(url, sig, canonical)
+
+            if canonical and canonical != url:
+                dropped.append({"url": url, "status": "near_duplicate", "canonical_url": canonical})
+            else:
+                unique.append(a)
+
+        return unique, dropped
+
+    async def _remember_saved(self, rows: list[dict], statuses: list[dict]):
+        """Add rows that are now in the table to the process-wide dedup index."""
+        try:
+            index = await get_dedup_index(self.db)
+        except Exception as e:
+            print("Dedup index error:", type(e), str(e))
+            return
+        for row, st in zip(rows, statuses):
+            if st["status"] not in ("inserted", "duplicate"):
+                continue
+            sig = minhash(fingerprint_text(row))
+            index.add(row["url"], sig, canonical=row.get("canonical_url"))
+
+    async def _with_fingerprints(self, rows: list[dict]) -> list[dict]:
+        try:
+            index = await get_dedup_index(self.db)
+        except Exception:
+            index = None
+
+        out = []
+        for row in rows:
+            sig = minhash(fingerprint_text(row))
+            canonical = None
+            if index is not None:
+                canonical = index.canonical_of(row["url"]) or index.find(sig)
+            canonical = canonical or row["url"]
+            fingerprint = signature_to_hex(sig) if sig is not None else None
+            out.append({**row, "fingerprint": fingerprint, "canonical_url": canonical})
+        return out
 
     # --------------------------------------------------
     # FETCH ALL / RECENT
@@ -35,64 +186,234 @@ class IdeaGenerator:
         return await self.db.fetch_all("articles")
 
     async def get_recent_articles(self, limit: int = 20):
-        query = f"select=*&order=created_at.desc&limit={limit}"
-        return await self.db.fetch_all(f"articles?{query}")
+        return await self.db.fetch_page(
+            "articles",
+            columns=ARTICLE_COLUMNS,
+            order="created_at.desc",
+            limit=limit,
+        )
+
+    def _ranking_since(self):
+        if not settings.ranking_window_days:
+            return None
+        cutoff = datetime.now(timezone.utc) - timedelta(days=settings.ranking_window_days)
+        return cutoff.isoformat()
+
+    def iter_article_pages(self):
+        """Keyset-paginated, projected article pages for ranking (no raw_html)."""
+        return self.db.iter_pages("articles", columns=RANKING_COLUMNS, since=self._ranking_since())
+
+    async def find_relevant_in_db(self, keyword: str, top_k: int = 8):
+        """
+        Ask Postgres (pgvector ANN index) for the TOP-K nearest articles,
+        so only k rows cross the wire. Returns None if unavailable.
+        """
+        if not settings.use_pgvector:
+            return None
+        try:
+            kw_emb = (await self.semantic.encode([keyword]))[0]
+            return await self.db.rpc("match_articles", {
+                "query_embedding": kw_emb.tolist(),
+                "match_count": top_k,
+                "since": self._ranking_since(),
+                # Vectors from another model/backend are a different space
+                "model_tag": self.semantic.registry.tag,
+            }, read_only=True)
+        except Exception as e:
+            print("pgvector search error:", type(e), str(e))
+            return None
+
+    async def find_relevant_in_store(self, keyword: str, top_k: int = 8):
+        """
+        TOP-K from the local embedding store (exact, or the IVF index for
+        large stores): only rows created since the last call are read and
+        embedded, then just the hits are loaded. Hits deleted from the
+        table are dropped from the store, edited ones re-embedded. The
+        search widens while hits fall outside the ranking window; returns
+        None (so the caller scans instead) if it still can't fill TOP-K,
+        if disabled, or on failure.
+        """
+        if not settings.ann_enabled:
+            return None
+        try:
+            since = self.semantic.synced_until or self._ranking_since()
+            await self.semantic.sync_store(self.db.iter_pages("articles", columns=RANKING_COLUMNS, since=since))
+
+            window = self._ranking_since()
+            cutoff = parse_time(window) if window else None
+            k, seen, rows = top_k * 2, set(), []
+            while True:
+                hits = await self.semantic.search_store(keyword, k)
+                urls = [key for key, _ in hits if not key.startswith("hash:") and key not in seen]
+                seen.update(urls)
+
+                found = await self._fetch_by_urls(urls)
+                found_urls = {row["url"] for row in found}
+                gone = [url for url in urls if url not in found_urls]
+                if gone:
+                    await asyncio.to_thread(self.semantic.store.remove, gone)
+                if found:
+                    await self.semantic.embed_articles(found)   # re-embeds edited rows only
+
+                rows += [r for r in found if cutoff is None or parse_time(r.get("created_at")) >= cutoff]
+                searched_all = k >= len(self.semantic.store)
+                if len(rows) >= top_k or searched_all:
+                    break
+                if k >= top_k * STORE_MAX_OVERFETCH:
+                    return None   # mostly outside the window: a scan is cheaper
+                k *= 4
+        except Exception as e:
+            print("Store search error:", type(e), str(e))
+            return None
+
+        # Later, wider searches only add lower-scored hits
+        return rows[:top_k]
+
+    async def _fetch_by_urls(self, urls: list[str], filters: dict = None) -> list[dict]:
+        """Rows for `urls` (in that order, missing ones skipped), a few `in.(...)` queries."""
+        chunks = [urls[i:i + URL_FETCH_CHUNK] for i in range(0, len(urls), URL_FETCH_CHUNK)]
+        pages = await asyncio.gather(*(
+            self.db.fetch_page(
+                "articles", columns=RANKING_COLUMNS,
+                filters={**(filters or {}), "url": _in_filter(chunk)},
+            )
+            for chunk in chunks
+        ))
+        by_url = {row["url"]: row for page in pages for row in page}
+        return [by_url[url] for url in urls if url in by_url]
 
     # --------------------------------------------------
-    # CLEANUP CONTEXT BUILDER
+    # TRENDING TOPICS (incremental clustering)
+    # --------------------------------------------------
+    async def sync_topics(self) -> int:
+        """Cluster rows saved since the last sync (by any process); returns rows assigned."""
+        topics = self.semantic.topics
+        await asyncio.to_thread(topics.refresh)
+        since = topics.sync_start()
+        if since is None:
+            since = (datetime.now(timezone.utc) - timedelta(hours=settings.topic_window_hours)).isoformat()
+        return await self.semantic.sync_topics(
+            self.db.iter_pages("articles", columns=RANKING_COLUMNS, since=since)
+        )
+
+    async def get_trending_topics(self, limit: int) -> list[dict]:
+        # Synced on ingest and by the scheduler; reads only pick up its saves
+        topics = self.semantic.topics
+        await asyncio.to_thread(topics.refresh)
+        return topics.trending(limit)
+
+    async def trending_articles(self):
+        """
+        Newest articles of the hottest topics, interleaved topic by topic
+        (so the token budget cuts the least important ones). Returns None
+        if topics are disabled or unavailable.
+        """
+        if not settings.topics_enabled:
+            return None
+        try:
+            topics = self.semantic.topics
+            await asyncio.to_thread(topics.refresh)
+            trending = topics.trending(settings.trending_topics)
+            depth = max((len(t["articles"]) for t in trending), default=0)
+            keys = [
+                t["articles"][i]["key"]
+                for i in range(depth) for t in trending if i < len(t["articles"])
+            ]
+            rows = await self._fetch_by_urls([k for k in keys if not k.startswith("hash:")])
+        except Exception as e:
+            print("Trending topics error:", type(e), str(e))
+            return None
+
+        self.trending = trending
+        return rows
+
     # --------------------------------------------------
+    # CONTEXT BUILDER (token budget)
+    # --------------------------------------------------
+    def _unique_stories(self, articles: list[dict]) -> list[dict]:
+        # One entry per story: syndicated copies only waste prompt tokens
+        if settings.near_dup_enabled:
+            return collapse_near_duplicates(articles)
+        return articles
+
     def build_context(self, articles: list[dict]) -> str:
-        context_parts = []
-        for a in articles:
-            title = (a.get("title") or "").strip()
-            summary = (a.get("summary") or "").strip()
-            if summary:
-                summary = summary[:600]
-            context_parts.append(f"Title: {title}\nSummary: {summary}")
+        """Token-budgeted context, packed in the given order."""
+        context, self.context_stats = self.packer.pack(self._unique_stories(articles))
+        return context
 
-        return "\n\n".join(context_parts)
+    async def pack_context(self, articles: list[dict], query: str = None) -> str:
+        """
+        Relevant-but-diverse context (MMR on embeddings) within the token
+        budget; falls back to build_context() if embedding fails.
+        """
+        articles = self._unique_stories(articles)
+        try:
+            doc_emb = await self.semantic.embed_articles(articles)
+            query_emb = (await self.semantic.encode([query]))[0] if query else None
+        except Exception as e:
+            print("Embedding error:", e)
+            return await asyncio.to_thread(self.build_context, articles)
+
+        context, self.context_stats = await asyncio.to_thread(self.packer.pack, articles, doc_emb, query_emb)
+        return context
 
     # --------------------------------------------------
     # GENERATE IDEAS FROM RECENT ARTICLES
     # --------------------------------------------------
     async def generate_ideas(self):
-        articles = await self.get_recent_articles(limit=5)
-        if not articles:
-            return ["No articles found. Please scrape first."]
-
-        context = self.build_context(articles)
+        # Hottest topics first; the latest rows if there are none (yet)
+        articles = await self.trending_articles()
+        if articles:
+            # Already ordered by topic heat; no re-ranking per request
+            context = await asyncio.to_thread(self.build_context, articles)
+            source = "summaries of the most active news topics right now"
+        else:
+            articles = await self.get_recent_articles(limit=settings.context_candidates)
+            if not articles:
+                return ["No articles found. Please scrape first."]
+            context = await self.pack_context(articles)
+            source = "real news article summaries"
 
         prompt = (
-            "You are an expert news analyst. Based ONLY on the following real news article summaries, "
+            f"You are an expert news analyst. Based ONLY on the following {source}, "
             "generate 5 clear, concise, highly relevant news story ideas.\n\n"
             f"{context}\n\n"
             "Ensure all ideas are directly related to the content. Keep them short, crisp, and real."
         )
 
         ideas_text = await self.gemini.raw_prompt(prompt)
-        ideas = [i.strip("•-● ").strip() for i in ideas_text.split("\n") if i.strip()]
-
-        return ideas[:10]
+        return self.parse_ideas(ideas_text)
 
     # --------------------------------------------------
     # GENERATE FROM PROVIDED ARTICLE LIST
     # --------------------------------------------------
-    async def generate_ideas_from_list(self, articles: list[dict]):
-        if not articles:
-            return ["No relevant articles found for this keyword."]
-
-        context = self.build_context(articles)
+    async def _list_prompt(self, articles: list[dict], query: str = None) -> str:
+        context = await self.pack_context(articles, query=query)
 
-        prompt = (
+        return (
             "Based strictly on the following article summaries, produce 5 short and relevant news story ideas. "
             "Do NOT add unrelated topics.\n\n"
             f"{context}"
         )
 
-        ideas_text = await self.gemini.raw_prompt(prompt)
+    @staticmethod
+    def parse_ideas(ideas_text: str) -> list[str]:
         ideas = [i.strip("•-● ").strip() for i in ideas_text.split("\n") if i.strip()]
         return ideas[:10]
 
+    async def generate_ideas_from_list(self, articles: list[dict], query: str = None):
+        if not articles:
+            return ["No relevant articles found for this keyword."]
+
+        ideas_text = await self.gemini.raw_prompt(await self._list_prompt(articles, query=query))
+        return self.parse_ideas(ideas_text)
+
+    async def stream_ideas_from_list(self, articles: list[dict], query: str = None):
+        """Yield raw idea text chunks as Gemini produces them."""
+        prompt = await self._list_prompt(articles, query=query)
+        async for chunk in self.gemini.stream_prompt(prompt):
+            yield chunk
+
     # --------------------------------------------------
     # GENERATE IDEAS BY KEYWORD (Semantic Filter)
     # --------------------------------------------------
@@ -100,14 +421,131 @@ class IdeaGenerator:
         if not keyword:
             return ["Keyword required"]
 
-        all_articles = await self.db.fetch_all("articles")
-        if not all_articles:
+        # Semantic TOP-K candidates: database-side when pgvector is on,
+        # else from the local embedding store, else (or if those fail)
+        # streamed page by page. The packer then picks what fits the budget.
+        top_k = settings.context_candidates
+        relevant = await self.find_relevant_in_db(keyword, top_k=top_k)
+        if not relevant:
+            relevant = await self.find_relevant_in_store(keyword, top_k=top_k)
+        if not relevant:
+            relevant = await self.semantic.find_relevant_stream(
+                keyword, self.iter_article_pages(), top_k=top_k
+            )
+
+        # TOP-K of a non-empty table is never empty
+        if not relevant:
             return [f"No articles found in DB for '{keyword}'"]
 
-        # Semantic TOP-K relevance detection
-        relevant = self.semantic.find_relevant(keyword, all_articles, top_k=8)
+        return await self.generate_ideas_from_list(relevant, query=keyword)
 
-        if not relevant:
-            return [f"No relevant articles found for '{keyword}'"]
+    # --------------------------------------------------
+    # GENERATE IDEAS FOR MANY KEYWORDS (batched)
+    # --------------------------------------------------
+    async def generate_ideas_batch(self, keywords: list[str]) -> dict:
+        """
+        One pass over the articles and one keyword encode for all
+        keywords; topic contexts are then packed into as few structured
+        Gemini calls as the per-call limits allow.
+
+        Returns {"results": [{"keyword", "status", "ideas", "articles",
+        "context_tokens", "detail"}], "calls": n, "failed": [keyword]}
+        where status is ok | no_articles | missing | error.
+        """
+        # Case-insensitive: the model's answers are matched back by lower-case keyword
+        unique = {}
+        for k in keywords:
+            if k and k.strip():
+                unique.setdefault(k.strip().lower(), k.strip())
+        keywords = list(unique.values())
+        results = {
+            kw: {"keyword": kw, "status": "ok", "ideas": [], "articles": 0,
+                 "context_tokens": None, "detail": None}
+            for kw in keywords
+        }
+        if not keywords:
+            return {"results": [], "calls": 0, "failed": []}
+
+        try:
+            kw_emb = await self.semantic.encode(keywords)
+            groups = await self.semantic.find_relevant_multi_stream(
+                kw_emb, self.iter_article_pages(), top_k=settings.context_candidates
+            )
+        except Exception as e:
+            print("Batch ranking error:", type(e), str(e))
+            for r in results.values():
+                r.update(status="error", detail=f"ranking failed: {e}")
+            return {"results": list(results.values()), "calls": 0, "failed": keywords}
 
-        return await self.generate_ideas_from_list(relevant)
+        # Per-topic context, packed to the per-topic budget
+        packer = ContextPacker(budget=settings.batch_topic_token_budget)
+        topics = []
+        for kw, vec, articles in zip(keywords, kw_emb, groups):
+            articles = self._unique_stories(articles)
+            if not articles:
+                results[kw].update(status="no_articles", ideas=[f"No articles found in DB for '{kw}'"])
+                continue
+            try:
+                doc_emb = await self.semantic.embed_articles(articles)
+                context, stats = await asyncio.to_thread(packer.pack, articles, doc_emb, vec)
+            except Exception as e:
+                # Only this keyword fails, as with a failed call below
+                print("Batch context error:", kw, type(e), str(e))
+                results[kw].update(status="error", detail=f"context failed: {e}")
+                continue
+            results[kw].update(articles=stats["articles"], context_tokens=stats["tokens"])
+            topics.append((kw, context, stats["tokens"]))
+
+        # Group topics into calls under the per-call limits
+        calls, current, current_tokens = [], [], 0
+        for topic in topics:
+            full = len(current) >= settings.batch_max_topics_per_call
+            too_big = current_tokens + topic[2] > settings.batch_max_prompt_tokens
+            if current and (full or too_big):
+                calls.append(current)
+                current, current_tokens = [], 0
+            current.append(topic)
+            current_tokens += topic[2]
+        if current:
+            calls.append(current)
+
+        limit = asyncio.Semaphore(settings.batch_max_concurrent_calls)
+
+        async def run(call):
+            async with limit:
+                try:
+                    answer = await self.gemini.json_prompt(
+                        self._batch_prompt(call), _batch_schema([kw for kw, _, _ in call])
+                    )
+                except Exception as e:
+                    print("Batch ideas error:", type(e), str(e))
+                    for kw, _, _ in call:
+                        results[kw].update(status="error", detail=str(e) or type(e).__name__)
+                    return
+
+            by_keyword = {}
+            for item in answer if isinstance(answer, list) else []:
+                if isinstance(item, dict) and isinstance(item.get("ideas"), list):
+                    by_keyword[str(item.get("keyword", "")).strip().lower()] = item["ideas"]
+
+            for kw, _, _ in call:
+                ideas = by_keyword.get(kw.lower())
+                if ideas is None:
+                    results[kw].update(status="missing", detail="topic missing from model output")
+                else:
+                    results[kw]["ideas"] = [str(i).strip() for i in ideas if str(i).strip()][:10]
+
+        await asyncio.gather(*(run(call) for call in calls))
+
+        failed = [kw for kw, r in results.items() if r["status"] in ("error", "missing")]
+        return {"results": list(results.values()), "calls": len(calls), "failed": failed}
+
+    def _batch_prompt(self, call: list) -> str:
+        sections = "\n\n".join(f"### Topic: {kw}\n{context}" for kw, context, _ in call)
+        return (
+            "You are an expert news analyst. For EACH topic below, produce 5 short and relevant "
+            "news story ideas based strictly on that topic's article summaries. "
+            "Do NOT add unrelated topics. Return one entry per topic, with the topic name "
+            "exactly as given in `keyword`.\n\n"
+            f"{sections}"
+        )
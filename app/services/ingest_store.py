@@ -0,0 +1,338 @@
+# app/services/ingest_store.py
+
+"""
+IngestStore
+-----------
+Local SQLite state for background ingestion (INGEST_DB_PATH):
+
+- watchlists: keyword sets refreshed every `interval_seconds`
+- jobs:       durable refresh queue (queued → running → done | failed);
+              failed attempts are re-queued with exponential backoff
+              until INGEST_MAX_ATTEMPTS
+- results:    latest precomputed output per keyword set and kind, read
+              by the request paths while younger than PRECOMPUTED_MAX_AGE:
+              "pipeline" (scrape-and-generate) and, for single-keyword
+              watchlists, "keyword_ideas" (/ideas?keyword= over stored articles)
+
+Queue transitions run in BEGIN IMMEDIATE transactions, so concurrent
+workers never claim the same job, and API processes can read results
+from the same file. Jobs that were `running` when the scheduler process
+died are re-queued on its next start.
+
+All methods block; call them through asyncio.to_thread from async code.
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from app.config import settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watchlists (
+    id               INTEGER PRIMARY KEY AUTOINCREMENT,
+    name             TEXT NOT NULL,
+    keywords         TEXT NOT NULL,
+    key              TEXT NOT NULL UNIQUE,
+    interval_seconds REAL NOT NULL,
+    enabled          INTEGER NOT NULL DEFAULT 1,
+    next_run_at      REAL NOT NULL,
+    last_run_at      REAL,
+    last_status      TEXT,
+    last_error       TEXT,
+    created_at       REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    watchlist_id INTEGER,
+    keywords     TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    enqueued_at  REAL NOT NULL,
+    run_after    REAL NOT NULL,
+    started_at   REAL,
+    finished_at  REAL,
+    error        TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs (status, run_after);
+CREATE TABLE IF NOT EXISTS results (
+    key         TEXT PRIMARY KEY,
+    payload     TEXT NOT NULL,
+    computed_at REAL NOT NULL
+);
+"""
+
+# finished jobs kept for inspection
+MAX_FINISHED_JOBS = 1000
+
+
+def keywords_key(keywords: list[str]) -> str:
+    """Order/case-insensitive identity of a keyword set."""
+    return "|".join(sorted({k.strip().lower() for k in keywords if k and k.strip()}))
+
+
+def result_key(keywords: list[str], kind: str = "pipeline") -> str:
+    """Row key in `results`; pipeline results use the bare keyword-set key."""
+    key = keywords_key(keywords)
+    return key if kind == "pipeline" else f"{kind}:{key}"
+
+
+def _watchlist(row: sqlite3.Row) -> dict:
+    item = dict(row)
+    item["keywords"] = json.loads(item["keywords"])
+    item["enabled"] = bool(item["enabled"])
+    return item
+
+
+def _job(row: sqlite3.Row) -> dict:
+    item = dict(row)
+    item["keywords"] = json.loads(item["keywords"])
+    return item
+
+
+class IngestStore:
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        # autocommit; transactions are opened explicitly in _tx()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    @contextmanager
+    def _tx(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # ------------------------------------------------------------
+    # Watchlists
+    # ------------------------------------------------------------
+    def upsert_watchlist(
+        self,
+        keywords: list[str],
+        name: Optional[str] = None,
+        interval_seconds: Optional[float] = None,
+        enabled: bool = True,
+    ) -> dict:
+        """Create a watchlist (due immediately), or update the one with the same keywords."""
+        keywords = [k.strip() for k in keywords if k and k.strip()]
+        if not keywords:
+            raise ValueError("Watchlist needs at least one keyword")
+        key = keywords_key(keywords)
+        interval = interval_seconds or settings.watchlist_default_interval
+        now = time.time()
+
+        with self._tx() as db:
+            db.execute(
+                "INSERT INTO watchlists"
+                " (name, keywords, key, interval_seconds, enabled, next_run_at, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET"
+                " name = excluded.name, keywords = excluded.keywords,"
+                " interval_seconds = excluded.interval_seconds, enabled = excluded.enabled",
+                (name or ", ".join(keywords), json.dumps(keywords), key, interval, int(enabled), now, now),
+            )
+            row = db.execute("SELECT * FROM watchlists WHERE key = ?", (key,)).fetchone()
+        return _watchlist(row)
+
+    def list_watchlists(self) -> list[dict]:
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM watchlists ORDER BY id").fetchall()
+        return [_watchlist(r) for r in rows]
+
+    def get_watchlist(self, watchlist_id: int) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM watchlists WHERE id = ?", (watchlist_id,)).fetchone()
+        return _watchlist(row) if row else None
+
+    def delete_watchlist(self, watchlist_id: int) -> bool:
+        with self._tx() as db:
+            db.execute("DELETE FROM jobs WHERE watchlist_id = ? AND status = 'queued'", (watchlist_id,))
+            deleted = db.execute("DELETE FROM watchlists WHERE id = ?", (watchlist_id,)).rowcount
+        return bool(deleted)
+
+    # ------------------------------------------------------------
+    # Queue
+    # ------------------------------------------------------------
+    def _enqueue(self, db, watchlist: sqlite3.Row, now: float) -> Optional[int]:
+        active = db.execute(
+            "SELECT 1 FROM jobs WHERE watchlist_id = ? AND status IN ('queued', 'running') LIMIT 1",
+            (watchlist["id"],),
+        ).fetchone()
+        if active:
+            return None
+        cur = db.execute(
+            "INSERT INTO jobs (watchlist_id, keywords, status, enqueued_at, run_after)"
+            " VALUES (?, ?, 'queued', ?, ?)",
+            (watchlist["id"], watchlist["keywords"], now, now),
+        )
+        return cur.lastrowid
+
+    def enqueue_now(self, watchlist_id: int) -> Optional[int]:
+        """Queue a refresh right away; None if one is already queued/running."""
+        with self._tx() as db:
+            row = db.execute("SELECT * FROM watchlists WHERE id = ?", (watchlist_id,)).fetchone()
+            if row is None:
+                raise KeyError(watchlist_id)
+            return self._enqueue(db, row, time.time())
+
+    def schedule_due(self, now: float, jitter: float = 0.0) -> int:
+        """Queue every enabled, due watchlist and push its next run out by interval ± jitter."""
+        queued = 0
+        with self._tx() as db:
+            due = db.execute(
+                "SELECT * FROM watchlists WHERE enabled = 1 AND next_run_at <= ?", (now,)
+            ).fetchall()
+            for row in due:
+                if self._enqueue(db, row, now) is not None:
+                    queued += 1
+                # jitter spreads watchlists created together over time
+                delay = row["interval_seconds"] * (1 + random.uniform(-jitter, jitter))
+                db.execute("UPDATE watchlists SET next_run_at = ? WHERE id = ?", (now + delay, row["id"]))
+        return queued
+
+    def claim(self, now: float) -> Optional[dict]:
+        """Take the oldest runnable job (status → running), or None."""
+        with self._tx() as db:
+            row = db.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND run_after <= ?"
+                " ORDER BY run_after, id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?"
+                " WHERE id = ?",
+                (now, row["id"]),
+            )
+        job = _job(row)
+        job.update(status="running", attempts=job["attempts"] + 1, started_at=now)
+        return job
+
+    def complete(self, job: dict, payload: dict, extra: Optional[dict] = None):
+        """Mark `job` done and store its pipeline `payload` (+ `extra` {kind: payload})."""
+        now = time.time()
+        results = {"pipeline": payload, **(extra or {})}
+        with self._tx() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'done', finished_at = ?, error = NULL WHERE id = ?",
+                (now, job["id"]),
+            )
+            for kind, value in results.items():
+                db.execute(
+                    "INSERT OR REPLACE INTO results (key, payload, computed_at) VALUES (?, ?, ?)",
+                    (result_key(job["keywords"], kind), json.dumps(value), now),
+                )
+            db.execute(
+                "UPDATE watchlists SET last_run_at = ?, last_status = 'ok', last_error = NULL"
+                " WHERE id = ?",
+                (now, job["watchlist_id"]),
+            )
+            self._prune(db)
+
+    def fail(self, job: dict, error: str, max_attempts: int, backoff: float):
+        """Re-queue with exponential backoff, or mark failed after `max_attempts`."""
+        now = time.time()
+        with self._tx() as db:
+            if job["attempts"] < max_attempts:
+                db.execute(
+                    "UPDATE jobs SET status = 'queued', run_after = ?, error = ? WHERE id = ?",
+                    (now + backoff * 2 ** (job["attempts"] - 1), error, job["id"]),
+                )
+            else:
+                db.execute(
+                    "UPDATE jobs SET status = 'failed', finished_at = ?, error = ? WHERE id = ?",
+                    (now, error, job["id"]),
+                )
+            db.execute(
+                "UPDATE watchlists SET last_run_at = ?, last_status = 'error', last_error = ?"
+                " WHERE id = ?",
+                (now, error, job["watchlist_id"]),
+            )
+
+    def requeue_running(self) -> int:
+        """Jobs left `running` by a dead process go back to the queue."""
+        with self._tx() as db:
+            return db.execute(
+                "UPDATE jobs SET status = 'queued', run_after = ? WHERE status = 'running'",
+                (time.time(),),
+            ).rowcount
+
+    def _prune(self, db):
+        db.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND id NOT IN ("
+            " SELECT id FROM jobs WHERE status IN ('done', 'failed')"
+            " ORDER BY id DESC LIMIT ?)",
+            (MAX_FINISHED_JOBS,),
+        )
+
+    # ------------------------------------------------------------
+    # Precomputed results
+    # ------------------------------------------------------------
+    def get_result(self, keywords: list[str], max_age: float, kind: str = "pipeline") -> Optional[dict]:
+        """Latest `kind` payload for this keyword set if younger than `max_age` (adds "age_seconds")."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT payload, computed_at FROM results WHERE key = ?", (result_key(keywords, kind),)
+            ).fetchone()
+        if row is None:
+            return None
+        age = time.time() - row["computed_at"]
+        if age > max_age:
+            return None
+        return {**json.loads(row["payload"]), "age_seconds": age}
+
+    # ------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------
+    def stats(self, now: Optional[float] = None) -> dict:
+        now = now or time.time()
+        with self._lock:
+            counts = dict(self._db.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall())
+            oldest = self._db.execute(
+                "SELECT MIN(run_after) FROM jobs WHERE status = 'queued' AND run_after <= ?", (now,)
+            ).fetchone()[0]
+            overdue = self._db.execute(
+                "SELECT COUNT(*), MIN(next_run_at) FROM watchlists WHERE enabled = 1 AND next_run_at <= ?",
+                (now,),
+            ).fetchone()
+            results = self._db.execute("SELECT key, computed_at FROM results").fetchall()
+
+        return {
+            "jobs": {s: counts.get(s, 0) for s in ("queued", "running", "done", "failed")},
+            # how long the oldest runnable job has been waiting for a worker
+            "queue_lag_seconds": (now - oldest) if oldest is not None else 0.0,
+            "overdue_watchlists": overdue[0],
+            "schedule_lag_seconds": (now - overdue[1]) if overdue[1] is not None else 0.0,
+            "result_age_seconds": {r["key"]: now - r["computed_at"] for r in results},
+        }
+
+
+_store: Optional[IngestStore] = None
+
+
+def get_ingest_store() -> IngestStore:
+    global _store
+    if _store is None:
+        _store = IngestStore(settings.ingest_db_path)
+    return _store
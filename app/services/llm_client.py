@@ -6,10 +6,35 @@ GeminiClient
 Handles all LLM interactions:
 1. expand_keywords() → returns exactly 10 SEO keywords
 2. raw_prompt() → generic LLM prompt
+3. stream_prompt() → same, yielding text chunks (streamGenerateContent)
+4. json_prompt() → structured output constrained by a JSON schema
+
+Responses are cached by a hash of (model, prompt, generation config),
+with single-flight so identical concurrent prompts share one call.
+Pass use_cache=False to force a fresh generation.
+
+Calls go through the "gemini" UpstreamPolicy (adaptive timeouts,
+retries, circuit breaker); latencies are tracked per operation since
+an expansion and an idea generation take very different times.
 """
 
-import httpx
+import hashlib
+import json
+from typing import Optional
+
 from app.config import settings
+from app.services.cache import TTLCache
+from app.services.http_clients import http_clients
+from app.services.tracing import traced
+from app.services.upstream_policy import get_upstream_policy
+
+# Shared across requests and, via SQLite, across restarts/deploys
+response_cache = TTLCache(
+    "gemini",
+    ttl=settings.gemini_cache_ttl,
+    max_entries=settings.gemini_cache_max_entries,
+    disk_path=settings.gemini_cache_path,
+)
 
 
 class GeminiClient:
@@ -19,11 +44,13 @@ class GeminiClient:
         self.api_url = settings.gemini_api_url
         self.api_key = settings.gemini_api_key
         self.model = "gemini-2.5-flash"
+        self.policy = get_upstream_policy("gemini")
 
     # ------------------------------------------------------------
     # 1. Expand Keywords
     # ------------------------------------------------------------
-    async def expand_keywords(self, user_keywords: list[str]) -> list[str]:
+    @traced("gemini.expand_keywords")
+    async def expand_keywords(self, user_keywords: list[str], use_cache: bool = True) -> list[str]:
 
         prompt = (
             "Expand the following into exactly 10 SEO-optimized keywords.\n"
@@ -31,28 +58,7 @@ class GeminiClient:
             f"User keywords: {user_keywords}"
         )
 
-        url = f"{self.api_url}/{self.model}:generateContent?key={self.api_key}"
-
-        body = {
-            "contents": [
-                {"parts": [{"text": prompt}]}
-            ]
-        }
-
-        async with httpx.AsyncClient(timeout=20) as client:
-            response = await client.post(url, json=body)
-
-        response.raise_for_status()
-        raw = response.json()
-
-        # --------------------------------------------------------
-        # Safe extraction (Gemini sometimes changes response shape)
-        # --------------------------------------------------------
-        try:
-            text = raw["candidates"][0]["content"]["parts"][0]["text"]
-        except:
-            # fallback for alternate response format
-            text = raw["candidates"][0]["content"]["parts"][0].get("raw_text", "")
+        text = await self._generate(prompt, use_cache=use_cache, op="expand")
 
         # Normalization: handle newlines / bullets / hyphens / pipes
         text = text.replace("\n", ",").replace("•", ",").replace("-", ",").replace("|", ",")
@@ -74,7 +80,108 @@ class GeminiClient:
     # ------------------------------------------------------------
     # 2. Raw Prompt (Idea generator)
     # ------------------------------------------------------------
-    async def raw_prompt(self, prompt: str) -> str:
+    @traced("gemini.raw_prompt")
+    async def raw_prompt(self, prompt: str, use_cache: bool = True) -> str:
+        return await self._generate(prompt, use_cache=use_cache)
+
+    # ------------------------------------------------------------
+    # 3. Streaming Prompt
+    # ------------------------------------------------------------
+    @traced("gemini.stream")
+    async def stream_prompt(self, prompt: str, use_cache: bool = True):
+        """
+        Yield text chunks as they arrive via streamGenerateContent (SSE).
+        A cached response is yielded in one chunk; a completed, non-empty
+        stream is cached so the non-streaming path can reuse it.
+        """
+        key = self._cache_key(prompt, None)
+
+        if use_cache:
+            cached = await response_cache.aget(key)
+            if cached is not None:
+                yield cached
+                return
+
+        url = f"{self.api_url}/{self.model}:streamGenerateContent?alt=sse&key={self.api_key}"
+
+        body = {
+            "contents": [
+                {"parts": [{"text": prompt}]}
+            ]
+        }
+
+        parts = []
+        client = http_clients.get("gemini")
+        # Chunks may already be out; a stream is never retried or hedged
+        async with self.policy.guard():
+            async with client.stream("POST", url, json=body) as response:
+                response.raise_for_status()
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    try:
+                        event = json.loads(line[len("data:"):].strip())
+                        text = event["candidates"][0]["content"]["parts"][0].get("text", "")
+                    except (ValueError, KeyError, IndexError):
+                        continue
+                    if text:
+                        parts.append(text)
+                        yield text
+
+        full = "".join(parts)
+        if full:
+            # An empty stream would otherwise be served as "no ideas" for a day
+            await response_cache.aset(key, full)
+
+    # ------------------------------------------------------------
+    # 4. Structured (JSON schema) Prompt
+    # ------------------------------------------------------------
+    @traced("gemini.json_prompt")
+    async def json_prompt(self, prompt: str, schema: dict, use_cache: bool = True):
+        """
+        Return the parsed JSON response, constrained to `schema`
+        (generationConfig.responseSchema, OpenAPI subset).
+        """
+        config = {"responseMimeType": "application/json", "responseSchema": schema}
+        text = await self._generate(prompt, generation_config=config, use_cache=use_cache, op="json")
+        try:
+            return json.loads(text)
+        except ValueError:
+            if not use_cache:
+                raise
+            # Don't keep serving a truncated/invalid cached answer; regenerate once
+            text = await self._generate(prompt, generation_config=config, use_cache=False, op="json")
+            return json.loads(text)
+
+    # ------------------------------------------------------------
+    # Shared generateContent call (cached)
+    # ------------------------------------------------------------
+    def _cache_key(self, prompt: str, generation_config: Optional[dict]) -> str:
+        payload = json.dumps(
+            {"model": self.model, "prompt": prompt, "config": generation_config or {}},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def _generate(
+        self,
+        prompt: str,
+        generation_config: Optional[dict] = None,
+        use_cache: bool = True,
+        op: str = "generate",
+    ) -> str:
+        key = self._cache_key(prompt, generation_config)
+        return await response_cache.get_or_compute(
+            key,
+            lambda: self.policy.call(lambda: self._call_generate(prompt, generation_config), op=op),
+            bypass=not use_cache,
+            # An empty answer (blocked / unexpected shape) would be served for a day
+            cacheable=bool,
+        )
+
+    @traced("gemini.generate")
+    async def _call_generate(self, prompt: str, generation_config: Optional[dict] = None) -> str:
 
         url = f"{self.api_url}/{self.model}:generateContent?key={self.api_key}"
 
@@ -83,15 +190,20 @@ class GeminiClient:
                 {"parts": [{"text": prompt}]}
             ]
         }
+        if generation_config:
+            body["generationConfig"] = generation_config
 
-        async with httpx.AsyncClient(timeout=20) as client:
-            response = await client.post(url, json=body)
+        client = http_clients.get("gemini")
+        response = await client.post(url, json=body)
 
         response.raise_for_status()
         raw = response.json()
 
-        # Safe extraction for Gemini shapes
+        # --------------------------------------------------------
+        # Safe extraction (Gemini sometimes changes response shape)
+        # --------------------------------------------------------
         try:
             return raw["candidates"][0]["content"]["parts"][0]["text"]
         except:
+            # fallback for alternate response format
             return raw["candidates"][0]["content"]["parts"][0].get("raw_text", "")
@@ -0,0 +1,164 @@
+# app/services/model_registry.py
+
+"""
+ModelRegistry
+-------------
+Process-wide home for the SentenceTransformer used by SemanticEngine.
+
+The model is loaded once (normally from the FastAPI lifespan), warmed up
+with a throwaway encode, and then shared by every request. Loading is
+guarded by a lock so concurrent first callers never load it twice.
+
+EMBEDDING_BACKEND picks how it runs on CPU:
+- "torch":     PyTorch fp32 (reference quality)
+- "onnx":      ONNX Runtime, same weights
+- "onnx-int8": ONNX Runtime with dynamically quantized int8 weights;
+               uses the pre-quantized file from the model repo, or
+               quantizes once into EMBEDDING_ONNX_CACHE_DIR.
+If an ONNX backend can't be loaded (onnxruntime / optimum missing) the
+registry falls back to torch and reports it in status().
+
+Compare backends with `python -m benchmarks.bench_embedding_backends`.
+"""
+
+import os
+import platform
+import threading
+import time
+from typing import Optional
+
+from app.config import settings
+from app.services.tracing import span
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def _int8_arch() -> str:
+    return "arm64" if platform.machine().lower() in ("arm64", "aarch64") else "avx2"
+
+
+# Pre-quantized files published with the sentence-transformers models
+_INT8_FILES = {"arm64": "onnx/model_qint8_arm64.onnx", "avx2": "onnx/model_quint8_avx2.onnx"}
+_LOCAL_INT8_FILE = "onnx/model_int8.onnx"
+
+
+class ModelRegistry:
+    """Thread-safe lazy holder for the embedding model."""
+
+    def __init__(self, model_name: str, backend: str = "torch", onnx_file: Optional[str] = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend {backend!r} (expected one of {', '.join(BACKENDS)})")
+        self.model_name = model_name
+        self.backend = backend
+        self.onnx_file = onnx_file
+        # What actually got loaded (differs from `backend` after a fallback)
+        self.active_backend: Optional[str] = None
+        self._model = None
+        self._lock = threading.Lock()
+        self._warmed_up = False
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def tag(self) -> str:
+        """
+        Identifies the vector space, e.g. for invalidating stored vectors.
+        Names the backend that actually loaded (torch after an ONNX
+        fallback), so reading it loads the model.
+        """
+        self.load()
+        return f"{self.model_name}@{self.active_backend}"
+
+    # ------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------
+    def load(self):
+        """Load the model if needed and return it."""
+        if self._model is not None:
+            return self._model
+
+        with self._lock:
+            if self._model is None:
+                started = time.perf_counter()
+                with span("model.load"):
+                    self._model = self._build()
+                self.load_seconds = time.perf_counter() - started
+
+        return self._model
+
+    def _build(self):
+        # Imported here so routes that never embed don't pay for torch
+        from sentence_transformers import SentenceTransformer
+
+        if self.backend != "torch":
+            try:
+                model = self._build_onnx(SentenceTransformer)
+                self.active_backend = self.backend
+                return model
+            except Exception as e:
+                print("ONNX embedding backend error:", type(e), str(e))
+                print("Falling back to the torch embedding backend")
+
+        self.active_backend = "torch"
+        return SentenceTransformer(self.model_name)
+
+    def _build_onnx(self, SentenceTransformer):
+        if self.backend == "onnx":
+            kwargs = {"file_name": self.onnx_file} if self.onnx_file else {}
+            return SentenceTransformer(self.model_name, backend="onnx", model_kwargs=kwargs)
+
+        # int8: published pre-quantized file first
+        file_name = self.onnx_file or _INT8_FILES[_int8_arch()]
+        try:
+            return SentenceTransformer(
+                self.model_name, backend="onnx", model_kwargs={"file_name": file_name}
+            )
+        except Exception as e:
+            if self.onnx_file:
+                raise
+            print("No pre-quantized ONNX file, quantizing locally:", type(e), str(e))
+        return self._quantize_locally(SentenceTransformer)
+
+    def _quantize_locally(self, SentenceTransformer):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        target = os.path.join(settings.embedding_onnx_cache_dir, self.model_name.replace("/", "--"))
+        if not os.path.exists(os.path.join(target, _LOCAL_INT8_FILE)):
+            base = SentenceTransformer(self.model_name, backend="onnx")
+            base.save(target)
+            export_dynamic_quantized_onnx_model(base, _int8_arch(), target, file_suffix="int8")
+        return SentenceTransformer(target, backend="onnx", model_kwargs={"file_name": _LOCAL_INT8_FILE})
+
+    def warmup(self):
+        """Run one small encode so the first real request isn't the slow one."""
+        model = self.load()
+        if not self._warmed_up:
+            model.encode(["warmup"], convert_to_tensor=True)
+            self._warmed_up = True
+        return model
+
+    def get(self):
+        return self.load()
+
+    # ------------------------------------------------------------
+    # Readiness
+    # ------------------------------------------------------------
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    def status(self) -> dict:
+        return {
+            "model": self.model_name,
+            "backend": self.backend,
+            "active_backend": self.active_backend,
+            "loaded": self.is_loaded,
+            "warmed_up": self._warmed_up,
+            "load_seconds": self.load_seconds,
+        }
+
+
+model_registry = ModelRegistry(
+    settings.embedding_model_name,
+    backend=settings.embedding_backend,
+    onnx_file=settings.embedding_onnx_file,
+)
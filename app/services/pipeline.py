@@ -0,0 +1,167 @@
+# app/services/pipeline.py
+
+"""
+Pipeline stages shared by the scrape endpoints.
+
+scrape_keywords() / iter_scraped() fan keyword searches out concurrently
+(bounded by SCRAPE_CONCURRENCY) and merge the results back in keyword
+order, deduplicating by URL. Output is deterministic: it is exactly what
+a sequential loop over the keywords would produce, but searches overlap.
+Once `max_urls` unique URLs are collected the outstanding searches are
+cancelled.
+
+scrape_and_save() is the expand → scrape → dedup → enrich → save part of
+/scrape-and-generate, shared with the background ingestion workers. It
+saves as results arrive (iter_saved()) and stops once MAX_SAVE_PER_RUN
+rows are new, not once that many URLs were scraped. run_ideas() turns
+its result into ideas, the same way for live runs and watchlist refreshes.
+"""
+
+import asyncio
+from typing import AsyncIterator, Optional
+
+from app.config import settings
+from app.services.article_fetcher import get_article_fetcher
+from app.services.upstream_policy import REJECTED
+
+# Global caps to avoid DB bloat and API overuse
+MAX_SAVE_PER_RUN = 10   # new articles (inserted rows) per pipeline run (change to 5 if you prefer)
+FULL_FETCH_TOP = 3      # number of top articles to fetch full HTML for richer summary
+MAX_EXPANDED = 10       # expanded keywords searched per run
+NO_ARTICLES = "No articles scraped. Try different keywords."
+
+
+async def iter_scraped(
+    scraper,
+    keywords: list[str],
+    max_urls: Optional[int] = None,
+    per_keyword: Optional[int] = None,
+    concurrency: Optional[int] = None,
+) -> AsyncIterator[dict]:
+    """Yield unique scraped articles (keyword order) as soon as they are final."""
+    if not keywords:
+        return
+
+    limit = asyncio.Semaphore(concurrency or settings.scrape_concurrency)
+
+    async def search(kw: str) -> list[dict]:
+        async with limit:
+            return await scraper.search_and_scrape(kw)
+
+    tasks = {asyncio.ensure_future(search(kw)): i for i, kw in enumerate(keywords)}
+    results: list[Optional[list[dict]]] = [None] * len(keywords)
+    next_idx = 0
+    seen = set()
+
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    results[tasks[task]] = task.result()
+                except REJECTED:
+                    raise
+                except Exception as e:
+                    print("Scrape error:", type(e), str(e))
+                    results[tasks[task]] = []
+
+            # Merge only the completed prefix, so order never depends on timing
+            while next_idx < len(keywords) and results[next_idx] is not None:
+                batch = results[next_idx]
+                if per_keyword is not None:
+                    batch = batch[:per_keyword]
+                next_idx += 1
+
+                for art in batch:
+                    url = art.get("url")
+                    if not url or url in seen:
+                        continue
+                    seen.add(url)
+                    yield art
+
+                    if max_urls is not None and len(seen) >= max_urls:
+                        return
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def scrape_keywords(scraper, keywords: list[str], **kwargs) -> list[dict]:
+    """Collect iter_scraped() into a list."""
+    return [art async for art in iter_scraped(scraper, keywords, **kwargs)]
+
+
+
+async def iter_saved(idea, scraper, keywords: list[str]):
+    """
+    Scrape `keywords` (iter_scraped) and save the results as they come, in
+    chunks of as many articles as are still missing, until MAX_SAVE_PER_RUN
+    rows were inserted or the searches ran out: already-stored URLs don't
+    count towards the cap. Yields (articles, statuses, dropped) per chunk;
+    statuses line up with articles, dropped are the near-duplicate statuses.
+    """
+    inserted = 0
+    enriched = 0
+    chunk: list[dict] = []
+
+    async def save(chunk: list[dict]):
+        nonlocal inserted, enriched
+        # Same story syndicated under other URLs → keep one copy
+        articles, dropped = await idea.filter_near_duplicates(chunk)
+        # Richer summaries: full text for the top results (concurrent, polite)
+        top_n = max(0, FULL_FETCH_TOP - enriched)
+        await get_article_fetcher().enrich(articles, top_n=top_n)
+        enriched += min(top_n, len(articles))
+        # One bulk upsert; rows whose URL is already stored come back as duplicates
+        statuses = await idea.save_articles(articles)
+        inserted += sum(st["status"] == "inserted" for st in statuses)
+        return articles, statuses, dropped
+
+    scraped = iter_scraped(scraper, keywords)
+    try:
+        async for art in scraped:
+            chunk.append(art)
+            if len(chunk) >= MAX_SAVE_PER_RUN - inserted:
+                yield await save(chunk)
+                chunk = []
+                if inserted >= MAX_SAVE_PER_RUN:
+                    return
+    finally:
+        # Cancels the searches still running once the cap is reached
+        await scraped.aclose()
+    if chunk:
+        yield await save(chunk)
+
+
+async def scrape_and_save(gemini, scraper, idea, keywords: list[str]):
+    """
+    Returns (expanded_keywords, scraped_articles, save_statuses); statuses
+    line up with the scraped articles.
+    """
+    expanded = await gemini.expand_keywords(keywords)
+    expanded = expanded[:MAX_EXPANDED]
+
+    # Scrape all expanded keywords concurrently; stop once enough rows are new
+    scraped, statuses = [], []
+    async for articles, saved, _ in iter_saved(idea, scraper, expanded):
+        scraped += articles
+        statuses += saved
+    return expanded, scraped, statuses
+
+
+def idea_articles(scraped: list[dict], statuses: list[dict]) -> list[dict]:
+    """
+    Articles a run's ideas come from: every stored one, new or already in
+    the table (still today's news for these keywords); failed saves aside.
+    """
+    return [art for art, st in zip(scraped, statuses) if st["status"] != "error"]
+
+
+async def run_ideas(idea, keywords: list[str], scraped: list[dict], statuses: list[dict]) -> list[str]:
+    """Ideas for a scrape_and_save() result, packed for relevance to the seed keyword."""
+    articles = idea_articles(scraped, statuses)
+    if not articles:
+        return [NO_ARTICLES]
+    return await idea.generate_ideas_from_list(articles, query=keywords[0])
@@ -0,0 +1,311 @@
+# app/services/postgrest_backend.py
+
+"""
+PostgrestBackend
+----------------
+StorageBackend that talks to Supabase through its PostgREST HTTP API.
+This is the default backend (STORAGE_BACKEND=postgrest).
+"""
+
+import asyncio
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from app.config import settings
+from app.services.http_clients import http_clients
+from app.services.storage_backend import StorageBackend
+
+
+class PostgrestBackend(StorageBackend):
+    """Simple wrapper around Supabase REST API."""
+
+    name = "postgrest"
+
+    def __init__(self):
+        # REST endpoint
+        self.base_url = f"{settings.supabase_url}/rest/v1"
+
+        # Required headers
+        self.headers = {
+            "apikey": settings.supabase_key,
+            "Authorization": f"Bearer {settings.supabase_key}",
+            "Content-Type": "application/json",
+            "Prefer": "return=representation,resolution=ignore-duplicates"   # 👈 this ensures Supabase returns JSON
+        }
+
+    # ----------------------------------------------------
+    # INSERT ROW
+    # ----------------------------------------------------
+    async def insert(self, table: str, data: dict):
+        """Insert one row into a table."""
+        url = f"{self.base_url}/{table}"
+
+        client = http_clients.get("supabase")
+        response = await client.post(url, json=data, headers=self.headers)
+
+        try:
+            if response.status_code == 409:  # Conflict (duplicate)
+                return {"status": "duplicate", "url": data.get("url")}
+            response.raise_for_status()
+
+        except Exception:
+            print("INSERT ERROR:", response.status_code, response.text)
+            raise
+
+        # Safely parse JSON (sometimes Supabase returns empty bodies)
+        try:
+            return response.json()
+        except Exception:
+            return {"status": response.status_code, "message": response.text}
+
+    # ----------------------------------------------------
+    # BULK UPSERT (ignore duplicates)
+    # ----------------------------------------------------
+    async def insert_many(
+        self,
+        table: str,
+        rows: list[dict],
+        on_conflict: str = "url",
+        chunk_size: int = None,
+        retries: int = None,
+    ) -> list[dict]:
+        """
+        Insert many rows, `chunk_size` per POST, skipping rows whose
+        `on_conflict` column already exists.
+
+        Returns one status per input row, in order:
+            {"url": ..., "status": "inserted" | "duplicate" | "error", "row": {...} | None}
+        Failed chunks (network errors / 5xx / 429) are retried with backoff.
+        """
+        chunk_size = chunk_size or settings.supabase_insert_chunk_size
+        retries = settings.supabase_insert_retries if retries is None else retries
+
+        url = f"{self.base_url}/{table}?on_conflict={on_conflict}"
+        results = []
+
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            inserted = await self._post_chunk(url, chunk, retries)
+
+            if inserted is None:
+                results.extend(
+                    {"url": r.get(on_conflict), "status": "error", "row": None} for r in chunk
+                )
+                continue
+
+            # Only newly inserted rows come back; everything else was a duplicate
+            by_key = {r.get(on_conflict): r for r in inserted}
+            for r in chunk:
+                key = r.get(on_conflict)
+                row = by_key.pop(key, None)
+                results.append({
+                    "url": key,
+                    "status": "inserted" if row is not None else "duplicate",
+                    "row": row,
+                })
+
+        return results
+
+    async def _post_chunk(self, url: str, chunk: list[dict], retries: int):
+        """POST one chunk; returns the inserted rows or None after giving up."""
+        client = http_clients.get("supabase")
+
+        for attempt in range(retries + 1):
+            try:
+                response = await client.post(url, json=chunk, headers=self.headers)
+            except httpx.TransportError as e:
+                print("BULK INSERT ERROR:", type(e), str(e))
+            else:
+                if response.status_code < 400:
+                    try:
+                        return response.json() or []
+                    except Exception:
+                        return []
+
+                print("BULK INSERT ERROR:", response.status_code, response.text)
+                retryable = response.status_code >= 500 or response.status_code in (408, 429)
+                if not retryable:
+                    return None
+
+            if attempt < retries:
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+        return None
+
+    # ----------------------------------------------------
+    # FETCH ALL
+    # ----------------------------------------------------
+    async def fetch_all(self, table: str):
+        """Fetch all rows."""
+        url = f"{self.base_url}/{table}?select=*"
+
+        client = http_clients.get("supabase")
+        response = await client.get(url, headers=self.headers)
+
+        response.raise_for_status()
+        return response.json()
+
+    # ----------------------------------------------------
+    # FETCH ONE PAGE (column projection, ordering, filters)
+    # ----------------------------------------------------
+    async def fetch_page(
+        self,
+        table: str,
+        columns: str = "*",
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        filters: Optional[dict] = None,
+    ) -> list[dict]:
+        """
+        filters are raw PostgREST params, e.g. {"created_at": "gte.2025-01-01"}.
+        """
+        params = {"select": columns}
+        if order:
+            params["order"] = order
+        if limit is not None:
+            params["limit"] = str(limit)
+        params.update(filters or {})
+
+        client = http_clients.get("supabase")
+        response = await client.get(f"{self.base_url}/{table}", params=params, headers=self.headers)
+
+        response.raise_for_status()
+        return response.json()
+
+    # ----------------------------------------------------
+    # KEYSET PAGINATION (newest first)
+    # ----------------------------------------------------
+    async def iter_pages(
+        self,
+        table: str,
+        columns: str = "id,url,title,summary,created_at",
+        page_size: int = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> AsyncIterator[list[dict]]:
+        """
+        Yield pages of rows ordered by (created_at, id) descending, using
+        keyset pagination (no OFFSET), so memory stays bounded by page_size.
+        `since` / `until` are ISO timestamps bounding created_at.
+        """
+        page_size = page_size or settings.supabase_page_size
+
+        # The cursor columns must always be selected
+        wanted = [c.strip() for c in columns.split(",") if c.strip()]
+        if "*" not in wanted:
+            wanted += [c for c in ("created_at", "id") if c not in wanted]
+        select = ",".join(wanted)
+
+        cursor = None
+        while True:
+            filters = {}
+            bounds = []
+            if since:
+                bounds.append(f'created_at.gte."{since}"')
+            if until:
+                bounds.append(f'created_at.lt."{until}"')
+            if cursor:
+                # timestamps are quoted: they contain reserved chars (: . +)
+                ts, row_id = cursor
+                bounds.append(f'or(created_at.lt."{ts}",and(created_at.eq."{ts}",id.lt.{row_id}))')
+            if bounds:
+                filters["and"] = f"({','.join(bounds)})"
+
+            page = await self.fetch_page(
+                table,
+                columns=select,
+                order="created_at.desc,id.desc",
+                limit=page_size,
+                filters=filters,
+            )
+            if not page:
+                return
+
+            yield page
+
+            if len(page) < page_size:
+                return
+            last = page[-1]
+            cursor = (last["created_at"], last["id"])
+
+    # ----------------------------------------------------
+    # CALL A POSTGRES FUNCTION (PostgREST RPC)
+    # Example: rpc("match_articles", {"query_embedding": [...], "match_count": 8})
+    # ----------------------------------------------------
+    async def rpc(self, function: str, params: dict):
+        url = f"{self.base_url}/rpc/{function}"
+
+        client = http_clients.get("supabase")
+        response = await client.post(url, json=params, headers=self.headers)
+
+        response.raise_for_status()
+        return response.json()
+
+    # ----------------------------------------------------
+    # FETCH WITH QUERY
+    # Example: query="url=eq.https://site.com"
+    # ----------------------------------------------------
+    async def fetch_by_query(self, table: str, query: str):
+        url = f"{self.base_url}/{table}?{query}&select=*"
+
+        client = http_clients.get("supabase")
+        response = await client.get(url, headers=self.headers)
+
+        response.raise_for_status()
+        return response.json()
+    
+        # ----------------------------------------------------
+    # FETCH ONE ROW BY COLUMN MATCH
+    # Example: fetch_one("articles", {"url": "https://example.com"})
+    # ----------------------------------------------------
+    async def fetch_one(self, table: str, filters: dict):
+        """
+        Fetch a single row matching the given filters.
+        filters = {"url": "..."}  → converted to: url=eq.<value>
+        """
+        query_parts = []
+
+        for col, value in filters.items():
+            query_parts.append(f"{col}=eq.{value}")
+
+        query = "&".join(query_parts)
+
+        url = f"{self.base_url}/{table}?{query}&select=*"
+
+        client = http_clients.get("supabase")
+        response = await client.get(url, headers=self.headers)
+
+        response.raise_for_status()
+        data = response.json()
+
+        if isinstance(data, list) and len(data) > 0:
+            return data[0]
+
+        return None
+
+
+    # ----------------------------------------------------
+    # UPDATE ROWS
+    # query example: "id=eq.10"
+    # ----------------------------------------------------
+    async def update(self, table: str, query: str, data: dict):
+        url = f"{self.base_url}/{table}?{query}"
+
+        client = http_clients.get("supabase")
+        response = await client.patch(url, json=data, headers=self.headers)
+
+        response.raise_for_status()
+        return response.json()
+
+    # ----------------------------------------------------
+    # DELETE ROWS
+    # ----------------------------------------------------
+    async def delete(self, table: str, query: str):
+        url = f"{self.base_url}/{table}?{query}"
+
+        client = http_clients.get("supabase")
+        response = await client.delete(url, headers=self.headers)
+
+        response.raise_for_status()
+        return {"deleted": True}
@@ -0,0 +1,253 @@
+# app/services/quota.py
+
+"""
+QuotaScheduler
+--------------
+Client-side rate limiting for the paid upstreams (Gemini, SerpApi), so a
+burst of pipeline runs queues here instead of tripping 429s upstream.
+
+- One token bucket per upstream: *_RATE_LIMIT calls/s, *_RATE_BURST deep.
+  Every attempt (retries and hedges included) takes a token; hedges only
+  go out if a token is free right away.
+- Callers wait in one FIFO queue per priority class; a free token goes
+  to the highest class first: interactive (user requests) → batch
+  (/ideas/batch) → background (watchlist refreshes). The class comes
+  from the context: `with upstream_priority("background"): ...`.
+- Load shedding: a call whose class queue is full (QUOTA_MAX_QUEUE), or
+  whose estimated wait is above the class limit (QUOTA_MAX_WAIT_*),
+  raises QuotaExceeded at once; so does one that waited that long.
+- pause() (called on a 429 / 503 with Retry-After) stops all grants
+  until the upstream said to come back.
+- Queue waits are exported per class (/metrics, /stats) and show up in
+  Server-Timing as e.g. `gemini.queue`.
+"""
+
+import asyncio
+import contextvars
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from app.config import settings
+from app.services.metrics import metrics
+from app.services.tracing import record
+
+PRIORITIES = ("interactive", "batch", "background")
+
+queue_wait = metrics.histogram(
+    "upstream_queue_wait_seconds", "Time calls waited for an upstream rate-limit token.", ["upstream", "priority"]
+)
+queue_depth = metrics.gauge("upstream_queue_depth", "Calls waiting for a rate-limit token.", ["upstream", "priority"])
+shed_total = metrics.counter(
+    "upstream_shed_total", "Calls rejected instead of queued (queue_full, wait, timeout).", ["upstream", "priority", "reason"]
+)
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("upstream_priority", default="interactive")
+
+
+@contextmanager
+def upstream_priority(priority: str):
+    """Upstream calls made inside the block (and tasks it starts) use `priority`."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority {priority!r} (expected one of {', '.join(PRIORITIES)})")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+class QuotaExceeded(Exception):
+    """Shed before calling the upstream: its rate limit is booked up."""
+
+    def __init__(self, upstream: str, priority: str, reason: str, retry_after: float):
+        super().__init__(
+            f"{upstream} rate limit reached for {priority} calls ({reason}), retry in {retry_after:.0f}s"
+        )
+        self.upstream = upstream
+        self.priority = priority
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class QuotaScheduler:
+    def __init__(self, name: str, rate: float, burst: float, max_queue: int, max_wait: dict[str, float]):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+        self.paused_until = 0.0
+        self._queues: dict[str, deque] = {p: deque() for p in PRIORITIES}
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        self.granted = {p: 0 for p in PRIORITIES}
+        self.shed = {p: 0 for p in PRIORITIES}
+        self._waits = {p: deque(maxlen=200) for p in PRIORITIES}
+
+    @property
+    def limited(self) -> bool:
+        return self.rate > 0
+
+    # ------------------------------------------------------------
+    # Bucket
+    # ------------------------------------------------------------
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _ahead_of(self, priority: str) -> int:
+        """Waiting calls that will be served before a new `priority` call."""
+        rank = PRIORITIES.index(priority)
+        return sum(len(self._queues[p]) for p in PRIORITIES[:rank + 1])
+
+    def estimated_wait(self, priority: str) -> float:
+        self._refill()
+        pause = max(0.0, self.paused_until - time.monotonic())
+        return max(pause, (self._ahead_of(priority) + 1 - self.tokens) / self.rate)
+
+    def try_acquire(self) -> bool:
+        """Take a token only if one is free and nobody is queued (used for hedges)."""
+        if not self.limited:
+            return True
+        self._refill()
+        if time.monotonic() < self.paused_until or self.tokens < 1 or any(self._queues.values()):
+            return False
+        self.tokens -= 1
+        return True
+
+    def pause(self, seconds: float):
+        """Upstream asked us to back off (Retry-After): no grants until then."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    # ------------------------------------------------------------
+    # Queueing
+    # ------------------------------------------------------------
+    def _shed(self, priority: str, reason: str, retry_after: float):
+        self.shed[priority] += 1
+        shed_total.inc(upstream=self.name, priority=priority, reason=reason)
+        return QuotaExceeded(self.name, priority, reason, retry_after)
+
+    async def acquire(self, priority: Optional[str] = None) -> float:
+        """Wait for a token; returns the seconds waited or raises QuotaExceeded."""
+        priority = priority or current_priority()
+        if self.try_acquire():
+            self.granted[priority] += 1
+            self._waits[priority].append(0.0)
+            return 0.0
+
+        queue = self._queues[priority]
+        if len(queue) >= self.max_queue:
+            raise self._shed(priority, "queue_full", self.estimated_wait(priority))
+        estimate = self.estimated_wait(priority)
+        if estimate > self.max_wait[priority]:
+            raise self._shed(priority, "wait", estimate)
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        queue_depth.inc(upstream=self.name, priority=priority)
+        self._ensure_dispatcher()
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, timeout=self.max_wait[priority])
+        except asyncio.TimeoutError:
+            raise self._shed(priority, "timeout", self.estimated_wait(priority)) from None
+        finally:
+            queue_depth.dec(upstream=self.name, priority=priority)
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    queue.remove(waiter)
+                except ValueError:
+                    pass
+
+        waited = time.monotonic() - started
+        self.granted[priority] += 1
+        self._waits[priority].append(waited)
+        queue_wait.observe(waited, upstream=self.name, priority=priority)
+        record(f"{self.name}.queue", waited)
+        return waited
+
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        task = self._dispatcher
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._dispatcher = loop.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        """Hand out tokens as they refill, highest priority class first."""
+        while True:
+            queue = next((self._queues[p] for p in PRIORITIES if self._queues[p]), None)
+            if queue is None:
+                return
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            waiter = queue.popleft()
+            if waiter.done():   # timed out / cancelled meanwhile
+                continue
+            self.tokens -= 1
+            waiter.set_result(None)
+
+    def stats(self) -> dict:
+        if not self.limited:
+            return {"rate": None}
+        self._refill()
+        waits = {}
+        for p in PRIORITIES:
+            samples = sorted(self._waits[p])
+            waits[p] = {
+                "queued": len(self._queues[p]),
+                "granted": self.granted[p],
+                "shed": self.shed[p],
+                "wait_p50": samples[len(samples) // 2] if samples else None,
+                "wait_p95": samples[min(len(samples) - 1, int(0.95 * len(samples)))] if samples else None,
+            }
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "tokens": round(self.tokens, 2),
+            "paused_for": round(max(0.0, self.paused_until - time.monotonic()), 1),
+            "priorities": waits,
+        }
+
+
+# ------------------------------------------------------------
+# One scheduler per rate-limited upstream
+# ------------------------------------------------------------
+_quotas: dict[str, QuotaScheduler] = {}
+
+
+def get_quota(name: str) -> QuotaScheduler:
+    quota = _quotas.get(name)
+    if quota is None:
+        limits = {
+            "gemini": (settings.gemini_rate_limit, settings.gemini_rate_burst),
+            "serpapi": (settings.serpapi_rate_limit, settings.serpapi_rate_burst),
+        }
+        rate, burst = limits.get(name, (0.0, 1.0))
+        quota = _quotas[name] = QuotaScheduler(
+            name,
+            rate=rate,
+            burst=burst,
+            max_queue=settings.quota_max_queue,
+            max_wait={
+                "interactive": settings.quota_max_wait_interactive,
+                "batch": settings.quota_max_wait_batch,
+                "background": settings.quota_max_wait_background,
+            },
+        )
+    return quota
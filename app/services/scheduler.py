@@ -0,0 +1,272 @@
+# app/services/scheduler.py
+
+"""
+IngestScheduler
+---------------
+Background refresh of keyword watchlists, so popular topics are scraped
+once per interval instead of inside every user request.
+
+- The scheduler loop wakes every SCHEDULER_TICK_SECONDS, queues each due
+  watchlist (at most one queued/running job per watchlist) and moves its
+  next run out by interval ± WATCHLIST_JITTER.
+- INGEST_WORKERS worker tasks claim jobs from the durable SQLite queue
+  (IngestStore) and run the scrape-and-generate pipeline; the result is
+  stored as the watchlist's precomputed articles + ideas. A single-keyword
+  watchlist also stores the keyword's ideas from stored articles (what
+  /ideas?keyword= returns), as a separate result.
+- Failed jobs are retried with backoff (INGEST_RETRY_BACKOFF).
+- Every TOPIC_SYNC_SECONDS the tick also clusters rows saved since the
+  last sync (by any process) into the trending topics, which API
+  processes then only read.
+
+Runs inside the API process when SCHEDULER_ENABLED=true, or on its own:
+
+    python -m app.services.scheduler
+
+Run it in one process only; API processes just read the results.
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+from app.config import settings
+from app.services.ingest_store import IngestStore, get_ingest_store
+from app.services.quota import upstream_priority
+
+
+def _article_summary(art: dict) -> dict:
+    return {
+        "url": art.get("url"),
+        "title": art.get("title"),
+        "summary": (art.get("summary") or "")[:1000],
+        "snippet": art.get("snippet") or "",
+    }
+
+
+class IngestScheduler:
+    def __init__(
+        self,
+        store: Optional[IngestStore] = None,
+        workers: int = None,
+        tick_seconds: float = None,
+    ):
+        self._store = store
+        self.workers = workers or settings.ingest_workers
+        self.tick_seconds = tick_seconds or settings.scheduler_tick_seconds
+
+        self._tasks: list[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._worker_state: dict[int, dict] = {}
+        self.started_at: Optional[float] = None
+        self.last_tick_at: Optional[float] = None
+        self.topics_synced_at = 0.0
+        self.jobs_done = 0
+        self.jobs_failed = 0
+
+    @property
+    def store(self) -> IngestStore:
+        if self._store is None:
+            self._store = get_ingest_store()
+        return self._store
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    # ------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------
+    async def start(self):
+        if self._tasks:
+            return
+        requeued = await asyncio.to_thread(self.store.requeue_running)
+        if requeued:
+            print(f"Scheduler: re-queued {requeued} interrupted job(s)")
+
+        self._wake = asyncio.Event()
+        self.started_at = time.time()
+        self._tasks = [asyncio.create_task(self._schedule_loop())]
+        self._tasks += [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # a job cut off here stays `running` and is re-queued on next start
+
+    def wake(self):
+        """Let idle workers pick up a job queued outside the tick."""
+        if self._wake is not None:
+            self._wake.set()
+
+    # ------------------------------------------------------------
+    # Scheduler loop
+    # ------------------------------------------------------------
+    async def _schedule_loop(self):
+        while True:
+            try:
+                queued = await asyncio.to_thread(
+                    self.store.schedule_due, time.time(), settings.watchlist_jitter
+                )
+                self.last_tick_at = time.time()
+                if queued:
+                    self.wake()
+            except Exception as e:
+                print("Scheduler error:", type(e), str(e))
+            if settings.topics_enabled and time.time() - self.topics_synced_at >= settings.topic_sync_seconds:
+                await self.sync_topics()
+            await asyncio.sleep(self.tick_seconds)
+
+    async def sync_topics(self):
+        from app.services.idea_generator import IdeaGenerator
+
+        self.topics_synced_at = time.time()
+        try:
+            await IdeaGenerator().sync_topics()
+        except Exception as e:
+            print("Topic sync error:", type(e), str(e))
+
+    # ------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------
+    async def _worker(self, idx: int):
+        state = self._worker_state[idx] = {
+            "state": "idle", "job_id": None, "keywords": None, "since": time.time(),
+        }
+
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.claim, time.time())
+            except Exception as e:
+                print("Scheduler claim error:", type(e), str(e))
+                job = None
+
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.tick_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            state.update(state="busy", job_id=job["id"], keywords=job["keywords"], since=time.time())
+            try:
+                # Rate-limited upstreams serve user requests first
+                with upstream_priority("background"):
+                    payload = await self.run_job(job)
+                    extra = await self.run_keyword_ideas(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("Ingest job error:", job["id"], type(e), str(e))
+                self.jobs_failed += 1
+                await asyncio.to_thread(
+                    self.store.fail,
+                    job,
+                    str(e) or type(e).__name__,
+                    settings.ingest_max_attempts,
+                    settings.ingest_retry_backoff,
+                )
+            else:
+                self.jobs_done += 1
+                await asyncio.to_thread(self.store.complete, job, payload, extra)
+            finally:
+                state.update(state="idle", job_id=None, keywords=None, since=time.time())
+
+    async def run_job(self, job: dict) -> dict:
+        """Scrape + save + ideas for one watchlist; returns the stored payload."""
+        # Imported here: the pipeline pulls in the model / HTTP stack
+        from app.services.idea_generator import IdeaGenerator
+        from app.services.llm_client import GeminiClient
+        from app.services.pipeline import run_ideas, scrape_and_save
+        from app.services.scraper import Scraper
+
+        idea = IdeaGenerator()
+        keywords = job["keywords"]
+        expanded, scraped, statuses = await scrape_and_save(GeminiClient(), Scraper(), idea, keywords)
+        if statuses and all(st["status"] == "error" for st in statuses):
+            raise RuntimeError("saving scraped articles failed")
+
+        # What a live /scrape-and-generate for these keywords would answer
+        ideas = await run_ideas(idea, keywords, scraped, statuses)
+
+        return {
+            "seed_keywords": keywords,
+            "expanded_keywords": expanded,
+            "ideas": ideas,
+            "context_tokens": idea.context_stats["tokens"] if idea.context_stats else None,
+            "articles": [_article_summary(a) for a in scraped],
+            "new_articles": sum(st["status"] == "inserted" for st in statuses),
+        }
+
+    async def run_keyword_ideas(self, job: dict) -> dict:
+        """
+        {"keyword_ideas": payload} for a single-keyword watchlist: ideas
+        ranked from stored articles, as /ideas?keyword= computes them.
+        Empty for other keyword sets or on failure (the pipeline result
+        still counts).
+        """
+        if len(job["keywords"]) != 1:
+            return {}
+        from app.services.idea_generator import IdeaGenerator
+
+        keyword = job["keywords"][0]
+        idea = IdeaGenerator()
+        try:
+            ideas = await idea.generate_ideas_by_keyword(keyword)
+        except Exception as e:
+            print("Keyword ideas error:", job["id"], type(e), str(e))
+            return {}
+        return {"keyword_ideas": {
+            "keyword": keyword,
+            "ideas": ideas,
+            "context_tokens": idea.context_stats["tokens"] if idea.context_stats else None,
+            "context_articles": idea.context_stats["articles"] if idea.context_stats else None,
+        }}
+
+    # ------------------------------------------------------------
+    # Status
+    # ------------------------------------------------------------
+    def status(self) -> dict:
+        now = time.time()
+        return {
+            "running": self.running,
+            "started_at": self.started_at,
+            "last_tick_at": self.last_tick_at,
+            "jobs_done": self.jobs_done,
+            "jobs_failed": self.jobs_failed,
+            "workers": [
+                {**st, "id": idx, "for_seconds": now - st["since"]}
+                for idx, st in sorted(self._worker_state.items())
+            ],
+        }
+
+
+ingest_scheduler = IngestScheduler()
+
+
+async def _main():
+    from app.services import article_fetcher
+    from app.services.http_clients import http_clients
+    from app.services.storage_backend import get_storage_backend
+
+    http_clients.start()
+    await get_storage_backend().start()
+    await ingest_scheduler.start()
+    print(f"Scheduler running with {ingest_scheduler.workers} worker(s); Ctrl+C to stop")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await ingest_scheduler.stop()
+        article_fetcher.shutdown_pool()
+        await get_storage_backend().close()
+        await http_clients.aclose()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        pass
@@ -3,32 +3,54 @@
 # Returns list[dict]: {url, title, summary, snippet, raw_html}
 
 import asyncio
-import httpx
+import json
 import os
 from urllib.parse import quote, unquote
 from app.config import settings  # assume you added serpapi_key etc here
+from app.services.cache import TTLCache
+from app.services.http_clients import http_clients
+from app.services.tracing import traced
+from app.services.upstream_policy import REJECTED, get_upstream_policy
 
-SERPAPI_BASE = "https://serpapi.com/search.json"
+# Shared across requests: identical searches within the TTL are free,
+# and concurrent identical searches share one upstream call.
+search_cache = TTLCache(
+    "serpapi",
+    ttl=settings.serpapi_cache_ttl,
+    max_entries=settings.serpapi_cache_max_entries,
+    disk_path=settings.serpapi_cache_path,
+)
 
 
 class Scraper:
     def __init__(self):
         # prefer settings; fallback to env
+        self.base_url = settings.serpapi_base_url
         self.api_key = getattr(settings, "serpapi_key", None) or os.getenv("SERPAPI_KEY")
         self.engine = getattr(settings, "serpapi_engine", "google_news")
         self.region = getattr(settings, "serpapi_region", "IN")
         self.language = getattr(settings, "serpapi_language", "en")
+        self.policy = get_upstream_policy("serpapi")
 
         if not self.api_key:
             raise RuntimeError("SERPAPI_KEY is required in environment or settings")
 
-        # Default HTTP timeout
-        self._timeout = 20
+    def _cache_key(self, query: str) -> str:
+        return json.dumps([self.engine, query.strip().lower(), self.region, self.language])
 
     async def _call_serpapi(self, query: str, num: int = 5) -> dict:
         """
         Call SerpApi/google_news endpoint and return parsed JSON.
+        Responses are cached per (engine, query, region, language); a miss
+        goes through the "serpapi" UpstreamPolicy (hedged, retried GET).
         """
+        return await search_cache.get_or_compute(
+            self._cache_key(query),
+            lambda: self.policy.call(lambda: self._fetch_serpapi(query), op="search"),
+        )
+
+    @traced("serpapi.search")
+    async def _fetch_serpapi(self, query: str) -> dict:
         params = {
             "engine": self.engine,
             "q": query,
@@ -38,11 +60,13 @@ class Scraper:
             # SerpApi supports a 'num' param for some engines; we'll limit locally
         }
 
-        async with httpx.AsyncClient(timeout=self._timeout) as client:
-            resp = await client.get(SERPAPI_BASE, params=params)
+        # Pooled keep-alive client (timeout configured per upstream)
+        client = http_clients.get("serpapi")
+        resp = await client.get(self.base_url, params=params)
         resp.raise_for_status()
         return resp.json()
 
+    @traced("serpapi.search_and_scrape")
     async def search_and_scrape(self, keyword: str) -> list[dict]:
         """
         Main entry used by rest of pipeline.
@@ -51,6 +75,8 @@ class Scraper:
         """
         try:
             data = await self._call_serpapi(keyword, num=10)
+        except REJECTED:
+            raise
         except Exception as e:
             print("SerpApi error:", type(e), str(e))
             return []
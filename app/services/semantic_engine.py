@@ -1,14 +1,76 @@
 # app/services/semantic_engine.py
 
-from sentence_transformers import SentenceTransformer, util
+import asyncio
+from typing import Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.embedding_executor import EmbeddingExecutor
+from app.services.embedding_store import article_key, doc_text, get_embedding_store, top_indices
+from app.services.model_registry import model_registry
+from app.services.topic_clusters import get_topic_clusters
+from app.services.tracing import span, traced
 
 
 class SemanticEngine:
-    def __init__(self):
-        # Lightweight & fast semantic similarity model
-        self.model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+    def __init__(self, registry=model_registry, store=None, topics=None):
+        # Lightweight & fast semantic similarity model (shared, loaded once)
+        self.registry = registry
+        # Persistent article vectors, so each article is embedded only once.
+        # Opened on first use: it is tagged with the backend that loaded.
+        self._store = store
+        # Off-loop, micro-batched encodes shared by all requests
+        self.executor = EmbeddingExecutor(
+            self.encode_documents,
+            max_batch_size=settings.embedding_max_batch_size,
+            max_wait_ms=settings.embedding_max_wait_ms,
+            workers=settings.embedding_workers,
+        )
+        # Newest created_at already synced into the store (store search path)
+        self.synced_until: Optional[str] = None
+        self._sync_lock: Optional[asyncio.Lock] = None
+        self._index_lock: Optional[asyncio.Lock] = None
+        # Streaming topic clusters for keyword-less /ideas (opened on first use too)
+        self._topics = topics
+        self._topics_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def model(self):
+        return self.registry.get()
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_embedding_store()
+        return self._store
+
+    @property
+    def topics(self):
+        if self._topics is None:
+            self._topics = get_topic_clusters()
+        return self._topics
+
+    def peek_store(self):
+        """The store if it was already opened, without loading the model."""
+        return self._store
 
-    def find_relevant(self, keyword: str, articles: list[dict], top_k: int = 5):
+    def peek_topics(self):
+        return self._topics
+
+    def encode_documents(self, texts: list[str]) -> np.ndarray:
+        """Encode texts into L2-normalised float32 vectors (blocking)."""
+        return self.model.encode(
+            texts, convert_to_numpy=True, normalize_embeddings=True
+        ).astype(np.float32)
+
+    @traced("embedding.encode")
+    async def encode(self, texts: list[str]) -> np.ndarray:
+        """Awaitable encode through the micro-batching executor."""
+        return await self.executor.encode(texts)
+
+    @traced("embedding.find_relevant")
+    async def find_relevant(self, keyword: str, articles: list[dict], top_k: int = 5):
         """
         Pure semantic TOP-K ranking.
         No thresholds. No keyword hacks.
@@ -18,25 +80,204 @@ class SemanticEngine:
         if not articles:
             return []
 
-        # Combine title + summary for embeddings
-        docs = [
-            f"{a.get('title', '')} {a.get('summary', '')}".strip()
-            for a in articles
-        ]
-
         try:
-            kw_emb = self.model.encode(keyword, convert_to_tensor=True)
-            doc_emb = self.model.encode(docs, convert_to_tensor=True)
+            # Only new/changed articles are embedded; the rest come from disk.
+            # Keyword + documents are submitted together so they share a batch.
+            todo = self.store.pending(articles)
+            kw_rows, doc_rows = await asyncio.gather(
+                self.encode([keyword]),
+                self.encode([doc_text(a) for a in todo]),
+            )
+            if todo:
+                await asyncio.to_thread(self.store.put, todo, doc_rows)
+            doc_emb = await asyncio.to_thread(self.store.vectors_for, articles)
+            kw_emb = kw_rows[0]
         except Exception as e:
             print("Embedding error:", e)
             return articles[:top_k]
 
-        # Compute similarity
-        scores = util.cos_sim(kw_emb, doc_emb)[0]
+        # Cosine similarity (vectors are normalised)
+        scores = doc_emb @ kw_emb
 
-        # Rank docs by score
-        ranked = list(zip(articles, scores))
-        ranked.sort(key=lambda x: float(x[1]), reverse=True)
+        # Rank docs by score (partial sort: only the top-k are ordered)
+        order = top_indices(scores, top_k)
 
         # Return TOP-K relevant articles
-        return [a for a, _ in ranked[:top_k]]
+        return [articles[i] for i in order]
+
+    @traced("embedding.find_relevant_stream")
+    async def find_relevant_stream(self, keyword: str, pages, top_k: int = 5):
+        """
+        Same ranking as find_relevant(), but consumes an async iterator of
+        article pages and only ever keeps one page + the running TOP-K in
+        memory.
+        """
+        best_articles: list[dict] = []
+        best_scores = np.empty(0, dtype=np.float32)
+        newest: list[dict] = []   # fallback if embedding fails
+
+        # Only embedding failures degrade to the newest articles; errors
+        # from the paging itself (DB, HTTP) propagate to the caller.
+        try:
+            kw_emb = (await self.encode([keyword]))[0]
+        except Exception as e:
+            print("Embedding error:", e)
+            kw_emb = None
+
+        async for page in pages:
+            if len(newest) < top_k:
+                newest.extend(page[:top_k - len(newest)])
+            if kw_emb is None:
+                if len(newest) >= top_k:
+                    break
+                continue
+
+            try:
+                scores = await self._score_page(kw_emb, page)
+            except Exception as e:
+                print("Embedding error:", e)
+                return best_articles or newest
+
+            # Merge this page into the running TOP-K
+            cand_scores = np.concatenate([best_scores, scores])
+            cand = best_articles + page
+            keep = top_indices(cand_scores, top_k)
+            best_articles = [cand[i] for i in keep]
+            best_scores = cand_scores[keep]
+
+        if kw_emb is None:
+            return newest
+        return best_articles
+
+    @traced("embedding.find_relevant_multi")
+    async def find_relevant_multi_stream(self, kw_emb: np.ndarray, pages, top_k: int = 5):
+        """
+        TOP-K for several keywords in one pass over the article pages.
+        `kw_emb` is the (k, dim) matrix of normalised keyword vectors;
+        returns one article list per keyword row.
+        """
+        k = len(kw_emb)
+        best_articles: list[list[dict]] = [[] for _ in range(k)]
+        best_scores = [np.empty(0, dtype=np.float32) for _ in range(k)]
+
+        async for page in pages:
+            if not page:
+                continue
+            doc_emb = await self.embed_articles(page)
+            scores = doc_emb @ kw_emb.T          # (page, k)
+
+            for j in range(k):
+                cand_scores = np.concatenate([best_scores[j], scores[:, j]])
+                cand = best_articles[j] + page
+                keep = top_indices(cand_scores, top_k)
+                best_articles[j] = [cand[i] for i in keep]
+                best_scores[j] = cand_scores[keep]
+
+        return best_articles
+
+    @traced("embedding.embed_articles")
+    async def embed_articles(self, articles: list[dict]) -> np.ndarray:
+        """(n, dim) vectors for `articles`, embedding only the ones not cached yet."""
+        todo = self.store.pending(articles)
+        if todo:
+            rows = await self.encode([doc_text(a) for a in todo])
+            await asyncio.to_thread(self.store.put, todo, rows)
+        return await asyncio.to_thread(self.store.vectors_for, articles)
+
+    async def _score_page(self, kw_emb: np.ndarray, articles: list[dict]) -> np.ndarray:
+        doc_emb = await self.embed_articles(articles)
+        return doc_emb @ kw_emb
+
+    # ------------------------------------------------------------
+    # Store search (no table scan per query)
+    # ------------------------------------------------------------
+    @traced("embedding.sync_store")
+    async def sync_store(self, pages) -> int:
+        """
+        Embed whatever in `pages` the store doesn't have yet and advance
+        `synced_until` to the newest created_at seen. Returns rows read.
+        """
+        if self._sync_lock is None:
+            self._sync_lock = asyncio.Lock()
+        count = 0
+        async with self._sync_lock:
+            async for page in pages:
+                todo = self.store.pending(page)
+                if todo:
+                    rows = await self.encode([doc_text(a) for a in todo])
+                    await asyncio.to_thread(self.store.put, todo, rows)
+                newest = max((a.get("created_at") or "" for a in page), default="")
+                if newest and (self.synced_until is None or newest > self.synced_until):
+                    self.synced_until = newest
+                count += len(page)
+        return count
+
+    async def ensure_index(self):
+        """Build the IVF index once the store is large enough; rebuild after 4x growth."""
+        size = len(self.store)
+        index = self.store.index
+        if size < settings.ann_min_vectors:
+            return
+        if index is not None and size <= 4 * max(self.store.indexed_count, 1):
+            return
+        if self._index_lock is None:
+            self._index_lock = asyncio.Lock()
+        async with self._index_lock:
+            if self.store.index is not index:
+                return   # built meanwhile
+            with span("embedding.build_index"):
+                await asyncio.to_thread(
+                    self.store.build_index,
+                    nlist=settings.ann_nlist,
+                    nprobe=settings.ann_nprobe,
+                    dtype=settings.ann_vector_dtype,
+                    rerank_factor=settings.ann_rerank_factor,
+                )
+
+    @traced("embedding.sync_topics")
+    async def sync_topics(self, pages) -> int:
+        """
+        Assign the articles in `pages` not assigned yet (pages start at
+        `topics.sync_start()`, so they overlap the last sync) to topics,
+        embedding only what the store lacks, then advance `synced_until`.
+        Returns the number of articles assigned.
+        """
+        if self._topics_lock is None:
+            self._topics_lock = asyncio.Lock()
+        assigned = 0
+        async with self._topics_lock:
+            newest = None
+            async for page in pages:
+                fresh = [a for a in page if not self.topics.is_assigned(article_key(a))]
+                if fresh:
+                    vectors = await self.embed_articles(fresh)
+                    # Re-checked against the saved state: other processes sync too
+                    assigned += await asyncio.to_thread(self.topics.merge, fresh, vectors)
+                page_newest = max((a.get("created_at") or "" for a in page), default="")
+                if page_newest and (newest is None or page_newest > newest):
+                    newest = page_newest
+            await asyncio.to_thread(self.topics.advance, newest)
+        return assigned
+
+    @traced("embedding.search_store")
+    async def search_store(self, keyword: str, top_k: int) -> list[tuple[str, float]]:
+        """[(article key, score)] nearest to `keyword` among stored vectors."""
+        kw_emb = (await self.encode([keyword]))[0]
+        await self.ensure_index()
+        return await asyncio.to_thread(self.store.search, kw_emb, top_k)
+
+
+_engine = None
+
+
+def get_semantic_engine() -> SemanticEngine:
+    """Return the process-wide SemanticEngine (the model itself loads lazily)."""
+    global _engine
+    if _engine is None:
+        _engine = SemanticEngine()
+    return _engine
+
+
+def peek_semantic_engine():
+    """The engine if it was already created, without creating it."""
+    return _engine
@@ -0,0 +1,118 @@
+# app/services/storage_backend.py
+
+"""
+StorageBackend
+--------------
+Interface behind SupabaseClient. Two implementations:
+
+- postgrest  → Supabase REST API over pooled HTTP (default)
+- asyncpg    → direct Postgres connection pool, COPY-based bulk ingest
+
+Selected with STORAGE_BACKEND in Settings; the backend is process-wide
+and started / closed by the FastAPI lifespan.
+
+Query strings and filters use PostgREST syntax (e.g. "id=eq.10") for
+both backends, so callers don't care which one is active.
+"""
+
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Optional
+
+from app.config import settings
+
+
+class StorageBackend(ABC):
+    name = "base"
+    # Driver errors meaning "database unreachable" (HTTP errors are known already)
+    retryable_errors: tuple = ()
+
+    # ------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    # ------------------------------------------------------------
+    # Operations
+    # ------------------------------------------------------------
+    @abstractmethod
+    async def insert(self, table: str, data: dict):
+        ...
+
+    @abstractmethod
+    async def insert_many(
+        self,
+        table: str,
+        rows: list[dict],
+        on_conflict: str = "url",
+        chunk_size: int = None,
+        retries: int = None,
+    ) -> list[dict]:
+        ...
+
+    @abstractmethod
+    async def fetch_all(self, table: str):
+        ...
+
+    @abstractmethod
+    async def fetch_page(
+        self,
+        table: str,
+        columns: str = "*",
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        filters: Optional[dict] = None,
+    ) -> list[dict]:
+        ...
+
+    @abstractmethod
+    def iter_pages(
+        self,
+        table: str,
+        columns: str = "id,url,title,summary,created_at",
+        page_size: int = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> AsyncIterator[list[dict]]:
+        ...
+
+    @abstractmethod
+    async def rpc(self, function: str, params: dict):
+        ...
+
+    @abstractmethod
+    async def fetch_by_query(self, table: str, query: str):
+        ...
+
+    @abstractmethod
+    async def fetch_one(self, table: str, filters: dict):
+        ...
+
+    @abstractmethod
+    async def update(self, table: str, query: str, data: dict):
+        ...
+
+    @abstractmethod
+    async def delete(self, table: str, query: str):
+        ...
+
+
+_backend: Optional[StorageBackend] = None
+
+
+def get_storage_backend() -> StorageBackend:
+    """Process-wide backend chosen by settings.storage_backend."""
+    global _backend
+    if _backend is None:
+        if settings.storage_backend == "asyncpg":
+            from app.services.asyncpg_backend import AsyncpgBackend
+            _backend = AsyncpgBackend()
+        elif settings.storage_backend == "postgrest":
+            from app.services.postgrest_backend import PostgrestBackend
+            _backend = PostgrestBackend()
+        else:
+            raise RuntimeError(f"Unknown STORAGE_BACKEND: {settings.storage_backend!r}")
+    return _backend
@@ -1,126 +1,121 @@
 # app/services/supabase_client.py
 
-import httpx
-from app.config import settings
+from typing import AsyncIterator, Optional
+
+from app.services.storage_backend import StorageBackend, get_storage_backend
+from app.services.tracing import traced
+from app.services.upstream_policy import get_upstream_policy
 
 
 class SupabaseClient:
-    """Simple wrapper around Supabase REST API."""
+    """
+    Database access used by the services.
 
-    def __init__(self):
-        # REST endpoint
-        self.base_url = f"{settings.supabase_url}/rest/v1"
+    Every call is delegated to the configured StorageBackend
+    (PostgREST over HTTP by default, or asyncpg — see STORAGE_BACKEND)
+    through the "supabase" UpstreamPolicy: reads get adaptive timeouts,
+    hedging and retries, writes only the circuit breaker.
+    """
 
-        # Required headers
-        self.headers = {
-            "apikey": settings.supabase_key,
-            "Authorization": f"Bearer {settings.supabase_key}",
-            "Content-Type": "application/json",
-            "Prefer": "return=representation,resolution=ignore-duplicates"   # 👈 this ensures Supabase returns JSON
-        }
+    def __init__(self, backend: Optional[StorageBackend] = None):
+        self.backend = backend or get_storage_backend()
+        self.policy = get_upstream_policy("supabase", retryable=self.backend.retryable_errors)
 
     # ----------------------------------------------------
-    # INSERT ROW
+    # INSERT
     # ----------------------------------------------------
+    @traced("supabase.insert")
     async def insert(self, table: str, data: dict):
         """Insert one row into a table."""
-        url = f"{self.base_url}/{table}"
-
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.post(url, json=data, headers=self.headers)
-
-        try:
-            if response.status_code == 409:  # Conflict (duplicate)
-                return {"status": "duplicate", "url": data.get("url")}
-            response.raise_for_status()
-
-        except Exception:
-            print("INSERT ERROR:", response.status_code, response.text)
-            raise
-
-        # Safely parse JSON (sometimes Supabase returns empty bodies)
-        try:
-            return response.json()
-        except Exception:
-            return {"status": response.status_code, "message": response.text}
+        return await self.policy.call(lambda: self.backend.insert(table, data), idempotent=False)
+
+    @traced("supabase.insert_many")
+    async def insert_many(
+        self,
+        table: str,
+        rows: list[dict],
+        on_conflict: str = "url",
+        chunk_size: int = None,
+        retries: int = None,
+    ) -> list[dict]:
+        """
+        Insert many rows, skipping rows whose `on_conflict` column already exists.
+        Returns one {"url", "status": inserted|duplicate|error, "row"} per input row.
+        """
+        # Chunks are retried by the backend itself, which reports failures as
+        # "error" statuses; a batch where every row failed counts against the breaker
+        async with self.policy.guard() as guarded:
+            statuses = await self.backend.insert_many(
+                table, rows, on_conflict=on_conflict, chunk_size=chunk_size, retries=retries
+            )
+            if statuses and all(st["status"] == "error" for st in statuses):
+                guarded.fail()
+        return statuses
 
     # ----------------------------------------------------
-    # FETCH ALL
+    # READ
     # ----------------------------------------------------
+    @traced("supabase.fetch_all")
     async def fetch_all(self, table: str):
         """Fetch all rows."""
-        url = f"{self.base_url}/{table}?select=*"
-
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.get(url, headers=self.headers)
+        return await self.policy.call(lambda: self.backend.fetch_all(table), op="fetch_all")
+
+    @traced("supabase.fetch_page")
+    async def fetch_page(
+        self,
+        table: str,
+        columns: str = "*",
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        filters: Optional[dict] = None,
+    ) -> list[dict]:
+        return await self.policy.call(
+            lambda: self.backend.fetch_page(table, columns=columns, order=order, limit=limit, filters=filters),
+            op="fetch_page",
+        )
+
+    @traced("supabase.iter_pages")
+    async def iter_pages(
+        self,
+        table: str,
+        columns: str = "id,url,title,summary,created_at",
+        page_size: int = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> AsyncIterator[list[dict]]:
+        """Keyset-paginated pages ordered by (created_at, id) descending."""
+        # A half-read generator can't be retried; breaker only
+        async with self.policy.guard():
+            async for page in self.backend.iter_pages(
+                table, columns=columns, page_size=page_size, since=since, until=until
+            ):
+                yield page
+
+    @traced("supabase.rpc")
+    async def rpc(self, function: str, params: dict, read_only: bool = False):
+        """Call a Postgres function; read_only=True allows hedging / retries."""
+        return await self.policy.call(
+            lambda: self.backend.rpc(function, params), op=f"rpc.{function}", idempotent=read_only
+        )
 
-        response.raise_for_status()
-        return response.json()
-
-    # ----------------------------------------------------
-    # FETCH WITH QUERY
     # Example: query="url=eq.https://site.com"
-    # ----------------------------------------------------
+    @traced("supabase.fetch_by_query")
     async def fetch_by_query(self, table: str, query: str):
-        url = f"{self.base_url}/{table}?{query}&select=*"
-
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.get(url, headers=self.headers)
+        return await self.policy.call(lambda: self.backend.fetch_by_query(table, query), op="fetch_by_query")
 
-        response.raise_for_status()
-        return response.json()
-    
-        # ----------------------------------------------------
-    # FETCH ONE ROW BY COLUMN MATCH
     # Example: fetch_one("articles", {"url": "https://example.com"})
-    # ----------------------------------------------------
+    @traced("supabase.fetch_one")
     async def fetch_one(self, table: str, filters: dict):
-        """
-        Fetch a single row matching the given filters.
-        filters = {"url": "..."}  → converted to: url=eq.<value>
-        """
-        query_parts = []
-
-        for col, value in filters.items():
-            query_parts.append(f"{col}=eq.{value}")
-
-        query = "&".join(query_parts)
-
-        url = f"{self.base_url}/{table}?{query}&select=*"
-
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.get(url, headers=self.headers)
-
-        response.raise_for_status()
-        data = response.json()
-
-        if isinstance(data, list) and len(data) > 0:
-            return data[0]
-
-        return None
-
+        return await self.policy.call(lambda: self.backend.fetch_one(table, filters), op="fetch_one")
 
     # ----------------------------------------------------
-    # UPDATE ROWS
+    # UPDATE / DELETE
     # query example: "id=eq.10"
     # ----------------------------------------------------
+    @traced("supabase.update")
     async def update(self, table: str, query: str, data: dict):
-        url = f"{self.base_url}/{table}?{query}"
-
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.patch(url, json=data, headers=self.headers)
+        return await self.policy.call(lambda: self.backend.update(table, query, data), idempotent=False)
 
-        response.raise_for_status()
-        return response.json()
-
-    # ----------------------------------------------------
-    # DELETE ROWS
-    # ----------------------------------------------------
+    @traced("supabase.delete")
     async def delete(self, table: str, query: str):
-        url = f"{self.base_url}/{table}?{query}"
-
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.delete(url, headers=self.headers)
-
-        response.raise_for_status()
-        return {"deleted": True}
+        return await self.policy.call(lambda: self.backend.delete(table, query), idempotent=False)
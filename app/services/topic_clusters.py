@@ -0,0 +1,351 @@
+# app/services/topic_clusters.py
+
+"""
+TopicClusters
+-------------
+Incremental topic clustering of article embeddings, so keyword-less
+/ideas can start from what is trending instead of the latest N rows.
+
+- Streaming assignment: a new article joins the topic with the most
+  similar centroid if the cosine is at least TOPIC_SIMILARITY_THRESHOLD,
+  else it opens a new topic. Centroids move towards their articles
+  (running mean, as in mini-batch k-means, with a floor on the step so
+  long-lived topics can drift). Beyond TOPIC_MAX_TOPICS the coldest
+  topic is recycled.
+- Heat: every article adds 1, decaying with TOPIC_HALF_LIFE_HOURS from
+  its created_at. It is kept as log(Σ exp((t - EPOCH) / tau)), which
+  doesn't depend on "now", so the trending order only changes on
+  assignment and trending() is a lookup of a precomputed ranking.
+- Each topic keeps its newest TOPIC_REPRESENTATIVES articles
+  (created_at, key, title), used as the prompt context.
+
+State lives next to the embedding store (<dir>/topics.npz, tagged with
+the model like the store) and is advanced by SemanticEngine.sync_topics()
+on ingest and on the scheduler tick; readers pick up a newer file with
+refresh(). Processes sharing the directory write under <dir>/topics.lock,
+reloading the file first (merge(), advance()), so no one's assignments
+are overwritten. `synced_until` is the newest created_at already assigned.
+created_at is set when a transaction starts, so a row can commit after
+newer ones were synced: each sync re-reads TOPIC_SYNC_OVERLAP_SECONDS
+before `synced_until` and skips the keys already assigned in that window.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.embedding_store import FileLock, article_key
+from app.services.model_registry import model_registry
+
+TOPICS_FILE = "topics.npz"
+LOCK_FILE = "topics.lock"
+EPOCH = 1_700_000_000.0     # reference time for the log-heat
+MIN_LEARNING_RATE = 0.02    # centroid step floor for large topics
+
+
+def parse_time(value) -> float:
+    """created_at (ISO string / datetime / None) → epoch seconds."""
+    if not value:
+        return time.time()
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        try:
+            dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return time.time()
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class TopicClusters:
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        model_tag: Optional[str] = None,
+        threshold: float = 0.5,
+        max_topics: int = 500,
+        half_life_hours: float = 12.0,
+        representatives: int = 5,
+        sync_overlap: float = 300.0,
+    ):
+        self.directory = directory
+        self.model_tag = model_tag
+        self.threshold = threshold
+        self.max_topics = max_topics
+        self.tau = half_life_hours * 3600 / math.log(2)
+        self.representatives = representatives
+        self.sync_overlap = sync_overlap
+        self._mtime: Optional[int] = None   # of the topics file last loaded / saved
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(os.path.join(directory, LOCK_FILE) if directory else None)
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.centroids: Optional[np.ndarray] = None   # (max_topics, dim), rows [:n] in use
+        self.n = 0
+        self.sizes = np.zeros(self.max_topics, dtype=np.int64)
+        self.log_heat = np.full(self.max_topics, -np.inf)
+        self.last_seen = np.zeros(self.max_topics)
+        self.reps: list[list] = [[] for _ in range(self.max_topics)]   # [[ts, key, title], ...] newest first
+        self.ids = np.zeros(self.max_topics, dtype=np.int64)   # stable topic id per slot
+        self.next_id = 0
+        self.synced_until: Optional[str] = None
+        self.recent: dict[str, float] = {}   # key -> created_at of assigned articles in the overlap window
+        self.assigned = 0
+        self._order: list[int] = []
+
+    def __len__(self) -> int:
+        return self.n
+
+    # ------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------
+    @property
+    def _path(self) -> Optional[str]:
+        return os.path.join(self.directory, TOPICS_FILE) if self.directory else None
+
+    def _load(self):
+        path = self._path
+        if not path or not os.path.exists(path):
+            return
+        try:
+            self._mtime = os.stat(path).st_mtime_ns
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                if self.model_tag and meta.get("model") != self.model_tag:
+                    print(f"Topics were built with {meta.get('model')}, now {self.model_tag}; starting over")
+                    return
+                n = min(int(meta["n"]), self.max_topics)
+                dim = data["centroids"].shape[1]
+                self.centroids = np.zeros((self.max_topics, dim), dtype=np.float32)
+                self.centroids[:n] = data["centroids"][:n]
+                self.sizes[:n] = data["sizes"][:n]
+                self.log_heat[:n] = data["log_heat"][:n]
+                self.last_seen[:n] = data["last_seen"][:n]
+                self.ids[:n] = data["ids"][:n]
+            self.n = n
+            self.reps[:n] = meta["reps"][:n]
+            self.next_id = meta["next_id"]
+            self.synced_until = meta["synced_until"]
+            self.recent = dict(meta.get("recent", []))
+            self.assigned = meta["assigned"]
+            self._rank()
+        except Exception as e:
+            # Only derived state: rebuilt from the recent articles
+            print("Topic clusters load error:", type(e), str(e))
+            self._reset()
+
+    def save(self):
+        path = self._path
+        if not path or self.centroids is None:
+            return
+        with self._lock:
+            n = self.n
+            meta = {
+                "model": self.model_tag,
+                "n": n,
+                "reps": self.reps[:n],
+                "next_id": self.next_id,
+                "synced_until": self.synced_until,
+                "recent": list(self.recent.items()),
+                "assigned": self.assigned,
+            }
+            arrays = {
+                "centroids": self.centroids[:n].copy(),
+                "sizes": self.sizes[:n].copy(),
+                "log_heat": self.log_heat[:n].copy(),
+                "last_seen": self.last_seen[:n].copy(),
+                "ids": self.ids[:n].copy(),
+            }
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, path)
+        self._mtime = os.stat(path).st_mtime_ns
+
+    def refresh(self) -> bool:
+        """Reload the topics file if another process saved a newer one."""
+        path = self._path
+        try:
+            mtime = os.stat(path).st_mtime_ns if path else None
+        except OSError:
+            return False
+        if mtime is None or mtime == self._mtime:
+            return False
+        with self._lock:
+            self._reset()
+            self._load()
+        return True
+
+    def clear(self):
+        with self._file_lock:
+            with self._lock:
+                self._reset()
+            if self._path and os.path.exists(self._path):
+                os.remove(self._path)
+
+    # ------------------------------------------------------------
+    # Assignment
+    # ------------------------------------------------------------
+    def _open_slot(self) -> int:
+        if self.n < self.max_topics:
+            self.n += 1
+            return self.n - 1
+        # Full: recycle the coldest topic
+        slot = int(np.argmin(self.log_heat[:self.n]))
+        self.sizes[slot] = 0
+        self.log_heat[slot] = -np.inf
+        self.last_seen[slot] = 0.0
+        self.reps[slot] = []
+        return slot
+
+    def _add_rep(self, slot: int, ts: float, key: str, title: str):
+        reps = [r for r in self.reps[slot] if r[1] != key]
+        reps.append([ts, key, title[:200]])
+        reps.sort(key=lambda r: r[0], reverse=True)
+        self.reps[slot] = reps[:self.representatives]
+
+    def merge(self, articles: list[dict], vectors: np.ndarray) -> int:
+        """
+        assign() the articles no process has assigned yet, on top of the
+        latest saved state, and persist. Returns the number assigned.
+        """
+        with self._file_lock:
+            self.refresh()
+            fresh = [i for i, a in enumerate(articles) if not self.is_assigned(article_key(a))]
+            if fresh:
+                self.assign([articles[i] for i in fresh], np.asarray(vectors)[fresh])
+                self.save()
+        return len(fresh)
+
+    def assign(self, articles: list[dict], vectors: np.ndarray) -> list[int]:
+        """Assign each article (with its L2-normalised vector) to a topic; returns topic ids."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        out = []
+        with self._lock:
+            if self.centroids is None and len(vectors):
+                self.centroids = np.zeros((self.max_topics, vectors.shape[1]), dtype=np.float32)
+
+            for article, vec in zip(articles, vectors):
+                ts = parse_time(article.get("created_at"))
+                best, sim = -1, -1.0
+                if self.n:
+                    sims = self.centroids[:self.n] @ vec
+                    best = int(np.argmax(sims))
+                    sim = float(sims[best])
+
+                if sim >= self.threshold:
+                    slot = best
+                    self.sizes[slot] += 1
+                    lr = max(1.0 / self.sizes[slot], MIN_LEARNING_RATE)
+                    c = (1 - lr) * self.centroids[slot] + lr * vec
+                    self.centroids[slot] = c / max(np.linalg.norm(c), 1e-12)
+                else:
+                    slot = self._open_slot()
+                    self.centroids[slot] = vec
+                    self.sizes[slot] = 1
+                    self.ids[slot] = self.next_id
+                    self.next_id += 1
+
+                self.log_heat[slot] = np.logaddexp(self.log_heat[slot], (ts - EPOCH) / self.tau)
+                self.last_seen[slot] = max(self.last_seen[slot], ts)
+                key = article_key(article)
+                self._add_rep(slot, ts, key, article.get("title") or "")
+                self.recent[key] = ts
+                self.assigned += 1
+                out.append(int(self.ids[slot]))
+
+            self._rank()
+        return out
+
+    def _rank(self):
+        # log_heat differs from the decayed heat by the same constant for
+        # every topic, so this order holds until the next assignment
+        self._order = np.argsort(-self.log_heat[:self.n], kind="stable").tolist()
+
+    def is_assigned(self, key: str) -> bool:
+        """Whether `key` was assigned within the overlap window (re-read by every sync)."""
+        return key in self.recent
+
+    def sync_start(self) -> Optional[str]:
+        """created_at the next sync reads from: `synced_until` minus the overlap."""
+        if self.synced_until is None:
+            return None
+        start = parse_time(self.synced_until) - self.sync_overlap
+        return datetime.fromtimestamp(start, timezone.utc).isoformat()
+
+    def advance(self, newest: Optional[str]):
+        """Mark everything up to `newest` (created_at) as assigned, and persist."""
+        with self._file_lock:
+            self.refresh()
+            self._advance(newest)
+            self.save()
+
+    def _advance(self, newest: Optional[str]):
+        with self._lock:
+            if newest and (self.synced_until is None or newest > self.synced_until):
+                self.synced_until = newest
+            if self.synced_until is not None:
+                # Keys older than the overlap are never read again
+                cutoff = parse_time(self.synced_until) - self.sync_overlap
+                self.recent = {k: ts for k, ts in self.recent.items() if ts >= cutoff}
+
+    # ------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------
+    def heat(self, slot: int, now: Optional[float] = None) -> float:
+        """Articles in the topic, each weighted 0.5 ** (age / half-life)."""
+        now = now or time.time()
+        return float(math.exp(self.log_heat[slot] - (now - EPOCH) / self.tau))
+
+    def trending(self, k: int) -> list[dict]:
+        """The k hottest topics with their newest articles; no per-call clustering."""
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "topic": int(self.ids[slot]),
+                    "heat": round(self.heat(slot, now), 3),
+                    "size": int(self.sizes[slot]),
+                    "last_seen": datetime.fromtimestamp(self.last_seen[slot], timezone.utc).isoformat(),
+                    "articles": [{"key": key, "title": title} for _, key, title in self.reps[slot]],
+                }
+                for slot in self._order[:k]
+            ]
+
+    def stats(self) -> dict:
+        return {
+            "topics": self.n,
+            "assigned": self.assigned,
+            "synced_until": self.synced_until,
+            "threshold": self.threshold,
+        }
+
+
+_topics: Optional[TopicClusters] = None
+
+
+def get_topic_clusters() -> TopicClusters:
+    global _topics
+    if _topics is None:
+        _topics = TopicClusters(
+            settings.embedding_store_dir,
+            model_tag=model_registry.tag,
+            threshold=settings.topic_similarity_threshold,
+            max_topics=settings.topic_max_topics,
+            half_life_hours=settings.topic_half_life_hours,
+            representatives=settings.topic_representatives,
+            sync_overlap=settings.topic_sync_overlap_seconds,
+        )
+    return _topics
@@ -0,0 +1,179 @@
+# app/services/tracing.py
+
+"""
+Tracing
+-------
+Per-stage timing for the pipeline.
+
+- span("gemini.generate") / @traced("gemini.generate") time one stage:
+  latency histogram, in-flight gauge and an error counter labelled by
+  upstream (the part of the stage name before the first dot).
+- Async generators (streams, keyset pages) are timed only while the
+  generator itself runs, not while the caller processes what it yielded.
+- RequestMetricsMiddleware records per-route request metrics and, when
+  enabled, a Server-Timing header summing each stage of that request
+  (e.g. `gemini.generate;dur=812.4;desc="x2"`), viewable in browser
+  devtools or with `curl -i`.
+"""
+
+import contextvars
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from app.config import settings
+from app.services.metrics import metrics
+
+stage_seconds = metrics.histogram(
+    "stage_duration_seconds", "Time spent in one pipeline stage / upstream call.", ["stage"]
+)
+stage_in_flight = metrics.gauge("stage_in_flight", "Stage calls currently running.", ["stage"])
+upstream_errors = metrics.counter(
+    "upstream_errors_total", "Failed stage calls by upstream and error type.", ["upstream", "stage", "error"]
+)
+
+http_seconds = metrics.histogram(
+    "http_request_duration_seconds", "Request latency by route (streamed bodies included).", ["method", "route"]
+)
+http_requests = metrics.counter("http_requests_total", "Requests by route and status.", ["method", "route", "status"])
+http_in_flight = metrics.gauge("http_requests_in_flight", "Requests currently being handled.")
+
+
+class RequestTimings:
+    """Stage durations of one request, for Server-Timing."""
+
+    def __init__(self):
+        self.stages: dict[str, list] = {}   # stage -> [seconds, calls]
+        self.closed = False
+
+    def add(self, stage: str, seconds: float):
+        # Long-lived tasks (e.g. the embedding worker) may inherit the
+        # context of the request that started them; ignore them afterwards
+        if self.closed:
+            return
+        entry = self.stages.setdefault(stage, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    def header(self) -> str:
+        parts = []
+        for stage, (seconds, calls) in self.stages.items():
+            part = f"{stage};dur={seconds * 1000:.1f}"
+            if calls > 1:
+                part += f';desc="x{calls}"'
+            parts.append(part)
+        return ", ".join(parts)
+
+
+_timings: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("request_timings", default=None)
+
+
+def record(stage: str, seconds: float, error: Optional[BaseException] = None):
+    stage_seconds.observe(seconds, stage=stage)
+    if error is not None:
+        upstream_errors.inc(upstream=stage.split(".", 1)[0], stage=stage, error=type(error).__name__)
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    stage_in_flight.inc(stage=stage)
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:   # cancellation is not an upstream failure
+        error = e
+        raise
+    finally:
+        stage_in_flight.dec(stage=stage)
+        record(stage, time.perf_counter() - started, error)
+
+
+def traced(stage: str):
+    """Decorator form of span() for coroutine and async-generator functions."""
+
+    def decorate(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def gen_wrapper(*args, **kwargs):
+                agen = fn(*args, **kwargs)
+                spent, error = 0.0, None
+                stage_in_flight.inc(stage=stage)
+                try:
+                    while True:
+                        started = time.perf_counter()
+                        try:
+                            item = await agen.__anext__()
+                        except StopAsyncIteration:
+                            spent += time.perf_counter() - started
+                            break
+                        except Exception as e:
+                            spent += time.perf_counter() - started
+                            error = e
+                            raise
+                        spent += time.perf_counter() - started
+                        yield item
+                finally:
+                    await agen.aclose()
+                    stage_in_flight.dec(stage=stage)
+                    record(stage, spent, error)
+            return gen_wrapper
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(stage):
+                return await fn(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+# ------------------------------------------------------------
+# Request middleware (pure ASGI so streamed bodies are timed fully)
+# ------------------------------------------------------------
+class RequestMetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _route(scope) -> str:
+        # Route template, not the raw path, to keep label cardinality bounded
+        route = scope.get("route")
+        return getattr(route, "path", None) or "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        want_timing = settings.server_timing_enabled or headers.get(b"x-server-timing") == b"1"
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if want_timing:
+                    total = f"total;dur={(time.perf_counter() - started) * 1000:.1f}"
+                    value = ", ".join(filter(None, [timings.header(), total]))
+                    message["headers"] = list(message.get("headers") or []) + [(b"server-timing", value.encode("latin-1"))]
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec()
+            timings.closed = True
+            _timings.reset(token)
+            route = self._route(scope)
+            http_seconds.observe(time.perf_counter() - started, method=scope["method"], route=route)
+            http_requests.inc(method=scope["method"], route=route, status=status)
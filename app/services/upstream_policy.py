@@ -0,0 +1,468 @@
+# app/services/upstream_policy.py
+
+"""
+UpstreamPolicy
+--------------
+How GeminiClient, Scraper and SupabaseClient call their upstream:
+
+- Adaptive timeouts: each operation keeps a window of recent latencies;
+  an attempt gets p99 × UPSTREAM_TIMEOUT_MULTIPLIER, clamped between
+  UPSTREAM_MIN_TIMEOUT and the upstream's configured timeout (which is
+  also used until enough samples exist). A timed-out attempt is recorded
+  at its timeout, so the window grows back if the upstream got slower.
+- Hedging (idempotent calls, upstreams in UPSTREAM_HEDGE_UPSTREAMS): if
+  an attempt is still running after the operation's p95, a duplicate is
+  sent and the first good answer wins; hedges are capped by a budget.
+- Retries on upstream failures (timeouts, connection errors, 5xx, 408,
+  429) with full-jitter exponential backoff, capped by a retry budget
+  (a share of calls) so retries can't multiply load during an outage.
+  A call never takes longer than the configured timeout overall.
+- Circuit breaker: when the failure ratio of the last attempts is too
+  high the upstream is "open" and calls fail fast with
+  UpstreamUnavailable; after a cooldown one probe is let through.
+
+Non-idempotent calls (writes) only go through the breaker. Upstreams
+with a rate limit take a QuotaScheduler token per attempt, and a
+Retry-After on a 429 / 503 pauses that scheduler and delays the retry.
+State and counters are exported in /stats and /metrics.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+
+from app.config import settings
+from app.services.metrics import metrics
+from app.services.quota import QuotaExceeded, QuotaScheduler, get_quota
+
+T = TypeVar("T")
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+upstream_retries = metrics.counter("upstream_retries_total", "Attempts repeated after an upstream failure.", ["upstream"])
+upstream_hedges = metrics.counter(
+    "upstream_hedges_total", "Duplicate attempts sent after the p95 delay, by which one answered.", ["upstream", "winner"]
+)
+upstream_timeouts = metrics.counter("upstream_timeouts_total", "Attempts cut off by the adaptive timeout.", ["upstream"])
+upstream_rejected = metrics.counter("upstream_rejected_total", "Calls failed fast by an open circuit.", ["upstream"])
+upstream_circuit = metrics.gauge("upstream_circuit_state", "0 closed, 1 half-open, 2 open.", ["upstream"])
+
+
+class UpstreamUnavailable(Exception):
+    """Raised without calling the upstream while its circuit is open."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} is unavailable (circuit open), retry in {retry_after:.0f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+# Shed without calling the upstream; callers let these through so the API
+# answers 503 + Retry-After instead of an empty result
+REJECTED = (UpstreamUnavailable, QuotaExceeded)
+
+
+def is_upstream_failure(error: BaseException, extra: tuple = ()) -> bool:
+    """Errors that say the upstream is unhealthy (and worth retrying)."""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status >= 500 or status in (408, 429)
+    return isinstance(error, (asyncio.TimeoutError, httpx.TransportError) + tuple(extra))
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds from a Retry-After header (delta or HTTP date), if the upstream sent one."""
+    if not isinstance(error, httpx.HTTPStatusError):
+        return None
+    value = error.response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class _Budget:
+    """Token bucket refilled by calls: each call earns `ratio` tokens, each use costs one."""
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+
+    def deposit(self):
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def spend(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class _Latency:
+    """Recent latencies of one operation, with cached percentiles."""
+
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)
+        self._sorted: Optional[list] = None
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self._sorted = None
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self.samples) < settings.upstream_min_samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self.samples)
+        return self._sorted[min(len(self._sorted) - 1, int(q * len(self._sorted)))]
+
+
+class _Breaker:
+    def __init__(self, window: int, min_calls: int, failure_ratio: float, cooldown: float):
+        self.outcomes = deque(maxlen=window)   # True = failure
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.opened = 0
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == OPEN and self.retry_after() <= 0:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record(self, failed: bool):
+        if self.state == HALF_OPEN:
+            self.probing = False
+            if failed:
+                self._open()
+            else:
+                self.state = CLOSED
+                self.outcomes.clear()
+            return
+        self.outcomes.append(failed)
+        if (
+            self.state == CLOSED
+            and len(self.outcomes) >= self.min_calls
+            and sum(self.outcomes) / len(self.outcomes) >= self.failure_ratio
+        ):
+            self._open()
+
+    def release(self):
+        """A probe that ended without an outcome (cancelled) frees the slot."""
+        if self.state == HALF_OPEN:
+            self.probing = False
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.opened += 1
+        self.outcomes.clear()
+
+
+class _Guarded:
+    """Handle yielded by UpstreamPolicy.guard()."""
+
+    def __init__(self):
+        self.failed = False
+
+    def fail(self):
+        self.failed = True
+
+
+class UpstreamPolicy:
+    def __init__(
+        self,
+        name: str,
+        max_timeout: float,
+        hedge: bool = False,
+        retryable: tuple = (),
+        limiter: Optional[QuotaScheduler] = None,
+    ):
+        self.name = name
+        self.max_timeout = max_timeout
+        self.hedge = hedge
+        self.retryable = retryable
+        self.limiter = limiter
+
+        self._latency: dict[str, _Latency] = {}
+        self._retry_budget = _Budget(settings.upstream_retry_budget, settings.upstream_retry_burst)
+        self._hedge_budget = _Budget(settings.upstream_hedge_budget, settings.upstream_hedge_burst)
+        self.breaker = _Breaker(
+            window=settings.breaker_window,
+            min_calls=settings.breaker_min_calls,
+            failure_ratio=settings.breaker_failure_ratio,
+            cooldown=settings.breaker_cooldown,
+        )
+        self.calls = 0
+        upstream_circuit.set(0, upstream=name)
+
+    # ------------------------------------------------------------
+    # Per-operation timing
+    # ------------------------------------------------------------
+    def _ops(self, op: str) -> _Latency:
+        latency = self._latency.get(op)
+        if latency is None:
+            latency = self._latency[op] = _Latency(settings.upstream_latency_window)
+        return latency
+
+    def timeout(self, op: str) -> float:
+        if not settings.upstream_adaptive_timeouts:
+            return self.max_timeout
+        p = self._ops(op).percentile(settings.upstream_timeout_percentile)
+        if p is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(settings.upstream_min_timeout, p * settings.upstream_timeout_multiplier))
+
+    def hedge_delay(self, op: str) -> Optional[float]:
+        if not self.hedge or self.breaker.state != CLOSED:
+            return None
+        return self._ops(op).percentile(settings.upstream_hedge_percentile)
+
+    # ------------------------------------------------------------
+    # Breaker bookkeeping
+    # ------------------------------------------------------------
+    def _admit(self):
+        if not self.breaker.allow():
+            upstream_rejected.inc(upstream=self.name)
+            raise UpstreamUnavailable(self.name, self.breaker.retry_after())
+        self.calls += 1
+        self._sync_state()
+
+    async def _acquire(self):
+        if self.limiter is None:
+            return
+        try:
+            await self.limiter.acquire()
+        except BaseException:
+            self.breaker.release()
+            raise
+
+    def _outcome(self, error: Optional[BaseException]):
+        # Rate limiting is a quota problem, not an unhealthy upstream
+        throttled = isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429
+        self.breaker.record(error is not None and not throttled and is_upstream_failure(error, self.retryable))
+        self._sync_state()
+        delay = retry_after(error) if error is not None else None
+        if delay is not None and self.limiter is not None:
+            self.limiter.pause(delay)
+
+    def _sync_state(self):
+        upstream_circuit.set(_STATE_VALUES[self.breaker.state], upstream=self.name)
+
+    # ------------------------------------------------------------
+    # Calls
+    # ------------------------------------------------------------
+    async def call(self, fn: Callable[[], Awaitable[T]], op: str = "call", idempotent: bool = True) -> T:
+        """
+        Run `fn()` (a fresh attempt per invocation) under the policy.
+        Only idempotent calls get adaptive timeouts, hedges and retries.
+        """
+        if not idempotent:
+            async with self.guard():
+                return await fn()
+
+        self._retry_budget.deposit()
+        self._hedge_budget.deposit()
+        latency = self._ops(op)
+        loop = asyncio.get_running_loop()
+        deadline = None
+        last_error: Optional[BaseException] = None
+
+        attempt = 0
+        while True:
+            if attempt == 0:
+                self._admit()
+            elif not self.breaker.allow():
+                raise last_error
+            await self._acquire()
+            # Queueing for the first token doesn't count against the timeout
+            if deadline is None:
+                deadline = loop.time() + self.max_timeout
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self.breaker.release()
+                # e.g. a *_TIMEOUT of 0: no attempt was ever made
+                raise last_error or asyncio.TimeoutError(f"{self.name} {op}: no time left for an attempt")
+            timeout = min(self.timeout(op), remaining)
+            try:
+                result = await self._attempt(fn, op, latency, timeout)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                self._outcome(e)
+                if isinstance(e, asyncio.TimeoutError):
+                    upstream_timeouts.inc(upstream=self.name)
+                    latency.add(timeout)
+                if not is_upstream_failure(e, self.retryable):
+                    raise
+                last_error = e
+            else:
+                self._outcome(None)
+                return result
+
+            attempt += 1
+            backoff = random.uniform(0, settings.upstream_retry_base_delay * 2 ** attempt)
+            told = retry_after(last_error)
+            if told is not None:
+                backoff = max(backoff, told)
+            if (
+                attempt > settings.upstream_max_retries
+                or deadline - loop.time() - backoff < settings.upstream_min_timeout
+                # Retry-After retries are already paced by the upstream (and our rate limiter)
+                or (told is None and not self._retry_budget.spend())
+            ):
+                raise last_error
+            upstream_retries.inc(upstream=self.name)
+            await asyncio.sleep(backoff)
+
+    async def _attempt(self, fn, op: str, latency: _Latency, timeout: float):
+        """One attempt, plus a hedged duplicate if it outlives the p95."""
+        loop = asyncio.get_running_loop()
+        delay = self.hedge_delay(op)
+
+        async def timed():
+            started = loop.time()
+            result = await fn()
+            latency.add(loop.time() - started)
+            return result
+
+        if delay is None or delay >= timeout:
+            return await asyncio.wait_for(timed(), timeout)
+
+        started = loop.time()
+        primary = asyncio.ensure_future(timed())
+        tasks = {primary}
+        hedged = False
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self._can_hedge():
+                tasks.add(asyncio.ensure_future(timed()))
+                hedged = True
+
+            error = None
+            while tasks:
+                remaining = started + timeout - loop.time()
+                done, tasks = await asyncio.wait(tasks, timeout=max(remaining, 0), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    if task.exception() is None:
+                        if hedged:
+                            upstream_hedges.inc(upstream=self.name, winner="primary" if task is primary else "hedge")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _can_hedge(self) -> bool:
+        # A hedge never queues for a rate-limit token
+        if self._hedge_budget.tokens < 1:
+            return False
+        if self.limiter is not None and not self.limiter.try_acquire():
+            return False
+        return self._hedge_budget.spend()
+
+    @asynccontextmanager
+    async def guard(self):
+        """
+        Breaker (and rate limit) only, for writes and streams that can't be
+        repeated. Yields a _Guarded; call its fail() when the upstream
+        reported a failure without raising (e.g. per-row error statuses).
+        """
+        self._admit()
+        await self._acquire()
+        guarded = _Guarded()
+        try:
+            yield guarded
+        except Exception as e:
+            self._outcome(e)
+            raise
+        except BaseException:
+            # cancelled, or a stream closed early by its consumer
+            self.breaker.release()
+            raise
+        else:
+            if guarded.failed:
+                self.breaker.record(True)
+                self._sync_state()
+            else:
+                self._outcome(None)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "times_opened": self.breaker.opened,
+            "retry_after": round(self.breaker.retry_after(), 1) if self.breaker.state == OPEN else 0,
+            "calls": self.calls,
+            "retry_tokens": round(self._retry_budget.tokens, 2),
+            "hedge_tokens": round(self._hedge_budget.tokens, 2) if self.hedge else None,
+            "rate_limit": self.limiter.stats() if self.limiter is not None else None,
+            "ops": {
+                op: {
+                    "samples": len(latency.samples),
+                    "p50": latency.percentile(0.5),
+                    "p95": latency.percentile(settings.upstream_hedge_percentile),
+                    "timeout": self.timeout(op),
+                }
+                for op, latency in self._latency.items()
+            },
+        }
+
+
+# ------------------------------------------------------------
+# One policy per upstream
+# ------------------------------------------------------------
+_policies: dict[str, UpstreamPolicy] = {}
+
+
+def get_upstream_policy(name: str, retryable: tuple = ()) -> UpstreamPolicy:
+    policy = _policies.get(name)
+    if policy is None:
+        timeouts = {
+            "gemini": settings.gemini_timeout,
+            "serpapi": settings.serpapi_timeout,
+            "supabase": settings.supabase_timeout,
+        }
+        hedged = {u.strip() for u in settings.upstream_hedge_upstreams.split(",") if u.strip()}
+        quota = get_quota(name)
+        policy = _policies[name] = UpstreamPolicy(
+            name,
+            max_timeout=timeouts.get(name, settings.http_default_timeout),
+            hedge=name in hedged,
+            retryable=retryable,
+            limiter=quota if quota.limited else None,
+        )
+    return policy
+
+
+def upstream_policies() -> dict[str, UpstreamPolicy]:
+    return dict(_policies)
@@ -0,0 +1,167 @@
+# benchmarks/bench_embedding_backends.py
+
+"""
+Compare embedding backends (torch fp32, onnx, onnx-int8) on speed and
+ranking quality.
+
+    python -m benchmarks.bench_embedding_backends --docs 2000 --out backends.json
+    python -m benchmarks.bench_embedding_backends --corpus articles.jsonl --top-k 10
+    python -m benchmarks.bench_embedding_backends --from-db --docs 5000
+
+Each backend runs in its own process (so peak RSS is per backend) and
+encodes the same corpus and queries. Reported per backend:
+- docs_per_sec / query_ms: encode throughput and single-query latency;
+- load_seconds, peak_rss_mb;
+- top-k overlap vs the first backend (torch fp32 by default): mean
+  |top-k ∩ reference top-k| / k over all queries, plus the mean cosine
+  between each document's vector and its reference vector.
+
+The corpus is --corpus (JSONL with title/summary), --from-db (the
+`articles` table) or, by default, synthetic news-like articles. Real
+articles give the more meaningful overlap numbers.
+"""
+
+import argparse
+import asyncio
+import json
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+from app.config import settings
+from benchmarks.common import run_metadata, write_results
+
+QUERIES = [
+    "cyclone landfall evacuation", "election results", "stock market crash", "monsoon rainfall forecast",
+    "cricket world cup", "ai startup funding", "satellite launch", "union budget tax",
+    "heatwave power outage", "supreme court ruling", "vaccine rollout", "metro railway expansion",
+]
+
+
+def _load_corpus(args) -> list[dict]:
+    if args.corpus:
+        with open(args.corpus, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()][:args.docs]
+    if args.from_db:
+        from app.services.supabase_client import SupabaseClient
+
+        async def fetch():
+            rows = []
+            async for page in SupabaseClient().iter_pages("articles", columns="id,url,title,summary"):
+                rows.extend(page)
+                if len(rows) >= args.docs:
+                    break
+            return rows[:args.docs]
+
+        return asyncio.run(fetch())
+
+    from benchmarks.bench_ranking import make_articles
+    return make_articles(args.docs, seed=args.seed)
+
+
+def _run_backend(backend: str, texts: list[str], queries: list[str], batch_size: int) -> dict:
+    """Child process: load one backend, encode everything, report timings + vectors."""
+    from app.services.model_registry import ModelRegistry
+
+    registry = ModelRegistry(settings.embedding_model_name, backend=backend, onnx_file=settings.embedding_onnx_file)
+    registry.warmup()
+    model = registry.get()
+
+    encode = lambda batch: model.encode(
+        batch, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True
+    ).astype(np.float32)
+
+    started = time.perf_counter()
+    docs = encode(texts)
+    docs_s = time.perf_counter() - started
+
+    samples = []
+    query_vecs = []
+    for q in queries:
+        t0 = time.perf_counter()
+        query_vecs.append(encode([q])[0])
+        samples.append(time.perf_counter() - t0)
+
+    return {
+        "backend": backend,
+        "active_backend": registry.active_backend,
+        "load_seconds": registry.load_seconds,
+        "encode_seconds": docs_s,
+        "docs_per_sec": len(texts) / docs_s if docs_s else None,
+        "query_ms": float(np.median(samples) * 1000),
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "docs": docs,
+        "queries": np.stack(query_vecs),
+    }
+
+
+def _top_k(docs: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ docs.T
+    return np.argsort(-scores, axis=1, kind="stable")[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8", help="first one is the reference")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--corpus", help="JSONL file with title/summary per line")
+    parser.add_argument("--from-db", action="store_true", help="sample the `articles` table")
+    parser.add_argument("--queries", help="file with one query per line (default: built-in topics)")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=settings.embedding_max_batch_size)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    from app.services.embedding_store import doc_text
+
+    texts = [doc_text(a) for a in _load_corpus(args)]
+    if not texts:
+        sys.exit("empty corpus")
+    queries = QUERIES
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    k = min(args.top_k, len(texts))
+
+    runs = []
+    for backend in (b.strip() for b in args.backends.split(",")):
+        print(f"... {backend}", file=sys.stderr)
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            try:
+                runs.append(pool.submit(_run_backend, backend, texts, queries, args.batch_size).result())
+            except Exception as e:
+                runs.append({"backend": backend, "error": f"{type(e).__name__}: {e}"})
+
+    reference = next((r for r in runs if "docs" in r), None)
+    results = {"docs": len(texts), "queries": len(queries), "top_k": k, "backends": {}}
+    if reference is not None:
+        results["reference"] = reference["backend"]
+        ref_docs = reference["docs"]
+        ref_top = _top_k(ref_docs, reference["queries"], k)
+
+    for run in runs:
+        docs, query_vecs = run.pop("docs", None), run.pop("queries", None)
+        if docs is not None:
+            top = _top_k(docs, query_vecs, k)
+            overlap = [len(set(a) & set(b)) / k for a, b in zip(top, ref_top)]
+            run["top_k_overlap"] = float(np.mean(overlap))
+            run["top_k_overlap_min"] = float(np.min(overlap))
+            run["doc_cosine_vs_reference"] = float(np.mean(np.sum(docs * ref_docs, axis=1)))
+        results["backends"][run["backend"]] = run
+
+    params = {key: v for key, v in vars(args).items() if key not in ("out", "baseline")}
+    write_results(
+        {"meta": run_metadata(params), **results}, args.out, args.baseline,
+        keys=("docs_per_sec", "query_ms", "load_seconds", "peak_rss_mb", "top_k_overlap"),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# benchmarks/bench_ranking.py
+
+"""
+Micro-benchmarks for ranking and prompt-context building.
+
+    python -m benchmarks.bench_ranking --sizes 1000,10000,100000 --out ranking.json
+    python -m benchmarks.bench_ranking --sizes 1000 --real-model --baseline ranking.json
+
+For each corpus size this times:
+- SemanticEngine.find_relevant, cold (every article embedded) and warm
+  (vectors already in the EmbeddingStore);
+- IdeaGenerator.build_context over the whole corpus (near-duplicate
+  collapse + in-order packing);
+- ContextPacker.pack with MMR over the top context_candidates;
+- EmbeddingStore.search, exact scan vs the IVF index (with its recall
+  against the exact top-k).
+
+Articles are synthetic (with some syndicated near-copies). By default a
+deterministic hashing encoder stands in for the SentenceTransformer so
+the numbers isolate our own code; --real-model uses the configured model.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.services.context_packer import ContextPacker, token_cache
+from app.services.embedding_store import EmbeddingStore
+from app.services.idea_generator import IdeaGenerator
+from app.services.model_registry import model_registry
+from app.services.semantic_engine import SemanticEngine
+from benchmarks.common import run_metadata, summarize, write_results
+
+VOCAB = (
+    "cyclone monsoon rainfall coast warning evacuation election vote poll party minister budget "
+    "tax market stock index rupee bank inflation cricket match series wicket captain startup "
+    "funding launch satellite mission rocket orbit court ruling policy health hospital vaccine "
+    "school exam results traffic metro railway airport flight power grid outage heatwave river"
+).split()
+
+
+class HashingEncoder:
+    """Bag-of-words feature hashing; same interface as SentenceTransformer.encode."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=True, **kwargs):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=4).digest(), "little")
+                out[row, h % self.dim] += 1.0 if h & 1 else -1.0
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out
+
+
+class FakeRegistry:
+    """Hands out the hashing encoder; reports not-loaded so ContextPacker estimates tokens."""
+
+    is_loaded = False
+
+    def __init__(self):
+        self.model = HashingEncoder()
+
+    def get(self):
+        return self.model
+
+
+def make_articles(n: int, seed: int = 0, dup_rate: float = 0.1) -> list[dict]:
+    rng = random.Random(seed)
+    articles = []
+    for i in range(n):
+        if articles and rng.random() < dup_rate:
+            # Syndicated copy: same story, different outlet/URL, small edits
+            src = rng.choice(articles[-50:])
+            articles.append({
+                "url": f"https://mirror{i % 7}.example/{i}",
+                "title": src["title"],
+                "summary": src["summary"] + " " + rng.choice(VOCAB),
+                "snippet": src["snippet"],
+            })
+            continue
+        words = rng.choices(VOCAB, k=80)
+        articles.append({
+            "url": f"https://news.example/{i}",
+            "title": " ".join(words[:8]).capitalize(),
+            "summary": " ".join(words[8:]),
+            "snippet": " ".join(words[8:30]),
+        })
+    return articles
+
+
+def _timed(fn, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples)
+
+
+async def bench_size(n: int, args, registry) -> dict:
+    articles = make_articles(n, seed=args.seed)
+    result = {"articles": n}
+
+    with tempfile.TemporaryDirectory(prefix="bench-store-") as directory:
+        engine = SemanticEngine(registry=registry, store=EmbeddingStore(directory))
+        try:
+            # Cold: nothing embedded yet
+            t0 = time.perf_counter()
+            top = await engine.find_relevant(args.keyword, articles, top_k=settings.context_candidates)
+            cold = time.perf_counter() - t0
+            result["find_relevant_cold"] = {"seconds": cold, "docs_per_sec": n / cold if cold else None}
+
+            # Warm: vectors served from the store, only the keyword is encoded
+            samples = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                top = await engine.find_relevant(args.keyword, articles, top_k=settings.context_candidates)
+                samples.append(time.perf_counter() - t0)
+            result["find_relevant_warm"] = summarize(samples)
+
+            generator = IdeaGenerator()
+            generator.semantic = engine
+            generator.packer = ContextPacker(registry=registry)
+
+            # build_context: dedup collapse + in-order packing over the corpus
+            token_cache.clear()
+            result["build_context"] = _timed(lambda: generator.build_context(articles), args.repeat)
+            result["build_context"]["context_tokens"] = generator.context_stats["tokens"]
+
+            # MMR packing of the ranked candidates (the /ideas?keyword= path)
+            doc_emb = await engine.embed_articles(top)
+            query_emb = (await engine.encode([args.keyword]))[0]
+            result["pack_mmr"] = _timed(
+                lambda: generator.packer.pack(top, doc_emb, query_emb), args.repeat
+            )
+
+            # Store search: exact scan, then the IVF index
+            store, k = engine.store, settings.context_candidates
+            exact = {key for key, _ in store.search(query_emb, k)}
+            result["store_search_exact"] = _timed(lambda: store.search(query_emb, k), args.repeat)
+            t0 = time.perf_counter()
+            store.build_index(
+                nlist=settings.ann_nlist, nprobe=settings.ann_nprobe,
+                dtype=settings.ann_vector_dtype, rerank_factor=settings.ann_rerank_factor,
+            )
+            result["build_index"] = {"seconds": time.perf_counter() - t0, **store.index.stats()}
+            result["store_search_ivf"] = _timed(lambda: store.search(query_emb, k), args.repeat)
+            found = {key for key, _ in store.search(query_emb, k)}
+            result["store_search_ivf"]["recall"] = len(found & exact) / max(len(exact), 1)
+        finally:
+            await engine.executor.close()
+
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs of the warm benchmarks")
+    parser.add_argument("--keyword", default="cyclone warning coast evacuation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--real-model", action="store_true", help="use the configured model and EMBEDDING_BACKEND")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    if args.real_model:
+        registry = model_registry   # EMBEDDING_BACKEND applies
+        registry.warmup()
+    else:
+        registry = FakeRegistry()
+
+    results = {}
+    for n in (int(s) for s in args.sizes.split(",")):
+        results[str(n)] = await bench_size(n, args, registry)
+
+    params = {k: v for k, v in vars(args).items() if k not in ("out", "baseline")}
+    write_results({"meta": run_metadata(params), **results}, args.out, args.baseline)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
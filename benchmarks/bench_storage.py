@@ -0,0 +1,118 @@
+# benchmarks/bench_storage.py
+
+"""
+Compare the storage backends on bulk insert and recent-article reads.
+
+    python -m benchmarks.bench_storage --rows 2000 --reads 200
+    python -m benchmarks.bench_storage --backends asyncpg --out storage.json
+
+Needs SUPABASE_URL/SUPABASE_KEY for "postgrest" and DATABASE_URL for
+"asyncpg". Rows are written to `articles` under https://bench.invalid/
+and deleted afterwards.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from app.services.http_clients import http_clients
+from app.services.supabase_client import SupabaseClient
+from benchmarks.common import summarize
+
+BENCH_PREFIX = "https://bench.invalid/"
+
+
+def _make_backend(name: str):
+    if name == "asyncpg":
+        from app.services.asyncpg_backend import AsyncpgBackend
+        return AsyncpgBackend()
+    from app.services.postgrest_backend import PostgrestBackend
+    return PostgrestBackend()
+
+
+async def bench_backend(name: str, rows: int, reads: int, chunk_size: int) -> dict:
+    backend = _make_backend(name)
+    await backend.start()
+    db = SupabaseClient(backend=backend)
+    run_id = uuid.uuid4().hex[:8]
+
+    data = [
+        {
+            "url": f"{BENCH_PREFIX}{run_id}/{i}",
+            "title": f"Benchmark article {i}",
+            "summary": "Lorem ipsum dolor sit amet. " * 20,
+            "snippet": "Lorem ipsum",
+        }
+        for i in range(rows)
+    ]
+
+    try:
+        # Bulk insert
+        started = time.perf_counter()
+        statuses = await db.insert_many("articles", data, chunk_size=chunk_size)
+        insert_s = time.perf_counter() - started
+        inserted = sum(1 for s in statuses if s["status"] == "inserted")
+
+        # Recent-article reads (the /articles path)
+        samples = []
+        for _ in range(reads):
+            t0 = time.perf_counter()
+            await db.fetch_page(
+                "articles", columns="id,url,title,summary,snippet,created_at",
+                order="created_at.desc", limit=20,
+            )
+            samples.append(time.perf_counter() - t0)
+
+        # Full keyset scan (the ranking path)
+        t0 = time.perf_counter()
+        scanned = 0
+        async for page in db.iter_pages("articles"):
+            scanned += len(page)
+        scan_s = time.perf_counter() - t0
+
+        return {
+            "backend": name,
+            "insert": {
+                "rows": rows,
+                "inserted": inserted,
+                "seconds": insert_s,
+                "rows_per_sec": rows / insert_s if insert_s else None,
+            },
+            "recent_reads": summarize(samples),
+            "scan": {"rows": scanned, "seconds": scan_s},
+        }
+    finally:
+        await db.delete("articles", f"url=like.{BENCH_PREFIX}{run_id}/*")
+        await backend.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", default="postgrest,asyncpg")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--reads", type=int, default=100)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.backends.split(","):
+        name = name.strip()
+        try:
+            results.append(await bench_backend(name, args.rows, args.reads, args.chunk_size))
+        except Exception as e:
+            results.append({"backend": name, "error": f"{type(e).__name__}: {e}"})
+
+    await http_clients.aclose()
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
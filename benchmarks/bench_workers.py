@@ -0,0 +1,174 @@
+# benchmarks/bench_workers.py
+
+"""
+Compare memory, startup time and throughput of N workers that each load
+the embedding model (`uvicorn --workers N`) with N workers forked after
+the master loaded it once (`python -m app.serve --workers N`).
+
+    python -m benchmarks.bench_workers --workers 4 --concurrency 16 --requests 400 --out workers.json
+    python -m benchmarks.bench_workers --workers 2 --modes prefork --app-env EMBEDDING_BACKEND=onnx-int8
+
+Both run against benchmarks.fake_upstreams with the load_test options
+(default scenario: `ideas`, which embeds the query and the new rows).
+Reported per mode:
+- startup_seconds: until every worker answered /ready;
+- memory after startup and after the load: summed RSS (counts shared
+  pages once per process), PSS (shared pages split between the processes
+  sharing them, i.e. the real footprint) and USS (private pages);
+- the load_test results (rps, p50/p95/p99).
+Memory is read from /proc/<pid>/smaps_rollup (Linux only).
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.common import run_metadata, write_results
+from benchmarks.load_test import (
+    _app_env, _fake_args, _free_port, _wait_until, add_load_arguments, check_scenarios, drive,
+)
+
+MODES = {
+    "per-worker": lambda port, workers: [
+        sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning",
+    ],
+    "prefork": lambda port, workers: [
+        sys.executable, "-m", "app.serve", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning",
+    ],
+}
+
+
+def _process_tree(root: int) -> list[int]:
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; ppid follows the closing paren
+                parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    tree, frontier = [root], [root]
+    while frontier:
+        children = [pid for pid, ppid in parents.items() if ppid in frontier]
+        tree += children
+        frontier = children
+    return tree
+
+
+def tree_memory(root: int) -> dict:
+    """Summed RSS / PSS / USS (MB) of `root` and its descendants."""
+    totals = {"rss_mb": 0.0, "pss_mb": 0.0, "uss_mb": 0.0}
+    processes = 0
+    for pid in _process_tree(root):
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                fields = {line.split(":")[0]: int(line.split()[1]) for line in f if line.endswith("kB\n")}
+        except OSError:
+            continue
+        processes += 1
+        totals["rss_mb"] += fields.get("Rss", 0) / 1024
+        totals["pss_mb"] += fields.get("Pss", 0) / 1024
+        totals["uss_mb"] += (fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024
+    return {"processes": processes, **{k: round(v, 1) for k, v in totals.items()}}
+
+
+def _wait_for_workers(base_url: str, workers: int, timeout: float, proc: subprocess.Popen) -> int:
+    """Poll /ready on fresh connections until `workers` distinct pids answered 200."""
+    seen = set()
+    deadline = time.monotonic() + timeout
+    limits = httpx.Limits(max_keepalive_connections=0)
+    with httpx.Client(base_url=base_url, limits=limits, timeout=5) as client:
+        while len(seen) < workers and time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{proc.args[2]} exited with code {proc.returncode}")
+            try:
+                response = client.get("/ready")
+                if response.status_code == 200:
+                    seen.add(response.json().get("pid"))
+                    continue
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+    return len(seen)
+
+
+def run_mode(mode: str, args, fake_base: str, workdir: str) -> dict:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = _app_env(args, fake_base, os.path.join(workdir, mode))
+    started = time.perf_counter()
+    app = subprocess.Popen(MODES[mode](port, args.workers), env=env)
+    try:
+        _wait_until(f"{base_url}/", args.startup_timeout, app)
+        ready = _wait_for_workers(base_url, args.workers, args.startup_timeout, app)
+        result = {
+            "startup_seconds": time.perf_counter() - started,
+            "workers_ready": ready,
+            "memory_idle": tree_memory(app.pid),
+        }
+        result["load"] = asyncio.run(drive(base_url, args))
+        result["memory_loaded"] = tree_memory(app.pid)
+        return result
+    finally:
+        app.terminate()
+        try:
+            app.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            app.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--modes", default=",".join(MODES))
+    add_load_arguments(parser)
+    parser.set_defaults(scenarios="ideas")
+    args = parser.parse_args()
+    check_scenarios(parser, args)
+    unknown = set(args.modes.split(",")) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+
+    fake_port = _free_port()
+    fake_base = f"http://127.0.0.1:{fake_port}"
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        fake = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(fake_port)] + _fake_args(args)
+        )
+        try:
+            _wait_until(f"{fake_base}/health", 30, fake)
+            for mode in args.modes.split(","):
+                print(f"... {mode} × {args.workers}", file=sys.stderr)
+                results[mode] = run_mode(mode, args, fake_base, workdir)
+        finally:
+            fake.terminate()
+            try:
+                fake.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                fake.kill()
+
+    if "per-worker" in results and "prefork" in results:
+        before, after = results["per-worker"]["memory_loaded"], results["prefork"]["memory_loaded"]
+        results["prefork_vs_per_worker"] = {
+            "pss_saved_mb": round(before["pss_mb"] - after["pss_mb"], 1),
+            "pss_ratio": round(after["pss_mb"] / before["pss_mb"], 3) if before["pss_mb"] else None,
+        }
+
+    params = {k: v for k, v in vars(args).items() if k not in ("out", "baseline")}
+    write_results({"meta": run_metadata(params), **results}, args.out, args.baseline,
+                  keys=("seconds", "rps", "p50_ms", "p95_ms", "p99_ms", "startup_seconds", "pss_mb", "uss_mb"))
+
+
+if __name__ == "__main__":
+    main()
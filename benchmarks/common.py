@@ -0,0 +1,86 @@
+# benchmarks/common.py
+
+"""
+Helpers shared by the benchmark scripts: latency summaries, run
+metadata, JSON output and comparison against a saved baseline.
+"""
+
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Optional
+
+
+def summarize(samples: list[float]) -> dict:
+    """Latency summary (seconds in, milliseconds out)."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.mean(samples) * 1000,
+        "p50_ms": pick(0.50) * 1000,
+        "p95_ms": pick(0.95) * 1000,
+        "p99_ms": pick(0.99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def run_metadata(params: dict) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": params,
+    }
+
+
+def _flatten(data, prefix: str = "") -> dict:
+    """{"a": {"p50_ms": 1}} → {"a.p50_ms": 1} (numbers only)."""
+    flat = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            flat.update(_flatten(value, f"{prefix}{key}."))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        flat[prefix[:-1]] = data
+    return flat
+
+
+TIMING_KEYS = ("p50_ms", "p95_ms", "p99_ms", "seconds", "rps")
+
+
+def compare(results: dict, baseline: dict, keys=TIMING_KEYS) -> list[str]:
+    """Lines describing % change of the `keys` metrics present in both runs."""
+    new, old = _flatten(results), _flatten(baseline)
+    lines = []
+    for name in sorted(new):
+        if name.startswith("meta.") or name.rsplit(".", 1)[-1] not in keys or name not in old:
+            continue
+        before, after = old[name], new[name]
+        if before:
+            lines.append(f"{name:60s} {before:12.2f} → {after:12.2f}  ({(after - before) / before:+.1%})")
+    return lines
+
+
+def write_results(results: dict, out: Optional[str], baseline: Optional[str], keys=TIMING_KEYS):
+    text = json.dumps(results, indent=2)
+    print(text)
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(text)
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            lines = compare(results, json.load(f), keys)
+        print(f"\nvs baseline {baseline}:")
+        print("\n".join(lines) or "(no comparable metrics)")
@@ -0,0 +1,387 @@
+# benchmarks/fake_upstreams.py
+
+"""
+Local stand-ins for the paid upstreams, so the pipeline can be load
+tested offline. One server emulates:
+
+    POST /gemini/v1beta/models/<model>:generateContent         (+ JSON schema output)
+    POST /gemini/v1beta/models/<model>:streamGenerateContent   (SSE)
+    GET  /serpapi/search.json                                  (google_news shape)
+    *    /supabase/rest/v1/articles, /supabase/rest/v1/rpc/*   (in-memory PostgREST subset)
+    GET  /news/<slug>/<n>                                      (article HTML for full-text fetch)
+
+Each upstream has its own latency model (mean, jitter, distribution),
+error rate (errors are 503s) and optional rate limit (429 + Retry-After
+above N requests per second):
+
+    python -m benchmarks.fake_upstreams --port 8900 --gemini-latency 800 --gemini-jitter 300 \\
+        --serpapi-latency 400 --error-rate 0.01
+
+Point the app at it with
+    GEMINI_API_URL=http://127.0.0.1:8900/gemini/v1beta/models
+    SERPAPI_BASE_URL=http://127.0.0.1:8900/serpapi/search.json
+    SUPABASE_URL=http://127.0.0.1:8900/supabase
+(benchmarks.load_test does this for you).
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+
+UPSTREAMS = ("gemini", "serpapi", "supabase", "pages")
+
+_WORDS = (
+    "government market storm election court energy football vaccine startup climate "
+    "border festival budget satellite river protest monsoon airline research summit"
+).split()
+
+
+class LatencyModel:
+    """Per-request delay + error injection for one upstream."""
+
+    def __init__(
+        self,
+        mean_ms: float,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        dist: str = "normal",
+        rate_limit: float = 0.0,
+    ):
+        self.mean = mean_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.dist = dist
+        self.rate_limit = rate_limit
+        self._window = (0, 0)   # (second, requests in it)
+
+    def delay(self) -> float:
+        if self.mean <= 0:
+            return 0.0
+        if self.dist == "uniform":
+            return max(0.0, random.uniform(self.mean - self.jitter, self.mean + self.jitter))
+        if self.dist == "lognormal" and self.jitter > 0:
+            # long right tail with the given mean / stddev
+            sigma2 = math.log(1 + (self.jitter / self.mean) ** 2)
+            mu = math.log(self.mean) - sigma2 / 2
+            return random.lognormvariate(mu, math.sqrt(sigma2))
+        return max(0.0, random.gauss(self.mean, self.jitter))
+
+    def fails(self) -> bool:
+        return random.random() < self.error_rate
+
+    def throttled(self) -> Optional[int]:
+        """Seconds to put in Retry-After if this request is over the rate limit."""
+        if self.rate_limit <= 0:
+            return None
+        now = time.time()
+        second, count = self._window
+        if int(now) != second:
+            second, count = int(now), 0
+        self._window = (second, count + 1)
+        if count >= self.rate_limit:
+            return max(1, math.ceil(second + 1 - now))
+        return None
+
+    def describe(self) -> dict:
+        return {
+            "mean_ms": self.mean * 1000,
+            "jitter_ms": self.jitter * 1000,
+            "error_rate": self.error_rate,
+            "dist": self.dist,
+            "rate_limit": self.rate_limit,
+        }
+
+
+def _unavailable() -> JSONResponse:
+    return JSONResponse({"error": "injected failure"}, status_code=503)
+
+
+# ------------------------------------------------------------
+# Gemini
+# ------------------------------------------------------------
+def _prompt_text(body: dict) -> str:
+    try:
+        return body["contents"][0]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        return ""
+
+
+def _gemini_answer(body: dict) -> str:
+    prompt = _prompt_text(body)
+    config = body.get("generationConfig") or {}
+    rng = random.Random(prompt)
+
+    schema = config.get("responseSchema")
+    if schema:
+        keywords = (
+            schema.get("items", {}).get("properties", {}).get("keyword", {}).get("enum") or ["topic"]
+        )
+        return json.dumps([
+            {"keyword": kw, "ideas": [f"{kw}: {' '.join(rng.sample(_WORDS, 4))}" for _ in range(5)]}
+            for kw in keywords
+        ])
+
+    if prompt.startswith("Expand"):
+        seed = re.findall(r"User keywords: \[(.*)\]", prompt)
+        base = (seed[0].replace("'", "").split(",")[0].strip() if seed else "news") or "news"
+        return ", ".join(f"{base} {w}" for w in rng.sample(_WORDS, 10))
+
+    return "\n".join(f"- {' '.join(rng.sample(_WORDS, 6)).capitalize()}" for _ in range(5))
+
+
+def _gemini_envelope(text: str) -> dict:
+    return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+
+
+# ------------------------------------------------------------
+# PostgREST (articles table, just what the app uses)
+# ------------------------------------------------------------
+class FakeTable:
+    def __init__(self, seed_rows: int = 0):
+        self.rows: list[dict] = []
+        self.by_url: dict[str, dict] = {}
+        self.next_id = 1
+        self._lock = threading.Lock()
+        base = datetime.now(timezone.utc) - timedelta(days=1)
+        for i in range(seed_rows):
+            words = random.Random(i).sample(_WORDS, 8)
+            self.insert({
+                "url": f"https://news.fake/seed/{i}",
+                "title": " ".join(words[:4]).capitalize(),
+                "summary": " ".join(words) + ". " + " ".join(reversed(words)) + ".",
+                "snippet": " ".join(words[:6]),
+            }, created_at=base + timedelta(seconds=i))
+
+    def insert(self, row: dict, created_at: Optional[datetime] = None) -> Optional[dict]:
+        with self._lock:
+            if row.get("url") in self.by_url:
+                return None
+            stored = {
+                **row,
+                "id": self.next_id,
+                "created_at": (created_at or datetime.now(timezone.utc)).isoformat(),
+            }
+            self.next_id += 1
+            self.rows.append(stored)
+            self.by_url[stored["url"]] = stored
+            return stored
+
+    def select(self, params) -> list[dict]:
+        rows = self.rows
+        if "url" in params and params["url"].startswith("eq."):
+            row = self.by_url.get(params["url"][3:])
+            rows = [row] if row else []
+        elif "url" in params and params["url"].startswith("in."):
+            wanted = [re.sub(r"\\(.)", r"\1", u) for u in re.findall(r'"((?:[^"\\]|\\.)*)"', params["url"])]
+            rows = [self.by_url[u] for u in wanted if u in self.by_url]
+
+        logic = params.get("and", "")
+        since = re.search(r'created_at\.gte\."([^"]+)"', logic)
+        cursor = re.search(r"id\.lt\.(\d+)", logic)
+        if since:
+            rows = [r for r in rows if r["created_at"] >= since.group(1)]
+        if cursor:
+            rows = [r for r in rows if r["id"] < int(cursor.group(1))]
+
+        # ids grow with created_at, so id order is the keyset order
+        if params.get("order", "").startswith(("created_at.desc", "id.desc")):
+            rows = sorted(rows, key=lambda r: r["id"], reverse=True)
+        if "limit" in params:
+            rows = rows[: int(params["limit"])]
+
+        columns = params.get("select", "*")
+        if columns != "*":
+            wanted = [c.strip() for c in columns.split(",")]
+            rows = [{c: r.get(c) for c in wanted} for r in rows]
+        return rows
+
+    def delete_like(self, pattern: str) -> int:
+        prefix = pattern.rstrip("*")
+        with self._lock:
+            keep = [r for r in self.rows if not r["url"].startswith(prefix)]
+            removed = len(self.rows) - len(keep)
+            self.rows = keep
+            self.by_url = {r["url"]: r for r in keep}
+        return removed
+
+
+# ------------------------------------------------------------
+# App
+# ------------------------------------------------------------
+def build_app(models: dict, seed_rows: int = 0, results_per_search: int = 10) -> FastAPI:
+    app = FastAPI(title="Fake upstreams")
+    table = FakeTable(seed_rows)
+    counters = {name: {"requests": 0, "errors": 0, "throttled": 0} for name in UPSTREAMS}
+
+    async def gate(name: str) -> Optional[Response]:
+        """Sleep per the latency model; the error response if this request should fail."""
+        counters[name]["requests"] += 1
+        model = models[name]
+        retry_after = model.throttled()
+        if retry_after is not None:
+            counters[name]["throttled"] += 1
+            return JSONResponse(
+                {"error": "rate limited"}, status_code=429, headers={"Retry-After": str(retry_after)}
+            )
+        await asyncio.sleep(model.delay())
+        if model.fails():
+            counters[name]["errors"] += 1
+            return _unavailable()
+        return None
+
+    @app.get("/health")
+    async def health():
+        return {
+            "ok": True,
+            "rows": len(table.rows),
+            "counters": counters,
+            "models": {name: m.describe() for name, m in models.items()},
+        }
+
+    # ---- Gemini ----
+    @app.post("/gemini/v1beta/models/{call}")
+    async def gemini(call: str, request: Request):
+        body = await request.json()
+        error = await gate("gemini")
+        if error:
+            return error
+
+        text = _gemini_answer(body)
+        if call.endswith(":streamGenerateContent"):
+            pieces = [text[i:i + 40] for i in range(0, len(text), 40)] or [""]
+            step = models["gemini"].mean / max(len(pieces), 1) / 4
+
+            async def events():
+                for piece in pieces:
+                    yield f"data: {json.dumps(_gemini_envelope(piece))}\n\n"
+                    await asyncio.sleep(step)
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+        return _gemini_envelope(text)
+
+    # ---- SerpApi ----
+    @app.get("/serpapi/search.json")
+    async def serpapi(request: Request, q: str = ""):
+        error = await gate("serpapi")
+        if error:
+            return error
+
+        slug = re.sub(r"\W+", "-", q.lower()).strip("-") or "news"
+        base = str(request.base_url).rstrip("/")
+        rng = random.Random(q)
+        results = []
+        for i in range(results_per_search):
+            words = rng.sample(_WORDS, 6)
+            results.append({
+                "position": i + 1,
+                "link": f"{base}/news/{slug}/{i}",
+                "title": f"{q.title()}: {' '.join(words[:3])}",
+                "snippet": f"{q} — {' '.join(words)}, officials said on {rng.choice(_WORDS)}.",
+            })
+        return {"news_results": results}
+
+    # ---- Article pages ----
+    @app.get("/news/{slug}/{n}")
+    async def page(slug: str, n: int):
+        error = await gate("pages")
+        if error:
+            return error
+        rng = random.Random(f"{slug}/{n}")
+        paragraphs = "".join(
+            f"<p>{' '.join(rng.choice(_WORDS) for _ in range(60))}.</p>" for _ in range(8)
+        )
+        html = (
+            f"<html><head><title>{slug} {n}</title></head><body>"
+            f"<nav>menu links</nav><article><h1>{slug.replace('-', ' ')} {n}</h1>{paragraphs}</article>"
+            "<footer>footer</footer></body></html>"
+        )
+        return HTMLResponse(html)
+
+    # ---- PostgREST ----
+    @app.post("/supabase/rest/v1/rpc/{function}")
+    async def rpc(function: str):
+        error = await gate("supabase")
+        if error:
+            return error
+        return []   # no pgvector here → the app falls back to in-process ranking
+
+    @app.post("/supabase/rest/v1/{name}")
+    async def insert(name: str, request: Request):
+        body = await request.json()
+        error = await gate("supabase")
+        if error:
+            return error
+        rows = body if isinstance(body, list) else [body]
+        inserted = [r for r in (table.insert(row) for row in rows) if r is not None]
+        if not isinstance(body, list) and not inserted:
+            return JSONResponse({"message": "duplicate key"}, status_code=409)
+        return JSONResponse(inserted, status_code=201)
+
+    @app.get("/supabase/rest/v1/{name}")
+    async def select(name: str, request: Request):
+        error = await gate("supabase")
+        if error:
+            return error
+        return table.select(dict(request.query_params))
+
+    @app.delete("/supabase/rest/v1/{name}")
+    async def delete(name: str, request: Request):
+        url = request.query_params.get("url", "")
+        if url.startswith("like."):
+            table.delete_like(url[5:])
+        return Response(status_code=204)
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    defaults = (("gemini", 600, 200), ("serpapi", 300, 100), ("supabase", 20, 10), ("pages", 80, 40))
+    for name, latency, jitter in defaults:
+        parser.add_argument(f"--{name}-latency", type=float, default=latency, help="mean ms")
+        parser.add_argument(f"--{name}-jitter", type=float, default=jitter, help="stddev / half-range ms")
+        parser.add_argument(f"--{name}-errors", type=float, default=None, help="error rate (default --error-rate)")
+        parser.add_argument(f"--{name}-rate-limit", type=float, default=0.0, help="requests/s before 429s (0 = none)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="default error rate for all upstreams")
+    parser.add_argument("--dist", choices=("normal", "lognormal", "uniform"), default="lognormal")
+    parser.add_argument("--seed-rows", type=int, default=500, help="articles preloaded into the fake table")
+
+
+def models_from_args(args) -> dict:
+    models = {}
+    for name in UPSTREAMS:
+        errors = getattr(args, f"{name}_errors")
+        models[name] = LatencyModel(
+            getattr(args, f"{name}_latency"),
+            getattr(args, f"{name}_jitter"),
+            args.error_rate if errors is None else errors,
+            args.dist,
+            getattr(args, f"{name}_rate_limit"),
+        )
+    return models
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Gemini / SerpApi / PostgREST server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    app = build_app(models_from_args(args), seed_rows=args.seed_rows)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
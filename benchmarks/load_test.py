@@ -0,0 +1,232 @@
+# benchmarks/load_test.py
+
+"""
+Offline load test of the API against local fake upstreams.
+
+Starts benchmarks.fake_upstreams and the app (uvicorn) as subprocesses,
+wires the app to the fakes through environment variables, then drives
+each scenario at the given concurrency and reports throughput and
+p50/p95/p99 latency:
+
+    python -m benchmarks.load_test --concurrency 16 --requests 200 --out load.json
+    python -m benchmarks.load_test --scenarios ideas --gemini-latency 1500 --error-rate 0.05 \\
+        --baseline load.json
+
+Caches are disabled (TTL 0) unless --keep-caches, and every request uses
+a distinct keyword unless --repeat-keywords, so runs measure the
+pipeline rather than cache hits. Extra app settings: --app-env KEY=VALUE.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.common import run_metadata, summarize, write_results
+from benchmarks.fake_upstreams import add_arguments
+
+TOPICS = ["cyclone", "elections", "cricket", "stock market", "monsoon", "ai startups", "space mission", "budget"]
+
+SCENARIOS = {
+    "expand": ("POST", "/api/v1/expand", lambda kw: {"json": {"keywords": [kw]}}),
+    "scrape": ("POST", "/api/v1/scrape", lambda kw: {"json": {"keywords": [kw]}}),
+    "ideas": ("GET", "/api/v1/ideas", lambda kw: {"params": {"keyword": kw, "fresh": "true"}}),
+    "scrape-and-generate": (
+        "POST", "/api/v1/scrape-and-generate",
+        lambda kw: {"json": {"keywords": [kw]}, "params": {"fresh": "true"}},
+    ),
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until(url: str, timeout: float, proc: subprocess.Popen):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{proc.args[2]} exited with code {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def _fake_args(args) -> list[str]:
+    out = ["--dist", args.dist, "--error-rate", str(args.error_rate), "--seed-rows", str(args.seed_rows)]
+    for name in ("gemini", "serpapi", "supabase", "pages"):
+        out += [f"--{name}-latency", str(getattr(args, f"{name}_latency"))]
+        out += [f"--{name}-jitter", str(getattr(args, f"{name}_jitter"))]
+        out += [f"--{name}-rate-limit", str(getattr(args, f"{name}_rate_limit"))]
+        errors = getattr(args, f"{name}_errors")
+        if errors is not None:
+            out += [f"--{name}-errors", str(errors)]
+    return out
+
+
+def _app_env(args, fake_base: str, workdir: str) -> dict:
+    env = {
+        **os.environ,
+        "GEMINI_API_URL": f"{fake_base}/gemini/v1beta/models",
+        "GEMINI_API_KEY": "bench",
+        "SERPAPI_BASE_URL": f"{fake_base}/serpapi/search.json",
+        "SERPAPI_KEY": "bench",
+        "SUPABASE_URL": f"{fake_base}/supabase",
+        "SUPABASE_KEY": "bench",
+        "STORAGE_BACKEND": "postgrest",
+        "USE_PGVECTOR": "false",
+        "SCHEDULER_ENABLED": "false",
+        "EMBEDDING_STORE_DIR": os.path.join(workdir, "embeddings"),
+        "INGEST_DB_PATH": os.path.join(workdir, "ingest.sqlite3"),
+        "GEMINI_CACHE_PATH": "",
+        "ARTICLE_CACHE_PATH": "",
+    }
+    if not args.keep_caches:
+        env.update(GEMINI_CACHE_TTL="0", SERPAPI_CACHE_TTL="0", ARTICLE_CACHE_TTL="0")
+    for item in args.app_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, args) -> dict:
+    method, path, make = SCENARIOS[name]
+    counter = 0
+
+    def next_keyword() -> str:
+        nonlocal counter
+        counter += 1
+        kw = TOPICS[counter % len(TOPICS)]
+        return kw if args.repeat_keywords else f"{kw} {name} {counter}"
+
+    async def call(samples: list, statuses: dict):
+        kw = next_keyword()
+        t0 = time.perf_counter()
+        try:
+            response = await client.request(method, path, timeout=args.timeout, **make(kw))
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        samples.append(time.perf_counter() - t0)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    # Warm-up (model load, connection pools) is not measured
+    await asyncio.gather(*(call([], {}) for _ in range(min(args.warmup, args.requests))))
+
+    samples, statuses = [], {}
+    remaining = args.requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await call(samples, statuses)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    wall = time.perf_counter() - started
+
+    ok = statuses.get("200", 0)
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "seconds": wall,
+        "rps": args.requests / wall if wall else None,
+        "ok": ok,
+        "error_rate": 1 - ok / args.requests if args.requests else 0.0,
+        "statuses": statuses,
+        "latency": summarize(samples),
+    }
+
+
+async def drive(base_url: str, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+        for name in args.scenarios.split(","):
+            name = name.strip()
+            print(f"... {name}", file=sys.stderr)
+            results[name] = await run_scenario(client, name, args)
+        try:
+            results["app_stats"] = (await client.get("/stats")).json()
+        except Exception:
+            pass
+    return results
+
+
+def add_load_arguments(parser: argparse.ArgumentParser):
+    """Scenario, app and fake-upstream options (shared with bench_workers)."""
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--repeat-keywords", action="store_true", help="reuse a few keywords (cache-friendly)")
+    parser.add_argument("--keep-caches", action="store_true", help="leave the Gemini/SerpApi caches on")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    add_arguments(parser)
+
+
+def check_scenarios(parser: argparse.ArgumentParser, args):
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--app-workers", type=int, default=1)
+    add_load_arguments(parser)
+    args = parser.parse_args()
+    check_scenarios(parser, args)
+
+    fake_port, app_port = _free_port(), _free_port()
+    fake_base = f"http://127.0.0.1:{fake_port}"
+    app_base = f"http://127.0.0.1:{app_port}"
+
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        fake = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(fake_port)] + _fake_args(args)
+        )
+        app = None
+        try:
+            _wait_until(f"{fake_base}/health", 30, fake)
+            app = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port),
+                 "--workers", str(args.app_workers), "--log-level", "warning"],
+                env=_app_env(args, fake_base, workdir),
+            )
+            _wait_until(f"{app_base}/ready", args.startup_timeout, app)
+
+            results = asyncio.run(drive(app_base, args))
+            results["upstreams"] = httpx.get(f"{fake_base}/health").json()
+        finally:
+            for proc in (app, fake):
+                if proc is not None and proc.poll() is None:
+                    proc.terminate()
+                    try:
+                        proc.wait(timeout=10)
+                    except subprocess.TimeoutExpired:
+                        proc.kill()
+
+    params = {k: v for k, v in vars(args).items() if k not in ("out", "baseline")}
+    write_results({"meta": run_metadata(params), **results}, args.out, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
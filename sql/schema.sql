@@ -19,3 +19,84 @@ ADD CONSTRAINT unique_article_url UNIQUE (url);
 -- Optional: Index for faster sorting by latest
 CREATE INDEX idx_articles_created_at
 ON articles (created_at DESC);
+
+-- Near-duplicate detection: MinHash signature (hex) + story group
+ALTER TABLE articles
+ADD COLUMN fingerprint   TEXT,
+ADD COLUMN canonical_url TEXT;
+
+CREATE INDEX idx_articles_canonical_url
+ON articles (canonical_url);
+
+-- ------------------------------------------------------------
+-- Semantic search (pgvector)
+-- all-MiniLM-L6-v2 → 384-dim, L2-normalised embeddings
+-- ------------------------------------------------------------
+CREATE EXTENSION IF NOT EXISTS vector;
+
+ALTER TABLE articles
+ADD COLUMN embedding vector(384),
+ADD COLUMN embedding_model TEXT;   -- "<model>@<backend>" that produced `embedding`
+
+-- Approximate nearest-neighbour index (cosine distance)
+CREATE INDEX idx_articles_embedding
+ON articles USING hnsw (embedding vector_cosine_ops);
+
+-- Top-k nearest articles for a query embedding, among rows embedded by
+-- the same model/backend (`model_tag`; NULL = any).
+-- Called via PostgREST: POST /rest/v1/rpc/match_articles
+--
+-- Note: `since` / `model_tag` are applied to the rows the HNSW scan
+-- returns, and the scan returns at most hnsw.ef_search of them (default
+-- 40). The function raises it to 400, so with selective filters (a short
+-- ranking window, many rows from another model) it can still return
+-- fewer than `match_count` rows; the app then falls back to its own
+-- ranking only when nothing matched.
+DROP FUNCTION IF EXISTS match_articles(vector, INT, TIMESTAMPTZ);
+CREATE OR REPLACE FUNCTION match_articles(
+    query_embedding vector(384),
+    match_count     INT DEFAULT 8,
+    since           TIMESTAMPTZ DEFAULT NULL,
+    model_tag       TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    id          BIGINT,
+    url         TEXT,
+    title       TEXT,
+    summary     TEXT,
+    created_at  TIMESTAMPTZ,
+    similarity  FLOAT
+)
+LANGUAGE sql STABLE
+SET hnsw.ef_search = 400
+AS $$
+    SELECT a.id, a.url, a.title, a.summary, a.created_at,
+           1 - (a.embedding <=> query_embedding) AS similarity
+    FROM articles a
+    WHERE a.embedding IS NOT NULL
+      AND (since IS NULL OR a.created_at >= since)
+      AND (model_tag IS NULL OR a.embedding_model = model_tag)
+    ORDER BY a.embedding <=> query_embedding
+    LIMIT match_count;
+$$;
+
+-- Backfill: write many embeddings in one call
+-- (python -m app.services.embedding_store --backfill-db).
+-- items: [{"id": 1, "embedding": [...]}, ...]; returns rows updated.
+CREATE OR REPLACE FUNCTION set_article_embeddings(
+    items     JSONB,
+    model_tag TEXT
+)
+RETURNS INT
+LANGUAGE sql
+AS $$
+    WITH updated AS (
+        UPDATE articles a
+        SET embedding = (i->>'embedding')::vector,
+            embedding_model = model_tag
+        FROM jsonb_array_elements(items) AS i
+        WHERE a.id = (i->>'id')::BIGINT
+        RETURNING a.id
+    )
+    SELECT count(*)::INT FROM updated;
+$$;
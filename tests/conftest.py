@@ -0,0 +1,7 @@
+import os
+
+# Settings() needs these at import time; tests never reach the real upstreams
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("GEMINI_API_URL", "http://gemini.invalid/v1beta/models")
+os.environ.setdefault("SERPAPI_KEY", "test")
+os.environ.setdefault("GEMINI_CACHE_PATH", "")
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from app.services.ann_index import IVFIndex
+
+
+def _clustered(n, dim=64, clusters=100, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    x = centers[rng.integers(0, clusters, n)] + rng.normal(scale=0.6, size=(n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def _recall(index, data, queries, k, nprobe):
+    exact = np.argsort(-(queries @ data.T), axis=1)[:, :k]
+    found = [index.search(q, k, nprobe=nprobe)[0] for q in queries]
+    return np.mean([len(set(f.tolist()) & set(e.tolist())) / k for f, e in zip(found, exact)])
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    data = _clustered(20_000)
+    rng = np.random.default_rng(1)
+    queries = data[rng.choice(len(data), 50, replace=False)] + rng.normal(scale=0.2, size=(50, 64))
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+    return data, queries
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_recall_vs_exact(corpus, dtype):
+    data, queries = corpus
+    index = IVFIndex(data.shape[1], exact=lambda ids: data[ids], dtype=dtype)
+    index.train(data)
+    index.add(np.arange(len(data)), data)
+
+    assert _recall(index, data, queries, k=10, nprobe=32) >= 0.9
+    # Scanning every list (+ exact re-rank) is as good as brute force
+    assert _recall(index, data, queries, k=10, nprobe=index.stats()["nlist"]) >= 0.99
+
+
+def test_recall_grows_with_nprobe(corpus):
+    data, queries = corpus
+    index = IVFIndex(data.shape[1], exact=lambda ids: data[ids])
+    index.train(data)
+    index.add(np.arange(len(data)), data)
+
+    recalls = [_recall(index, data, queries, k=10, nprobe=p) for p in (1, 8, 64)]
+    assert recalls == sorted(recalls)
+    assert recalls[0] < recalls[-1]
+
+
+def test_incremental_add_and_remove(corpus):
+    data = corpus[0].copy()
+    index = IVFIndex(data.shape[1], exact=lambda ids: data[ids], nprobe=8)
+    index.train(data[:5000])
+    index.add(np.arange(5000), data[:5000])
+    index.add(np.arange(5000, 6000), data[5000:6000])
+    assert len(index) == 6000
+
+    ids, scores = index.search(data[5500], k=1)
+    assert ids[0] == 5500 and scores[0] == pytest.approx(1.0, abs=1e-3)
+
+    index.remove([5500])
+    assert 5500 not in index
+    assert 5500 not in index.search(data[5500], k=10)[0]
+
+    # Re-adding an id moves it instead of duplicating it
+    data[7] = data[5500]
+    index.add([7], data[7:8])
+    assert len(index) == 5999
+    assert index.search(data[5500], k=1)[0][0] == 7
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services import article_fetcher
+from app.services.article_fetcher import ArticleFetcher, validator_cache
+from app.services.http_clients import http_clients
+
+ARTICLE = (
+    "<html><head><title>Cyclone nears the coast</title></head><body>"
+    "<nav>Home | World | Sport</nav><article><h1>Cyclone nears the coast</h1>"
+    + "<p>Officials ordered evacuations along the coast as the storm strengthened overnight.</p>" * 20
+    + "</article></body></html>"
+)
+BIG = "<html><body><article>" + "<p>filler paragraph text</p>" * 5000 + "<p>END-MARKER</p></article></body></html>"
+ETAG = '"v1"'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        _Handler.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.path == "/article":
+            if self.headers.get("If-None-Match") == ETAG:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self._send(200, ARTICLE, etag=ETAG)
+        elif self.path == "/big":
+            self._send(200, BIG)
+        else:
+            self._send(404, "not found")
+
+    def _send(self, status, body, etag=None):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    article_fetcher.shutdown_pool()
+
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    validator_cache.clear()
+    _Handler.requests.clear()
+
+
+def _run(coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await http_clients.aclose()
+    return asyncio.run(main())
+
+
+def test_fetch_extracts_article_text(server):
+    page = _run(ArticleFetcher(politeness_delay=0).fetch(f"{server}/article"))
+
+    assert page["title"] == "Cyclone nears the coast"
+    assert "ordered evacuations" in page["text"]
+    assert "Home | World" not in page["text"]
+
+
+def test_fetch_missing_page_returns_none(server):
+    assert _run(ArticleFetcher(politeness_delay=0).fetch(f"{server}/missing")) is None
+
+
+def test_refetch_sends_validator_and_reuses_text_on_304(server):
+    fetcher = ArticleFetcher(politeness_delay=0)
+
+    async def twice():
+        return await fetcher.fetch(f"{server}/article"), await fetcher.fetch(f"{server}/article")
+
+    first, second = _run(twice())
+
+    assert second == first
+    assert _Handler.requests == [("/article", None), ("/article", ETAG)]
+
+
+def test_byte_cap(server):
+    page = _run(ArticleFetcher(max_bytes=4096, politeness_delay=0).fetch(f"{server}/big"))
+
+    assert "filler" in page["text"]
+    assert "END-MARKER" not in page["text"]
+
+
+def test_enrich_replaces_snippet_with_article_text(server):
+    articles = [
+        {"url": f"{server}/article", "title": "", "summary": "Storm nears."},
+        {"url": f"{server}/missing", "title": "Kept", "summary": "Snippet kept."},
+    ]
+    _run(ArticleFetcher(politeness_delay=0).enrich(articles, top_n=2))
+
+    assert "ordered evacuations" in articles[0]["summary"]
+    assert articles[0]["title"] == "Cyclone nears the coast"
+    assert articles[1]["summary"] == "Snippet kept."
@@ -0,0 +1,139 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.services.idea_generator import IdeaGenerator
+
+
+def _article(keyword, i):
+    return {
+        "url": f"https://news.example/{keyword}/{i}",
+        "title": f"{keyword} story number {i} in the news",
+        "summary": f"A report about {keyword}, item {i}, with distinct details {i * 7} and more.",
+    }
+
+
+class FakeSemantic:
+    """Every keyword gets its own articles; no keyword ranked as `empty` has any."""
+
+    def __init__(self, empty=(), broken=()):
+        self.empty = set(empty)
+        self.broken = set(broken)
+        self.keywords = None
+
+    async def encode(self, texts):
+        if self.keywords is None:
+            self.keywords = list(texts)   # the first encode is the keyword batch
+        rng = np.random.default_rng(len(texts))
+        vecs = rng.normal(size=(len(texts), 8)).astype(np.float32)
+        return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+    async def find_relevant_multi_stream(self, kw_emb, pages, top_k=5):
+        return [[] if kw in self.empty else [_article(kw, i) for i in range(3)] for kw in self.keywords]
+
+    async def embed_articles(self, articles):
+        if any(a["url"].split("/")[3] in self.broken for a in articles):
+            raise RuntimeError("encode failed")
+        return await self.encode([a["url"] for a in articles])
+
+
+class FakeGemini:
+    def __init__(self, fail=(), omit=()):
+        self.fail, self.omit = set(fail), set(omit)
+        self.calls = []
+
+    async def json_prompt(self, prompt, schema, use_cache=True):
+        keywords = schema["items"]["properties"]["keyword"]["enum"]
+        self.calls.append(keywords)
+        if self.fail & set(keywords):
+            raise RuntimeError("upstream exploded")
+        # The model may echo the topic in another case
+        return [{"keyword": kw.upper(), "ideas": [f"Idea about {kw}", " "]} for kw in keywords if kw not in self.omit]
+
+
+class FakeDB:
+    def iter_pages(self, *args, **kwargs):
+        return None
+
+
+def _generator(semantic, gemini):
+    idea = IdeaGenerator.__new__(IdeaGenerator)
+    idea.db, idea.semantic, idea.gemini = FakeDB(), semantic, gemini
+    idea.context_stats = idea.trending = None
+    return idea
+
+
+def _run(idea, keywords):
+    return asyncio.run(idea.generate_ideas_batch(keywords))
+
+
+@pytest.fixture(autouse=True)
+def batch_limits(monkeypatch):
+    monkeypatch.setattr(settings, "batch_max_topics_per_call", 2)
+    monkeypatch.setattr(settings, "batch_max_prompt_tokens", 100_000)
+    monkeypatch.setattr(settings, "batch_max_concurrent_calls", 2)
+
+
+def test_topics_are_grouped_into_calls():
+    gemini = FakeGemini()
+    out = _run(_generator(FakeSemantic(), gemini), ["ai", "climate", "sport", "markets", "space"])
+
+    assert out["calls"] == 3
+    assert sorted(map(len, gemini.calls)) == [1, 2, 2]
+    assert out["failed"] == []
+    by_kw = {r["keyword"]: r for r in out["results"]}
+    assert [r["keyword"] for r in out["results"]] == ["ai", "climate", "sport", "markets", "space"]
+    assert by_kw["climate"]["ideas"] == ["Idea about climate"]
+    assert by_kw["climate"]["articles"] > 0 and by_kw["climate"]["context_tokens"] > 0
+
+
+def test_failed_call_only_fails_its_keywords():
+    gemini = FakeGemini(fail={"sport"})
+    out = _run(_generator(FakeSemantic(), gemini), ["ai", "climate", "sport", "markets"])
+
+    statuses = {r["keyword"]: r["status"] for r in out["results"]}
+    failed_call = next(call for call in gemini.calls if "sport" in call)
+    assert sorted(out["failed"]) == sorted(failed_call)
+    for kw, status in statuses.items():
+        assert status == ("error" if kw in failed_call else "ok")
+
+
+def test_topic_missing_from_model_output_is_reported():
+    out = _run(_generator(FakeSemantic(), FakeGemini(omit={"climate"})), ["ai", "climate"])
+
+    by_kw = {r["keyword"]: r for r in out["results"]}
+    assert by_kw["climate"]["status"] == "missing"
+    assert by_kw["ai"]["status"] == "ok"
+    assert out["failed"] == ["climate"]
+
+
+def test_keywords_without_articles_skip_the_model():
+    gemini = FakeGemini()
+    out = _run(_generator(FakeSemantic(empty={"quiet"}), gemini), ["ai", "quiet"])
+
+    by_kw = {r["keyword"]: r for r in out["results"]}
+    assert by_kw["quiet"]["status"] == "no_articles"
+    assert gemini.calls == [["ai"]]
+
+
+def test_keywords_are_deduplicated_case_insensitively():
+    gemini = FakeGemini()
+    out = _run(_generator(FakeSemantic(), gemini), ["AI", "ai", " Ai ", "climate"])
+
+    assert [r["keyword"] for r in out["results"]] == ["AI", "climate"]
+    assert [kw for call in gemini.calls for kw in call] == ["AI", "climate"]
+    assert all(r["status"] == "ok" for r in out["results"])
+
+
+def test_context_failure_only_fails_its_keyword():
+    gemini = FakeGemini()
+    out = _run(_generator(FakeSemantic(broken={"climate"}), gemini), ["ai", "climate", "sport"])
+
+    by_kw = {r["keyword"]: r for r in out["results"]}
+    assert by_kw["climate"]["status"] == "error"
+    assert "context failed" in by_kw["climate"]["detail"]
+    assert by_kw["ai"]["status"] == by_kw["sport"]["status"] == "ok"
+    assert out["failed"] == ["climate"]
+    assert [kw for call in gemini.calls for kw in call] == ["ai", "sport"]
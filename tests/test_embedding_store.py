@@ -0,0 +1,91 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from app.services.embedding_store import EmbeddingStore
+
+
+def vector(n, dim=16):
+    v = np.random.default_rng(n).standard_normal(dim).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+def articles(start, count):
+    return [{"url": f"https://example.com/{n}", "title": f"story {n}"} for n in range(start, start + count)]
+
+
+def _writer(directory, start, count):
+    # Opened before the other writers start, like a store shared by forked workers
+    store = EmbeddingStore(directory, model_tag="test")
+    for n in range(start, start + count, 10):
+        batch = articles(n, 10)
+        store.put(batch, np.stack([vector(int(a["url"].rsplit("/", 1)[1])) for a in batch]))
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork()")
+def test_processes_sharing_a_directory_never_share_rows(tmp_path):
+    directory = str(tmp_path)
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_writer, args=(directory, i * 1000, 600)) for i in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+        assert p.exitcode == 0
+
+    store = EmbeddingStore(directory, model_tag="test")
+    everything = [a for i in range(3) for a in articles(i * 1000, 600)]
+    assert len(store) == len(everything)
+    assert not store.pending(everything)
+    got = store.vectors_for(everything)
+    want = np.stack([vector(int(a["url"].rsplit("/", 1)[1])) for a in everything])
+    np.testing.assert_allclose(got, want, atol=1e-6)
+
+
+def test_reader_sees_rows_written_by_another_store(tmp_path):
+    reader = EmbeddingStore(str(tmp_path), model_tag="test")
+    writer = EmbeddingStore(str(tmp_path), model_tag="test")
+    batch = articles(0, 5)
+    writer.put(batch, np.stack([vector(n) for n in range(5)]))
+
+    assert not reader.pending(batch)
+    key, score = reader.search(vector(3), 1)[0]
+    assert key == "https://example.com/3"
+    assert score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_backfill_writes_one_rpc_per_page(tmp_path, monkeypatch):
+    import asyncio
+
+    from app.services import embedding_store, semantic_engine, supabase_client
+
+    rows = [{"id": n, "url": f"https://example.com/{n}", "title": f"story {n}", "summary": ""} for n in range(5)]
+
+    class FakeDB:
+        calls = []
+
+        async def fetch_page(self, table, columns, order, limit, filters):
+            # Updated rows drop out of the filter
+            done = {item["id"] for _, params in self.calls for item in params["items"]}
+            return [r for r in rows if r["id"] not in done][:limit]
+
+        async def rpc(self, function, params, read_only=False):
+            self.calls.append((function, params))
+            return len(params["items"])
+
+    class FakeEngine:
+        def encode_documents(self, texts):
+            return np.stack([vector(len(t)) for t in texts])
+
+    store = EmbeddingStore(str(tmp_path), model_tag="test")
+    monkeypatch.setattr(supabase_client, "SupabaseClient", FakeDB)
+    monkeypatch.setattr(semantic_engine, "get_semantic_engine", lambda: FakeEngine())
+    monkeypatch.setattr(embedding_store, "get_embedding_store", lambda: store)
+
+    asyncio.run(embedding_store._backfill_db_embeddings(batch_size=2))
+
+    assert [len(params["items"]) for _, params in FakeDB.calls] == [2, 2, 1]
+    assert {f for f, _ in FakeDB.calls} == {"set_article_embeddings"}
+    assert all(params["model_tag"] == "test" for _, params in FakeDB.calls)
+    assert len(FakeDB.calls[0][1]["items"][0]["embedding"]) == 16
@@ -0,0 +1,42 @@
+import asyncio
+
+from app.services.cache import TTLCache
+from app.services.llm_client import GeminiClient
+
+
+def test_empty_generation_is_not_cached():
+    client = GeminiClient()
+    answers = iter(["", "1. A real idea"])
+    calls = []
+
+    async def fake_generate(prompt, generation_config=None):
+        calls.append(prompt)
+        return next(answers)
+
+    client._call_generate = fake_generate
+
+    async def main():
+        first = await client.raw_prompt("empty-then-real prompt")
+        second = await client.raw_prompt("empty-then-real prompt")
+        third = await client.raw_prompt("empty-then-real prompt")
+        return first, second, third
+
+    assert asyncio.run(main()) == ("", "1. A real idea", "1. A real idea")
+    assert len(calls) == 2   # the empty answer was retried, the real one cached
+
+
+def test_uncacheable_result_still_reaches_coalesced_callers():
+    cache = TTLCache("test", ttl=60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return []
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute("k", compute, cacheable=bool) for _ in range(3)))
+
+    assert asyncio.run(main()) == [[], [], []]
+    assert len(calls) == 1
+    assert cache.get("k") is None
@@ -0,0 +1,83 @@
+import re
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services.metrics import MetricsRegistry, metrics
+from app.services.tracing import RequestMetricsMiddleware, http_requests, span
+
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*",?)*\})? \S+$')
+
+
+def _client():
+    app = FastAPI()
+    app.add_middleware(RequestMetricsMiddleware)
+
+    @app.get("/work/{item}")
+    async def work(item: str):
+        with span("test.stage"):
+            pass
+        with span("test.stage"):
+            pass
+        return {"item": item}
+
+    return TestClient(app)
+
+
+def test_request_metrics_use_the_route_template():
+    client = _client()
+    before = http_requests.value(method="GET", route="/work/{item}", status=200)
+    client.get("/work/1")
+    client.get("/work/2")
+    client.get("/nowhere")
+
+    assert http_requests.value(method="GET", route="/work/{item}", status=200) == before + 2
+    assert http_requests.value(method="GET", route="unmatched", status=404) >= 1
+
+
+def test_server_timing_is_opt_in(monkeypatch):
+    from app.config import settings
+
+    client = _client()
+    assert "server-timing" not in client.get("/work/1").headers
+
+    timing = client.get("/work/1", headers={"X-Server-Timing": "1"}).headers["server-timing"]
+    assert re.search(r'test\.stage;dur=[\d.]+;desc="x2"', timing)
+    assert re.search(r"total;dur=[\d.]+$", timing)
+
+    monkeypatch.setattr(settings, "server_timing_enabled", True)
+    assert "total;dur=" in client.get("/work/1").headers["server-timing"]
+
+
+def test_metrics_endpoint_is_valid_exposition_format():
+    from app.main import prometheus_metrics
+
+    _client().get("/work/1")
+    first = prometheus_metrics().body.decode()
+    second = prometheus_metrics().body.decode()
+
+    for text in (first, second):
+        seen_types = set()
+        for line in text.strip().splitlines():
+            if line.startswith("# TYPE "):
+                name = line.split()[2]
+                assert name not in seen_types, f"{name} declared twice"
+                seen_types.add(name)
+            elif not line.startswith("# HELP "):
+                assert SAMPLE.match(line), line
+        assert {"http_requests_total", "stage_duration_seconds", "cache_hits_total"} <= seen_types
+
+    # Collected values are overwritten on each scrape, not added up
+    hits = [line for line in second.splitlines() if line.startswith("cache_hits_total{")]
+    assert hits == [line for line in first.splitlines() if line.startswith("cache_hits_total{")]
+
+
+def test_const_labels_reach_every_sample():
+    registry = MetricsRegistry()
+    registry.counter("jobs_total", "Jobs.", ["kind"]).inc(kind="a")
+    registry.histogram("wait_seconds", "Wait.", buckets=(1.0,)).observe(0.5)
+    registry.set_const_labels(worker=2)
+
+    samples = [line for line in registry.render().splitlines() if not line.startswith("#")]
+    assert samples and all('worker="2"' in line and SAMPLE.match(line) for line in samples)
+    assert metrics.const_labels == {}
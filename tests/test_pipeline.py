@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+from fastapi import Response
+
+from app.api.v1 import endpoints
+from app.services import pipeline
+from app.services.pipeline import MAX_SAVE_PER_RUN, scrape_and_save
+
+
+class FakeGemini:
+    def __init__(self, keywords):
+        self.keywords = keywords
+
+    async def expand_keywords(self, keywords):
+        return list(self.keywords)
+
+    async def stream_prompt(self, prompt, use_cache=True):
+        yield "1. An idea"
+
+
+class FakeScraper:
+    """`per_keyword` results for every keyword; URLs are unique per keyword."""
+
+    def __init__(self, per_keyword=10):
+        self.per_keyword = per_keyword
+        self.searched = []
+
+    async def search_and_scrape(self, keyword):
+        self.searched.append(keyword)
+        await asyncio.sleep(0)
+        return [
+            {"url": f"https://news.example/{keyword}/{i}", "title": f"{keyword} {i}", "summary": "text"}
+            for i in range(self.per_keyword)
+        ]
+
+
+class FakeIdea:
+    """Stores URLs; the ones in `stored` come back as duplicates."""
+
+    def __init__(self, stored=()):
+        self.stored = set(stored)
+        self.saved_batches = []
+        self.context_stats = None
+        self.trending = None
+
+    async def filter_near_duplicates(self, articles):
+        return articles, []
+
+    async def save_articles(self, articles):
+        self.saved_batches.append([a["url"] for a in articles])
+        statuses = []
+        for a in articles:
+            status = "duplicate" if a["url"] in self.stored else "inserted"
+            self.stored.add(a["url"])
+            statuses.append({"url": a["url"], "status": status, "row": None})
+        return statuses
+
+    async def generate_ideas_from_list(self, articles, query=None):
+        return [f"idea from {len(articles)} articles"]
+
+
+class FakeFetcher:
+    async def enrich(self, articles, top_n):
+        return articles
+
+
+@pytest.fixture(autouse=True)
+def no_fetch(monkeypatch):
+    monkeypatch.setattr(pipeline, "get_article_fetcher", lambda: FakeFetcher())
+
+
+def _urls(keyword, n=10):
+    return {f"https://news.example/{keyword}/{i}" for i in range(n)}
+
+
+def test_cap_counts_inserted_rows_not_scraped_urls():
+    keywords = ["old", "new", "later"]
+    idea = FakeIdea(stored=_urls("old"))
+    scraper = FakeScraper()
+
+    _, scraped, statuses = asyncio.run(scrape_and_save(FakeGemini(keywords), scraper, idea, ["seed"]))
+
+    inserted = [st["url"] for st in statuses if st["status"] == "inserted"]
+    assert len(inserted) == MAX_SAVE_PER_RUN
+    assert set(inserted) == _urls("new")
+    assert [a["url"] for a in scraped] == [st["url"] for st in statuses]
+
+
+def test_all_duplicates_still_generate_ideas(monkeypatch):
+    keywords = ["a", "b"]
+    idea = FakeIdea(stored=_urls("a") | _urls("b"))
+    scraper = FakeScraper()
+
+    _, scraped, statuses = asyncio.run(scrape_and_save(FakeGemini(keywords), scraper, idea, ["seed"]))
+    assert scraper.searched == keywords   # nothing new: every search ran
+    assert len(scraped) == 20
+    assert all(st["status"] == "duplicate" for st in statuses)
+
+    # The endpoint builds ideas from them instead of "No articles scraped"
+    idea = FakeIdea(stored=_urls("a") | _urls("b"))
+    monkeypatch.setattr(endpoints, "GeminiClient", lambda: FakeGemini(keywords))
+    monkeypatch.setattr(endpoints, "Scraper", FakeScraper)
+    monkeypatch.setattr(endpoints, "IdeaGenerator", lambda: idea)
+    out = asyncio.run(endpoints.scrape_and_generate(
+        endpoints.ScrapeRequest(keywords=["seed"]), Response(), fresh=True,
+    ))
+    assert out.ideas == ["idea from 20 articles"]
+
+
+def test_watchlist_refresh_and_live_run_give_the_same_ideas(monkeypatch):
+    from app.services import idea_generator, llm_client, scraper
+    from app.services.scheduler import IngestScheduler
+
+    class ListingIdea(FakeIdea):
+        async def generate_ideas_from_list(self, articles, query=None):
+            return [query] + sorted(a["url"] for a in articles)
+
+    keywords = ["a", "b"]
+    stored = _urls("a", 4)   # some already stored, some new, one failed save
+
+    class FlakyIdea(ListingIdea):
+        async def save_articles(self, articles):
+            statuses = await super().save_articles(articles)
+            for st in statuses:
+                if st["url"].endswith("/b/1"):
+                    st["status"] = "error"
+            return statuses
+
+    monkeypatch.setattr(llm_client, "GeminiClient", lambda: FakeGemini(keywords))
+    monkeypatch.setattr(scraper, "Scraper", FakeScraper)
+    monkeypatch.setattr(idea_generator, "IdeaGenerator", lambda: FlakyIdea(stored))
+    payload = asyncio.run(IngestScheduler(store=object()).run_job({"keywords": ["seed"]}))
+
+    monkeypatch.setattr(endpoints, "GeminiClient", lambda: FakeGemini(keywords))
+    monkeypatch.setattr(endpoints, "Scraper", FakeScraper)
+    monkeypatch.setattr(endpoints, "IdeaGenerator", lambda: FlakyIdea(stored))
+    live = asyncio.run(endpoints.scrape_and_generate(
+        endpoints.ScrapeRequest(keywords=["seed"]), Response(), fresh=True,
+    ))
+
+    assert live.ideas == payload["ideas"]
+    assert "https://news.example/a/0" in live.ideas       # already stored
+    assert "https://news.example/b/1" not in live.ideas   # failed save
+    assert "https://news.example/b/0" in live.ideas
@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.quota import QuotaExceeded, QuotaScheduler, upstream_priority
+
+
+def make_quota(rate=20.0, burst=1, max_queue=10, max_wait=5.0):
+    return QuotaScheduler(
+        "test",
+        rate=rate,
+        burst=burst,
+        max_queue=max_queue,
+        max_wait={"interactive": max_wait, "batch": max_wait, "background": max_wait},
+    )
+
+
+def drain(quota):
+    while quota.try_acquire():
+        pass
+
+
+def test_grants_highest_priority_first():
+    async def main():
+        quota = make_quota()
+        drain(quota)
+        order = []
+
+        async def call(priority):
+            with upstream_priority(priority):
+                await quota.acquire()
+            order.append(priority)
+
+        # Queued lowest class first; all are waiting before the next token
+        tasks = []
+        for priority in ("background", "batch", "interactive"):
+            tasks.append(asyncio.ensure_future(call(priority)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(main()) == ["interactive", "batch", "background"]
+
+
+def test_sheds_when_class_queue_is_full():
+    async def main():
+        quota = make_quota(max_queue=1)
+        drain(quota)
+        waiting = asyncio.ensure_future(quota.acquire("batch"))
+        await asyncio.sleep(0)
+        with pytest.raises(QuotaExceeded) as exc:
+            await quota.acquire("batch")
+        # Another class has its own queue
+        await quota.acquire("interactive")
+        await waiting
+        return quota, exc.value
+
+    quota, error = asyncio.run(main())
+    assert error.reason == "queue_full"
+    assert error.priority == "batch"
+    assert quota.shed["batch"] == 1
+
+
+def test_sheds_when_estimated_wait_is_too_long():
+    async def main():
+        quota = make_quota(rate=1.0, max_wait=0.05)
+        drain(quota)
+        with pytest.raises(QuotaExceeded) as exc:
+            await quota.acquire()
+        return exc.value
+
+    error = asyncio.run(main())
+    assert error.reason == "wait"
+    assert error.retry_after > 0.05
+
+
+def test_sheds_a_call_that_waited_too_long():
+    async def main():
+        quota = make_quota(rate=10.0, max_wait=0.2)
+        drain(quota)
+        waiting = asyncio.ensure_future(quota.acquire())
+        await asyncio.sleep(0)
+        # Admitted on a ~0.1s estimate, then the upstream asks for a pause
+        quota.pause(5)
+        with pytest.raises(QuotaExceeded) as exc:
+            await waiting
+        return quota, exc.value
+
+    quota, error = asyncio.run(main())
+    assert error.reason == "timeout"
+    assert not any(quota._queues.values())
+
+
+def test_pause_holds_grants_until_it_ends():
+    async def main():
+        quota = make_quota(rate=100.0, burst=5)
+        quota.pause(0.2)
+        assert not quota.try_acquire()
+        started = time.monotonic()
+        waited = await quota.acquire()
+        return waited, time.monotonic() - started
+
+    waited, elapsed = asyncio.run(main())
+    assert elapsed >= 0.15
+    assert waited >= 0.15
+
+
+def test_unlimited_never_waits():
+    async def main():
+        quota = make_quota(rate=0.0)
+        return [await quota.acquire() for _ in range(50)]
+
+    assert asyncio.run(main()) == [0.0] * 50
+
+
+def test_shed_search_reaches_the_caller():
+    from app.services.pipeline import scrape_keywords
+
+    class Scraper:
+        async def search_and_scrape(self, keyword):
+            if keyword == "shed":
+                raise QuotaExceeded("serpapi", "interactive", "wait", 3.0)
+            if keyword == "broken":
+                raise RuntimeError("parse error")
+            return [{"url": f"https://example.com/{keyword}"}]
+
+    # Other failures still degrade to no results for that keyword
+    got = asyncio.run(scrape_keywords(Scraper(), ["a", "broken", "b"]))
+    assert [a["url"] for a in got] == ["https://example.com/a", "https://example.com/b"]
+
+    with pytest.raises(QuotaExceeded):
+        asyncio.run(scrape_keywords(Scraper(), ["a", "shed", "b"]))
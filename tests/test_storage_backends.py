@@ -0,0 +1,227 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import asyncpg
+import httpx
+import pytest
+
+from app.config import settings
+from app.services import asyncpg_backend
+from app.services.asyncpg_backend import AsyncpgBackend, _in_items, _input_params
+from app.services.http_clients import http_clients
+from app.services.postgrest_backend import PostgrestBackend
+
+
+def rows(*urls):
+    return [{"url": u, "title": u.upper()} for u in urls]
+
+
+def statuses(results):
+    return [(r["url"], r["status"], (r["row"] or {}).get("id")) for r in results]
+
+
+# ------------------------------------------------------------
+# PostgREST
+# ------------------------------------------------------------
+def test_postgrest_insert_many_maps_statuses_to_input_rows(monkeypatch):
+    stored = {"https://a.example/2"}
+    ids = iter(range(1, 100))
+
+    def handler(request):
+        chunk = httpx.Response(200, content=request.content).json()
+        if any("broken" in r["url"] for r in chunk):
+            return httpx.Response(400, text="bad row")
+        # Only new rows come back, and not in input order
+        new = [dict(r, id=next(ids)) for r in chunk if r["url"] not in stored]
+        stored.update(r["url"] for r in new)
+        return httpx.Response(201, json=list(reversed(new)))
+
+    monkeypatch.setattr(settings, "supabase_url", "https://db.example")
+    monkeypatch.setattr(settings, "supabase_key", "test")
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setitem(http_clients._clients, "supabase", client)
+
+    results = asyncio.run(PostgrestBackend().insert_many(
+        "articles",
+        rows("https://a.example/1", "https://a.example/2", "https://a.example/broken", "https://a.example/3"),
+        chunk_size=2,
+        retries=0,
+    ))
+    assert statuses(results) == [
+        ("https://a.example/1", "inserted", 1),
+        ("https://a.example/2", "duplicate", None),
+        ("https://a.example/broken", "error", None),
+        ("https://a.example/3", "error", None),
+    ]
+
+
+# ------------------------------------------------------------
+# asyncpg
+# ------------------------------------------------------------
+class FakeConnection:
+    """Enough of asyncpg.Connection for insert_many's COPY + INSERT ... SELECT."""
+
+    def __init__(self, stored=(), fail_copies=0, drop_on_commit=True):
+        self.stored = set(stored)
+        self.fail_copies = fail_copies
+        self.drop_on_commit = drop_on_commit
+        self.temp_tables = set()
+        self.created = []
+        self.copied = []
+        self.next_id = 1
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+        if self.drop_on_commit:
+            self.temp_tables.clear()
+
+    async def execute(self, sql, *args):
+        name = sql.split('"')[1]
+        if name in self.temp_tables:
+            raise asyncpg.DuplicateTableError(f'relation "{name}" already exists')
+        self.temp_tables.add(name)
+        self.created.append(name)
+
+    async def copy_records_to_table(self, table, records, columns):
+        if self.fail_copies:
+            self.fail_copies -= 1
+            raise ConnectionResetError("connection lost")
+        if any("broken" in r[columns.index("url")] for r in records):
+            raise asyncpg.DataError("invalid input")
+        self.copied = [dict(zip(columns, r)) for r in records]
+
+    async def fetch(self, sql, *args):
+        if "pg_attribute" in sql:
+            return [{"attname": "url", "type": "text"}, {"attname": "title", "type": "text"}]
+        new = []
+        for r in self.copied:
+            if r["url"] not in self.stored:
+                self.stored.add(r["url"])
+                new.append(dict(r, id=self.next_id))
+                self.next_id += 1
+        return list(reversed(new))
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+def make_asyncpg(conn):
+    backend = AsyncpgBackend("postgresql://test")
+    backend._pool = FakePool(conn)
+    return backend
+
+
+def test_asyncpg_insert_many_maps_statuses_to_input_rows():
+    conn = FakeConnection(stored={"https://a.example/2"})
+    results = asyncio.run(make_asyncpg(conn).insert_many(
+        "articles",
+        rows("https://a.example/1", "https://a.example/2", "https://a.example/broken", "https://a.example/3"),
+        chunk_size=2,
+        retries=0,
+    ))
+    assert statuses(results) == [
+        ("https://a.example/1", "inserted", 1),
+        ("https://a.example/2", "duplicate", None),
+        ("https://a.example/broken", "error", None),
+        ("https://a.example/3", "error", None),
+    ]
+
+
+def test_asyncpg_retry_uses_a_fresh_temp_table(monkeypatch):
+    async def no_sleep(seconds):
+        pass
+
+    # The failed attempt's temp table is still there on the same connection
+    conn = FakeConnection(fail_copies=1, drop_on_commit=False)
+    monkeypatch.setattr(asyncpg_backend.asyncio, "sleep", no_sleep)
+
+    results = asyncio.run(make_asyncpg(conn).insert_many("articles", rows("https://a.example/1"), retries=1))
+    assert statuses(results) == [("https://a.example/1", "inserted", 1)]
+    assert len(conn.created) == 2
+    assert len(set(conn.created)) == 2
+    assert all(name.startswith("_ingest_articles_") for name in conn.created)
+
+
+
+# ------------------------------------------------------------
+# asyncpg: PostgREST-style query → SQL, function signatures
+# ------------------------------------------------------------
+def test_in_items_handles_quotes_and_escapes():
+    assert _in_items('(a, "b,c",  d ,"say \\"hi\\"",)') == ["a", "b,c", "d", 'say "hi"']
+    assert _in_items("()") == []
+
+
+def test_build_translates_postgrest_params():
+    backend = AsyncpgBackend("postgresql://test")
+    params = backend._parse_query(
+        "select=id,url&created_at=gte.2025-01-01T00%3A00%3A00%2B00%3A00"
+        "&id=in.(1,2)&title=ilike.*ai*&summary=is.null&order=created_at.desc,id&limit=10&offset=20"
+    )
+    assert params[1] == ("created_at", "gte.2025-01-01T00:00:00+00:00")
+
+    types = {"id": "bigint", "created_at": "timestamp with time zone", "title": "text"}
+    select_sql, where_sql, order_sql, limit_sql, args = backend._build(params, types)
+    assert select_sql == '"id", "url"'
+    assert where_sql == (
+        ' WHERE "created_at" >= $1::text::timestamp with time zone'
+        ' AND "id" = ANY($2::text[]::bigint[])'
+        ' AND "title" ILIKE $3::text::text'
+        ' AND "summary" IS NULL'
+    )
+    assert order_sql == ' ORDER BY "created_at" DESC, "id" ASC'
+    assert limit_sql == " LIMIT 10 OFFSET 20"
+    assert args == ["2025-01-01T00:00:00+00:00", ["1", "2"], "%ai%"]
+
+
+def test_build_rejects_unsafe_identifiers_and_filters():
+    backend = AsyncpgBackend("postgresql://test")
+    for params in (
+        [("select", 'id; DROP TABLE "articles"')],
+        [("url", "regex.^http")],
+        [("order", "id.sideways")],
+        [('url"--', "eq.x")],
+    ):
+        with pytest.raises(ValueError):
+            backend._build(params, {})
+
+
+def test_input_params_keeps_named_input_arguments():
+    # match_articles(query_embedding vector, match_count int DEFAULT 10) RETURNS TABLE (id bigint, ...)
+    assert _input_params(
+        ["query_embedding", "match_count", "id"], ["i", "i", "t"], ["vector", "integer", "bigint"],
+    ) == {"query_embedding": "vector", "match_count": "integer"}
+    # No modes: every argument is IN; unnamed ones can't be passed by name
+    assert _input_params(["items", ""], None, ["jsonb", "text"]) == {"items": "jsonb"}
+    assert _input_params(None, None, ["integer"]) == {}
+    assert _input_params(["a", "b", "c"], ["b", "o", "v"], ["text", "text", "text[]"]) == {
+        "a": "text", "c": "text[]",
+    }
+
+
+def test_function_params_reads_the_public_schema_once():
+    class Conn:
+        queries = []
+
+        async def fetchrow(self, sql, function):
+            self.queries.append(sql)
+            if function != "set_article_embeddings":
+                return None
+            return {"names": ["items", "model_tag"], "modes": None, "types": ["jsonb", "text"]}
+
+    backend = AsyncpgBackend("postgresql://test")
+    conn = Conn()
+    for _ in range(2):
+        params = asyncio.run(backend._function_params(conn, "set_article_embeddings"))
+        assert params == {"items": "jsonb", "model_tag": "text"}
+    assert len(conn.queries) == 1
+    assert "pronamespace = 'public'::regnamespace" in conn.queries[0]
+
+    with pytest.raises(ValueError):
+        asyncio.run(backend._function_params(conn, "missing"))
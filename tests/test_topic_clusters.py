@@ -0,0 +1,83 @@
+import asyncio
+
+import numpy as np
+
+from app.services.semantic_engine import SemanticEngine
+from app.services.topic_clusters import TopicClusters
+
+
+def unit(i, dim=8):
+    v = np.zeros(dim, dtype=np.float32)
+    v[i % dim] = 1.0
+    return v
+
+
+def article(n, created_at, topic=0):
+    return {"url": f"https://example.com/{n}", "title": f"story {n}", "created_at": created_at, "topic": topic}
+
+
+async def _pages(*pages):
+    for page in pages:
+        yield page
+
+
+def make_engine(topics):
+    engine = SemanticEngine(store=object(), topics=topics)
+
+    async def embed_articles(articles):
+        return np.stack([unit(a["topic"]) for a in articles])
+
+    engine.embed_articles = embed_articles
+    return engine
+
+
+def test_sync_picks_up_late_committed_rows_once(tmp_path):
+    topics = TopicClusters(str(tmp_path), sync_overlap=300)
+    engine = make_engine(topics)
+
+    first = [article(1, "2026-01-01T10:00:00+00:00"), article(2, "2026-01-01T10:05:00+00:00")]
+    assert asyncio.run(engine.sync_topics(_pages(first))) == 2
+    assert topics.synced_until == "2026-01-01T10:05:00+00:00"
+    assert topics.sync_start() == "2026-01-01T10:00:00+00:00"
+
+    # Row 3 started before row 2's created_at but committed after the sync
+    late = article(3, "2026-01-01T10:04:00+00:00")
+    again = asyncio.run(engine.sync_topics(_pages([first[1], late])))
+    assert again == 1
+    assert topics.assigned == 3
+
+    # Assigned keys survive a reload, so the overlap isn't counted twice
+    reloaded = TopicClusters(str(tmp_path), sync_overlap=300)
+    assert reloaded.is_assigned("https://example.com/3")
+    assert asyncio.run(make_engine(reloaded).sync_topics(_pages([first[1], late]))) == 0
+
+
+def test_keys_older_than_the_overlap_are_pruned():
+    topics = TopicClusters(sync_overlap=60)
+    topics.assign([article(1, "2026-01-01T10:00:00+00:00")], [unit(0)])
+    topics.assign([article(2, "2026-01-01T11:00:00+00:00")], [unit(1)])
+    topics.advance("2026-01-01T11:00:00+00:00")
+    assert not topics.is_assigned("https://example.com/1")
+    assert topics.is_assigned("https://example.com/2")
+
+
+def test_recycled_topic_starts_with_fresh_last_seen():
+    topics = TopicClusters(max_topics=2, threshold=0.9)
+    topics.assign([article(1, "2026-01-01T10:00:00+00:00")], [unit(0)])
+    topics.assign([article(2, "2026-01-01T08:00:00+00:00")], [unit(1)])
+    # A third topic recycles the colder slot (topic from 08:00)
+    topics.assign([article(3, "2025-12-31T00:00:00+00:00")], [unit(2)])
+    recycled = next(t for t in topics.trending(2) if t["articles"][0]["title"] == "story 3")
+    assert recycled["last_seen"].startswith("2025-12-31")
+
+
+def test_refresh_loads_a_file_saved_by_another_process(tmp_path):
+    reader = TopicClusters(str(tmp_path))
+    writer = TopicClusters(str(tmp_path))
+    writer.assign([article(1, "2026-01-01T10:00:00+00:00")], [unit(0)])
+    writer.advance("2026-01-01T10:00:00+00:00")
+
+    assert len(reader) == 0
+    assert reader.refresh()
+    assert len(reader) == 1
+    assert not reader.refresh()
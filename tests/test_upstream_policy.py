@@ -0,0 +1,178 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.services.upstream_policy import CLOSED, HALF_OPEN, OPEN, UpstreamPolicy, UpstreamUnavailable, _Breaker
+
+
+@pytest.fixture(autouse=True)
+def fast_policy(monkeypatch):
+    monkeypatch.setattr(settings, "upstream_retry_base_delay", 0.0)
+    monkeypatch.setattr(settings, "upstream_min_timeout", 0.0)
+    monkeypatch.setattr(settings, "breaker_min_calls", 100)
+
+
+def make_policy(**kwargs):
+    return UpstreamPolicy("test", max_timeout=kwargs.pop("max_timeout", 2.0), **kwargs)
+
+
+def status_error(status):
+    request = httpx.Request("GET", "https://upstream.example/")
+    return httpx.HTTPStatusError(str(status), request=request, response=httpx.Response(status, request=request))
+
+
+class Flaky:
+    """Raises `errors` in order, then answers "ok"; counts attempts."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.attempts = 0
+
+    async def __call__(self):
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_retries_until_the_budget_is_spent(monkeypatch):
+    monkeypatch.setattr(settings, "upstream_retry_burst", 1.0)
+    monkeypatch.setattr(settings, "upstream_retry_budget", 0.0)
+    policy = make_policy()
+
+    first = Flaky(httpx.ConnectError("down"))
+    assert asyncio.run(policy.call(first)) == "ok"
+    assert first.attempts == 2
+
+    # The one token is gone: the next failure reaches the caller
+    second = Flaky(httpx.ConnectError("down"))
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(policy.call(second))
+    assert second.attempts == 1
+
+
+def test_client_errors_and_writes_are_not_retried():
+    policy = make_policy()
+
+    rejected = Flaky(status_error(400))
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(policy.call(rejected))
+    assert rejected.attempts == 1
+
+    write = Flaky(httpx.ConnectError("down"))
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(policy.call(write, idempotent=False))
+    assert write.attempts == 1
+
+
+def test_hedge_answers_when_the_primary_is_slow():
+    policy = make_policy(hedge=True)
+    for _ in range(settings.upstream_min_samples):
+        policy._ops("search").add(0.01)
+    calls = []
+
+    async def fn():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            await asyncio.sleep(1.0)
+            return "primary"
+        return "hedge"
+
+    started = time.monotonic()
+    assert asyncio.run(policy.call(fn, op="search")) == "hedge"
+    assert time.monotonic() - started < 0.5
+    assert len(calls) == 2
+
+
+def test_no_hedge_without_budget(monkeypatch):
+    monkeypatch.setattr(settings, "upstream_hedge_burst", 0.0)
+    monkeypatch.setattr(settings, "upstream_hedge_budget", 0.0)
+    monkeypatch.setattr(settings, "upstream_adaptive_timeouts", False)
+    policy = make_policy(hedge=True)
+    for _ in range(settings.upstream_min_samples):
+        policy._ops("search").add(0.01)
+    calls = []
+
+    async def fn():
+        calls.append(len(calls))
+        await asyncio.sleep(0.05)
+        return "primary"
+
+    assert asyncio.run(policy.call(fn, op="search")) == "primary"
+    assert len(calls) == 1
+
+
+def test_breaker_opens_then_lets_one_probe_through():
+    breaker = _Breaker(window=4, min_calls=2, failure_ratio=0.5, cooldown=0.05)
+    breaker.record(False)
+    breaker.record(True)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()   # one probe at a time
+
+    # A cancelled probe frees the slot for the next caller
+    breaker.release()
+    assert breaker.allow()
+
+    breaker.record(True)
+    assert breaker.state == OPEN
+    assert breaker.opened == 2
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_open_circuit_fails_fast(monkeypatch):
+    monkeypatch.setattr(settings, "breaker_min_calls", 2)
+    monkeypatch.setattr(settings, "upstream_max_retries", 0)
+    policy = make_policy()
+
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(policy.call(Flaky(status_error(503))))
+    assert policy.breaker.state == OPEN
+
+    fn = Flaky()
+    with pytest.raises(UpstreamUnavailable) as exc:
+        asyncio.run(policy.call(fn))
+    assert fn.attempts == 0
+    assert exc.value.retry_after > 0
+
+
+def test_rate_limiting_does_not_open_the_circuit(monkeypatch):
+    monkeypatch.setattr(settings, "breaker_min_calls", 2)
+    monkeypatch.setattr(settings, "upstream_max_retries", 0)
+    policy = make_policy()
+
+    for _ in range(5):
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(policy.call(Flaky(status_error(429))))
+    assert policy.breaker.state == CLOSED
+    assert list(policy.breaker.outcomes) == [False] * 5
+
+
+def test_guard_fail_counts_as_a_failure(monkeypatch):
+    monkeypatch.setattr(settings, "breaker_min_calls", 2)
+    policy = make_policy()
+
+    async def write(fail):
+        async with policy.guard() as guarded:
+            if fail:
+                guarded.fail()
+
+    asyncio.run(write(False))
+    assert policy.breaker.state == CLOSED
+    asyncio.run(write(True))
+    assert policy.breaker.state == OPEN
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(write(False))